@@ -1,9 +1,15 @@
+import logging
+from concurrent.futures import Future
 from sqlite3 import Connection
 from typing import Optional
 
+from ..db import get_write_queue, run_write
 from . import schemas
+from .principal_cache import invalidate_principal
 from .security import get_password_hash
 
+logger = logging.getLogger(__name__)
+
 
 class UserCRUD:
     def get_user_by_email(self, conn: Connection, email: str) -> Optional[schemas.UserInDB]:
@@ -23,15 +29,44 @@ class UserCRUD:
         return None
 
 
-    def create_user(self, conn: Connection, user: schemas.UserCreate) -> schemas.User:
-        hashed_password = get_password_hash(user.password)
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO users (username, email, hashed_password) VALUES (?, ?, ?)",
-            (user.username, user.email, hashed_password),
+    def create_user(
+        self,
+        conn: Connection,
+        user: schemas.UserCreate,
+        hashed_password: Optional[str] = None,
+    ) -> schemas.User:
+        # Async callers hash on the password hasher's pool beforehand
+        if hashed_password is None:
+            hashed_password = get_password_hash(user.password)
+        # Through the single writer, like every other write
+        user_id = run_write(
+            lambda writer: writer.execute(
+                "INSERT INTO users (username, email, hashed_password) VALUES (?, ?, ?)",
+                (user.username, user.email, hashed_password),
+            ).lastrowid
         )
-        conn.commit()
-        user_id = cur.lastrowid
         return schemas.User(id=user_id, username=user.username, email=user.email)
 
+    def update_password_hash(self, user_id: int, hashed_password: str) -> Future:
+        # Rehash on login is not awaited: the old hash stays valid meanwhile
+        def write(conn: Connection) -> None:
+            conn.execute(
+                "UPDATE users SET hashed_password = ? WHERE id = ?",
+                (hashed_password, user_id),
+            )
+
+        def done(fut: Future) -> None:
+            # A failed write leaves the old hash (and cached principals) valid
+            if fut.cancelled():
+                return
+            exc = fut.exception()
+            if exc is not None:
+                logger.error(f"Password rehash for user {user_id} failed: {exc!r}")
+                return
+            invalidate_principal(user_id)
+
+        future = get_write_queue().submit(write)
+        future.add_done_callback(done)
+        return future
+
 user_crud = UserCRUD()
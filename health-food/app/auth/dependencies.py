@@ -1,18 +1,21 @@
-from sqlite3 import Connection
-
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
-from ..db import get_conn
+from ..db import run_with_conn
 from . import crud, schemas, security
+from .principal_cache import get_principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), conn: Connection = Depends(get_conn)
-) -> schemas.UserInDB:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> schemas.UserInDB:
+    # A cached token has been verified before: no JWT decode, no DB lookup
+    cache = get_principal_cache()
+    user = cache.get(token)
+    if user is not None:
+        return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -29,7 +32,10 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = crud.user_crud.get_user_by_username(conn, username=token_data.username)
+    # Taken before the read: a concurrent write to the row keeps it uncached
+    generation = cache.generation()
+    user = await run_with_conn(crud.user_crud.get_user_by_username, username=token_data.username)
     if user is None:
         raise credentials_exception
+    cache.put(token, user, payload.get("exp"), generation)
     return user
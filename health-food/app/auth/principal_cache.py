@@ -0,0 +1,170 @@
+"""Cache of authenticated users keyed by access token."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from ..config import get_principal_cache_settings
+from .schemas import UserInDB
+
+
+class PrincipalCache:
+    """
+    LRU cache of ``token -> UserInDB`` for ``get_current_user``.
+
+    The key is a SHA-256 digest of the whole token, signature included, so
+    a hit is only possible for a token that has already been verified and
+    the JWT decode can be skipped together with the user lookup. Entries
+    live ``ttl`` seconds but never past the token's ``exp``, and are
+    dropped explicitly when the user row changes.
+
+    A miss reads the user row concurrently with writes to it. To keep a
+    row read before an invalidation out of the cache, the caller takes
+    :meth:`generation` before the read and passes it to :meth:`put`, which
+    skips the entry if that user was invalidated in between.
+
+    Cached users are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        # digest -> (expires at, user)
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._by_user: Dict[int, Set[bytes]] = {}
+        # Invalidation counter; user id -> counter value of its last invalidation,
+        # oldest first. At most max_entries are kept: a put with a generation
+        # older than the last pruned one is treated as stale
+        self._generation = 0
+        self._invalidated_at: Dict[int, int] = {}
+        self._pruned_generation = 0
+        self._lock = threading.Lock()
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._stale_puts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[UserInDB]:
+        if not self.enabled:
+            return None
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, user = entry
+            if time.time() >= expires_at:
+                self._drop(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return user
+
+    def generation(self) -> int:
+        """Snapshot for :meth:`put`, taken before the user row is read."""
+        with self._lock:
+            return self._generation
+
+    def put(
+        self,
+        token: str,
+        user: UserInDB,
+        token_expires_at: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        key = self._digest(token)
+        with self._lock:
+            if generation is not None and (
+                generation < self._pruned_generation
+                or self._invalidated_at.get(user.id, -1) > generation
+            ):
+                # The row changed after it was read: the next miss reloads it
+                self._stale_puts += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (expires_at, user)
+            self._by_user.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forgets every cached token of the user (after a write to its row)."""
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at.pop(user_id, None)
+            self._invalidated_at[user_id] = self._generation
+            while len(self._invalidated_at) > self.max_entries:
+                oldest = next(iter(self._invalidated_at))
+                self._pruned_generation = self._invalidated_at.pop(oldest)
+            keys = self._by_user.pop(user_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            if keys:
+                self._invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, key: bytes) -> None:
+        _, user = self._entries.pop(key)
+        keys = self._by_user.get(user.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user.id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "stale_puts": self._stale_puts,
+            }
+
+
+_cache: Optional[PrincipalCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_principal_cache() -> PrincipalCache:
+    """Process-wide cache, created on first use (after .env is loaded)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PrincipalCache(**get_principal_cache_settings())
+    return _cache
+
+
+def invalidate_principal(user_id: Optional[int]) -> None:
+    """To be called after every write to a ``users`` row."""
+    if user_id is not None and _cache is not None:
+        _cache.invalidate_user(user_id)
+
+
+def get_principal_cache_stats() -> Optional[Dict[str, Any]]:
+    return _cache.stats() if _cache is not None else None
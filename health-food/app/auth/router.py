@@ -2,35 +2,55 @@ from datetime import timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlite3 import Connection
 
-from ..db import get_conn
+from ..db import run_with_conn
 from . import crud, schemas, security
 from .dependencies import get_current_user
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _hasher_busy(error: security.PasswordHasherBusyError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, try again later",
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, conn: Connection = Depends(get_conn)):
-    db_user = crud.user_crud.get_user_by_email(conn, email=user.email)
+async def register(user: schemas.UserCreate):
+    # Queries run on the DB thread pool, never on the event loop
+    db_user = await run_with_conn(crud.user_crud.get_user_by_email, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    db_user = crud.user_crud.get_user_by_username(conn, username=user.username)
+    db_user = await run_with_conn(crud.user_crud.get_user_by_username, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.user_crud.create_user(conn=conn, user=user)
+    try:
+        hashed_password = await security.get_password_hasher().hash(user.password)
+    except security.PasswordHasherBusyError as e:
+        raise _hasher_busy(e)
+    return await run_with_conn(
+        crud.user_crud.create_user, user=user, hashed_password=hashed_password
+    )
 
 
 @router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(),
-    conn: Connection = Depends(get_conn),
-):
-    user = crud.user_crud.get_user_by_username(conn, username=form_data.username)
-    if not user or not security.verify_password(
-        form_data.password, user.hashed_password
-    ):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await run_with_conn(crud.user_crud.get_user_by_username, username=form_data.username)
+    verified = False
+    if user:
+        try:
+            verified, new_hash = await security.get_password_hasher().verify_and_update(
+                form_data.password, user.hashed_password
+            )
+        except security.PasswordHasherBusyError as e:
+            raise _hasher_busy(e)
+        if verified and new_hash:
+            # BCRYPT_ROUNDS changed since the hash was created
+            crud.user_crud.update_password_hash(user.id, new_hash)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
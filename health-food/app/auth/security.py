@@ -1,23 +1,143 @@
+import asyncio
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
 
 from jose import jwt
 from passlib.context import CryptContext
 
+from ..config import get_password_hashing_settings
+
+T = TypeVar("T")
+
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasherBusyError(RuntimeError):
+    """Too many hashing jobs are already waiting for a worker."""
+
+    retry_after = 1
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and verification on a dedicated, bounded thread pool.
+
+    A bcrypt call takes hundreds of milliseconds at the default cost; run
+    on the event loop it stalls every other request of the worker. bcrypt
+    releases the GIL, so ``workers`` threads hash in parallel while the
+    loop keeps serving. At most ``max_pending`` jobs may wait for a thread,
+    further calls fail fast with :class:`PasswordHasherBusyError`.
+
+    Hashes are created with ``rounds``; hashes with any other cost are
+    reported for upgrade by :meth:`verify_and_update`.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        self.rounds = rounds
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            # Any other cost is outside the desired range -> needs_update
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="password-hash"
+        )
+        self._lock = threading.Lock()
+        self._in_queue = 0
+        # Metrics
+        self._jobs = 0
+        self._rejected = 0
+        self._rehashed = 0
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            if self._in_queue >= self.workers + self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusyError("Password hashing queue is full")
+            self._in_queue += 1
+            self._jobs += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self._in_queue -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Checks the password; if the stored hash uses another cost, also
+        returns a new hash to store (``(True, new_hash)``), else ``None``."""
+        verified, new_hash = await self._run(
+            self.context.verify_and_update, password, hashed_password
+        )
+        if new_hash:
+            with self._lock:
+                self._rehashed += 1
+        return verified, new_hash
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "in_queue": self._in_queue,
+                "jobs": self._jobs,
+                "rejected": self._rejected,
+                "rehashed": self._rehashed,
+            }
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Process-wide hasher, created on first use (after .env is loaded)."""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher(**get_password_hashing_settings())
+    return _hasher
+
+
+def close_password_hasher() -> None:
+    global _hasher
+    with _hasher_lock:
+        if _hasher is not None:
+            _hasher.close()
+            _hasher = None
+
+
+def get_password_hasher_stats() -> Optional[Dict[str, Any]]:
+    return _hasher.stats() if _hasher is not None else None
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    # Blocking; async code uses get_password_hasher().verify_and_update
+    return get_password_hasher().context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    # Blocking; async code uses get_password_hasher().hash
+    return get_password_hasher().context.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
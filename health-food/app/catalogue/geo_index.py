@@ -0,0 +1,97 @@
+"""Сеточный геоиндекс: ячейки по широте/долготе -> позиции точек"""
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..geo import bounding_box, distances_km, lon_offset
+
+
+class GeoGrid:
+    """
+    Равномерная сетка cell_deg x cell_deg градусов
+
+    Поиск в радиусе: ячейки, пересекающие ограничивающий прямоугольник
+    круга, затем проверка прямоугольника по координатам точек и точное
+    расстояние - одним векторным вызовом для всех кандидатов. Остальные
+    точки не просматриваются.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, cell_deg: float):
+        if cell_deg <= 0:
+            raise ValueError(f"cell_deg must be positive, got {cell_deg}")
+        self.cell_deg = cell_deg
+        # Ширина по долготе подогнана, чтобы целое число ячеек покрывало 360°
+        self._lon_cells = math.ceil(360.0 / cell_deg)
+        self._lon_width = 360.0 / self._lon_cells
+        self.lats = np.ascontiguousarray(lats, dtype=np.float64)
+        self.lons = np.ascontiguousarray(lons, dtype=np.float64)
+
+        rows: Dict[int, Dict[int, List[int]]] = defaultdict(lambda: defaultdict(list))
+        for pos, (lat, lon) in enumerate(zip(self.lats.tolist(), self.lons.tolist())):
+            rows[self._row(lat)][self._col(lon)].append(pos)
+        self._rows: Dict[int, Dict[int, np.ndarray]] = {
+            row: {col: np.array(cell, dtype=np.intp) for col, cell in cols.items()}
+            for row, cols in rows.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _row(self, lat: float) -> int:
+        return math.floor((lat + 90.0) / self.cell_deg)
+
+    def _col(self, lon: float) -> int:
+        return math.floor(((lon + 180.0) % 360.0) / self._lon_width) % self._lon_cells
+
+    def _cells(
+        self, lon: float, min_lat: float, max_lat: float, lon_delta: Optional[float]
+    ) -> List[np.ndarray]:
+        first_col = last_col = 0
+        all_cols = lon_delta is None
+        if not all_cols:
+            # Соседние столбцы - запас на округление на границах ячеек
+            base = (lon + 180.0) % 360.0
+            first_col = math.floor((base - lon_delta) / self._lon_width) - 1
+            last_col = math.floor((base + lon_delta) / self._lon_width) + 1
+            all_cols = last_col - first_col + 1 >= self._lon_cells
+
+        cells = []
+        for row in range(self._row(min_lat), self._row(max_lat) + 1):
+            cols = self._rows.get(row)
+            if not cols:
+                continue
+            if all_cols:
+                cells.extend(cols.values())
+                continue
+            for col in range(first_col, last_col + 1):
+                cell = cols.get(col % self._lon_cells)
+                if cell is not None:
+                    cells.append(cell)
+        return cells
+
+    def query(
+        self, lat: float, lon: float, radius_km: float, fast: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Точки не дальше radius_km: (позиции по возрастанию, расстояния км)
+
+        fast - equirectangular вместо haversine, если радиус в пределах его
+        гарантированной погрешности (см. app.geo).
+        """
+        min_lat, max_lat, lon_delta = bounding_box(lat, lon, radius_km)
+        cells = self._cells(lon, min_lat, max_lat, lon_delta)
+        if not cells:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+        positions = np.sort(np.concatenate(cells))
+        lats, lons = self.lats[positions], self.lons[positions]
+        inside = (lats >= min_lat) & (lats <= max_lat)
+        if lon_delta is not None:
+            inside &= np.abs(lon_offset(lons, lon)) <= lon_delta
+        positions, lats, lons = positions[inside], lats[inside], lons[inside]
+
+        distances = distances_km(lat, lon, lats, lons, radius_km, fast)
+        within = distances <= radius_km
+        return positions[within], distances[within]
@@ -0,0 +1,484 @@
+"""Инвертированные индексы каталога рецептов: тег/ингредиент/нутриент -> позиции"""
+import heapq
+import threading
+from collections import defaultdict
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+# Позиция рецепта в CatalogueSnapshot.entries
+Postings = Tuple[int, ...]
+
+# Признак запроса: ("tag" | "nutrient", имя)
+Term = Tuple[str, str]
+
+# Запас к верхней оценке скора: слагаемые складываются в другом порядке,
+# чем в точной формуле, и расходятся на ошибку округления float64
+_BOUND_SLACK = 1e-9
+
+# Этапы разбора группы в RankedSearch
+_FEATURES, _OVERLAP, _CLASSES, _LEAF = range(4)
+
+
+class RankedSearch:
+    """
+    Рецепты по убыванию итогового скора (при равенстве - по позиции), лениво
+
+    Скор - сумма весов признаков запроса, которые есть у рецепта, бонус за
+    доступные ингредиенты и базовый скор класса рецепта (класс - набор
+    независящих от запроса слагаемых). У рецептов с одинаковыми признаками,
+    числом доступных ингредиентов и классом скор одинаковый, поэтому обход
+    идёт не по рецептам, а по таким группам - битовым множествам позиций.
+
+    Поиск лучшим-первым: узел - группа, разобранная частично (какие признаки
+    есть, сколько ингредиентов, какой класс), с верхней оценкой скора.
+    Рецепт отдаётся, только когда его точный скор не меньше оценки любого
+    неразобранного узла, так что порядок совпадает со стабильной сортировкой
+    всего каталога. Разбирается лишь окрестность топа: стоимость зависит от
+    числа признаков запроса и нужных рецептов, а не от размера каталога.
+    """
+
+    def __init__(
+        self,
+        index: "RecipeIndex",
+        terms: Sequence[Tuple[Term, float]],
+        overlap: Sequence[int],
+        overlap_weight: float,
+        classes: Sequence[Tuple[Hashable, int]],
+        combine: Callable[[float, Hashable], float],
+        allowed: int,
+    ):
+        """
+        terms - (признак, вес) в порядке сложения точной формулы, признак
+        может повторяться. overlap[j] - рецепты ровно с j доступными
+        ингредиентами (пусто - бонуса нет). classes - (класс, рецепты),
+        combine(вклад запроса, класс) даёт итоговый скор: вклад плюс базовый
+        скор класса combine(0.0, класс). allowed - допустимые рецепты.
+        """
+        self._index = index
+        self._terms = terms
+        self._overlap = overlap
+        self._overlap_weight = overlap_weight
+        self._combine = combine
+
+        # Повторы признака сливаются: ветвление идёт по уникальным признакам,
+        # от тяжёлых к лёгким, чтобы оценки быстрее отсекали группы
+        weights: Dict[Term, float] = {}
+        for term, weight in terms:
+            weights[term] = weights.get(term, 0.0) + weight
+        self._features = sorted(
+            ((term, index.bits(*term), weight) for term, weight in weights.items()),
+            key=lambda feature: -feature[2],
+        )
+        # Узел хранит признаки, которые есть у группы, маской по _features
+        feature_of = {term: i for i, (term, _, _) in enumerate(self._features)}
+        self._term_features = [(feature_of[term], weight) for term, weight in terms]
+        # Классы - по убыванию базового скора: следующий класс группы
+        # разбирается, только когда до него доходит очередь
+        self._classes = sorted(
+            ((combine(0.0, key), key, bits) for key, bits in classes),
+            key=lambda item: -item[0],
+        )
+        self._max_overlap = len(overlap) - 1 if overlap else 0
+        self._base_bound = (
+            (self._classes[0][0] if self._classes else 0.0)
+            + self._max_overlap * overlap_weight
+        )
+        self._kind_masks: Dict[str, int] = defaultdict(int)
+        for i, ((kind, _), _, _) in enumerate(self._features):
+            self._kind_masks[kind] |= 1 << i
+
+        # Снимается при exclude, группы пересекаются лениво. Только
+        # неотрицательные int: & с отрицательным (~bits) на порядок медленнее
+        self._keep = index.all_bits
+        # Признаки, которых не осталось ни у одного рецепта после exclude
+        self._dead = 0
+        self._update_rest()
+        self._version = 0
+        self._seq = 0
+        self._heap: List[tuple] = []
+        self.expanded = 0  # Разобранных узлов - для бенчмарка
+        if allowed and self._classes:
+            self._push(allowed, _FEATURES, 0, 0.0, 0, 0, None)
+
+    def exclude(self, bits: int) -> None:
+        """Убрать рецепты из ещё не отданных (например, с исчерпанным тегом)"""
+        self._keep &= self._index.all_bits ^ bits
+        self._version += 1
+        dead = self._dead
+        for i, (_, term_bits, _) in enumerate(self._features):
+            if not dead >> i & 1 and not term_bits & self._keep:
+                dead |= 1 << i
+        if dead != self._dead:
+            self._dead = dead
+            self._update_rest()
+
+    def _update_rest(self) -> None:
+        # _rest[i] - что могут добавить признаки начиная с i-го (кроме
+        # исключённых): по каждому виду признаков ("tag", "nutrient") у
+        # рецепта их не больше index.max_counts[вид], так что берутся самые
+        # тяжёлые. По виду - (маска признаков вида, лимит, суммы первых s).
+        # Считается по шагу при первом обращении
+        self._rest: List[Optional[List[Tuple[int, int, List[float]]]]] = (
+            [None] * (len(self._features) + 1)
+        )
+
+    def _feature_bound(self, step: int, present: int) -> float:
+        """Сколько ещё могут добавить признаки начиная со step-го"""
+        rest = self._rest[step]
+        if rest is None:
+            by_kind: Dict[str, List[float]] = {}
+            for i in range(step, len(self._features)):
+                if not self._dead >> i & 1:
+                    (kind, _), _, weight = self._features[i]
+                    sums = by_kind.setdefault(kind, [0.0])
+                    sums.append(sums[-1] + weight)
+            rest = self._rest[step] = [
+                (self._kind_masks[kind], self._index.max_counts.get(kind, 0), sums)
+                for kind, sums in by_kind.items()
+            ]
+        bound = self._base_bound
+        for mask, limit, sums in rest:
+            slots = limit - (present & mask).bit_count()
+            if slots > 0:
+                bound += sums[min(slots, len(sums) - 1)]
+        return bound
+
+    def exclude_tag(self, tag: str) -> None:
+        self.exclude(self._index.bits("tag", tag))
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        heap = self._heap
+        first = self._index.first
+        while heap:
+            node = heapq.heappop(heap)
+            neg_score, _, pos, _, bits, stage, step, value, present, overlap, key, version = node
+            if version != self._version:
+                bits &= self._keep
+                if not bits:
+                    continue
+                if (
+                    stage == _FEATURES
+                    and value + self._feature_bound(step, present) + _BOUND_SLACK < -neg_score
+                ):
+                    # Оценка снизилась без исключённых признаков: в очередь заново
+                    self._push(bits, stage, step, value, present, overlap, key)
+                    continue
+                version = self._version
+            if stage != _LEAF:
+                self.expanded += 1
+                self._expand(bits, stage, step, value, present, overlap)
+                continue
+            lowest = first(bits)
+            if lowest == pos:
+                yield pos, -neg_score
+                bits = self._index.without(bits, pos)
+                if not bits:
+                    continue
+                lowest = first(bits)
+            self._seq += 1
+            heapq.heappush(
+                heap,
+                (neg_score, 1, lowest, self._seq, bits, stage, step, value, present, overlap,
+                 key, version),
+            )
+
+    def _expand(
+        self,
+        bits: int,
+        stage: int,
+        step: int,
+        value: float,
+        present: int,
+        overlap: int,
+    ) -> None:
+        # Разбиение, где одна из частей пуста, продолжается здесь же, без
+        # кучи: ранний разбор узла порядок выдачи не меняет
+        if stage == _FEATURES:
+            features = self._features
+            while step < len(features):
+                _, term_bits, weight = features[step]
+                with_term = bits & term_bits
+                if with_term and with_term != bits:
+                    self._push(
+                        with_term, _FEATURES, step + 1, value + weight,
+                        present | 1 << step, 0, None,
+                    )
+                    self._push(bits ^ with_term, _FEATURES, step + 1, value, present, 0, None)
+                    return
+                if with_term:
+                    value += weight
+                    present |= 1 << step
+                step += 1
+            if self._overlap:
+                stage, step = _OVERLAP, self._max_overlap
+            else:
+                stage, step = _CLASSES, 0
+
+        # Число ингредиентов - от большего к меньшему, классы - по убыванию
+        # базового скора: группа отдаёт лучшую часть, остаток ждёт очереди
+        if stage == _OVERLAP:
+            while True:
+                group = bits & self._overlap[step]
+                if group:
+                    self._push(group, _CLASSES, 0, value, present, step, None)
+                    if group != bits and step > 0:
+                        self._push(bits ^ group, _OVERLAP, step - 1, value, present, 0, None)
+                    return
+                step -= 1
+
+        while True:
+            _, key, class_bits = self._classes[step]
+            group = bits & class_bits
+            if group:
+                self._push(group, _LEAF, 0, value, present, overlap, key)
+                if group != bits and step + 1 < len(self._classes):
+                    self._push(bits ^ group, _CLASSES, step + 1, value, present, overlap, None)
+                return
+            step += 1
+
+    def _push(
+        self,
+        bits: int,
+        stage: int,
+        step: int,
+        value: float,
+        present: int,
+        overlap: int,
+        key: Optional[Hashable],
+    ) -> None:
+        self._seq += 1
+        if stage == _LEAF:
+            # Группа разобрана целиком: у всех рецептов один и тот же точный скор
+            entry = (-self._score(present, overlap, key), 1, self._index.first(bits))
+        else:
+            if stage == _FEATURES:
+                bound = value + self._feature_bound(step, present)
+            elif stage == _OVERLAP:
+                bound = value + step * self._overlap_weight + self._classes[0][0]
+            else:
+                bound = value + overlap * self._overlap_weight + self._classes[step][0]
+            entry = (-(bound + _BOUND_SLACK), 0, 0)
+        heapq.heappush(
+            self._heap,
+            entry + (self._seq, bits, stage, step, value, present, overlap, key, self._version),
+        )
+
+    def _score(self, present: int, overlap: int, key: Hashable) -> float:
+        """Точный скор: те же слагаемые в том же порядке, что и у полного перебора"""
+        value = 0.0
+        for feature, weight in self._term_features:
+            if present >> feature & 1:
+                value += weight
+        if overlap:
+            value += overlap * self._overlap_weight
+        return self._combine(value, key)
+
+
+class RecipeIndex:
+    """
+    Инвертированные индексы по снимку каталога
+
+    Списки позиций по тегам, нутриентам и ингредиентам хранятся и как
+    кортежи, и (лениво) как битовые множества - int, где позиции 0
+    соответствует старший бит. Пересечение множеств по всему каталогу -
+    одна операция над int, наименьшая позиция - bit_length() за O(1).
+    На этом построен RankedSearch.
+    """
+
+    def __init__(self, entries: Sequence):
+        self.size = len(entries)
+        by_tag: Dict[str, List[int]] = defaultdict(list)
+        by_ingredient: Dict[str, List[int]] = defaultdict(list)
+        by_nutrient: Dict[str, List[int]] = defaultdict(list)
+
+        for pos, entry in enumerate(entries):
+            for tag in entry.tags:
+                by_tag[tag].append(pos)
+            for ingredient in entry.ingredients:
+                by_ingredient[ingredient].append(pos)
+            for nutrient in entry.nutrients:
+                by_nutrient[nutrient].append(pos)
+
+        self.by_tag: Dict[str, Postings] = {k: tuple(v) for k, v in by_tag.items()}
+        self.by_ingredient: Dict[str, Postings] = {
+            k: tuple(v) for k, v in by_ingredient.items()
+        }
+        self.by_nutrient: Dict[str, Postings] = {
+            k: tuple(v) for k, v in by_nutrient.items()
+        }
+        self._postings = {
+            "tag": self.by_tag, "ingredient": self.by_ingredient, "nutrient": self.by_nutrient,
+        }
+        self._max_ingredients = max((len(entry.ingredients) for entry in entries), default=0)
+        # Наибольшее число тегов/нутриентов/ингредиентов у одного рецепта
+        self.max_counts = {
+            "tag": max((len(entry.tags) for entry in entries), default=0),
+            "nutrient": max((len(entry.nutrients) for entry in entries), default=0),
+            "ingredient": self._max_ingredients,
+        }
+        # Разрядность битовых множеств: позиция pos - бит _width - 1 - pos
+        self._width = (self.size // 8 + 1) * 8
+        self.all_bits = self.to_bits(range(self.size))
+        self._entries = entries
+        self._cache: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def tag_positions(self, tags: Iterable[str]) -> List[int]:
+        """Позиции рецептов, у которых есть хотя бы один из тегов"""
+        found: Set[int] = set()
+        for tag in tags:
+            found.update(self.by_tag.get(tag, ()))
+        return sorted(found)
+
+    def to_bits(self, positions: Iterable[int]) -> int:
+        """Битовое множество из позиций"""
+        buffer = bytearray(self._width // 8)
+        for pos in positions:
+            buffer[pos >> 3] |= 0x80 >> (pos & 7)
+        return int.from_bytes(buffer, "big")
+
+    def first(self, bits: int) -> int:
+        """Наименьшая позиция непустого множества"""
+        return self._width - bits.bit_length()
+
+    def without(self, bits: int, pos: int) -> int:
+        return bits ^ (1 << (self._width - 1 - pos))
+
+    def bits(self, kind: str, key: str) -> int:
+        """Список позиций ("tag" | "ingredient" | "nutrient") битовым множеством"""
+        postings = self._postings[kind]
+        by_key = self.cached(
+            ("bits", kind),
+            lambda: {k: self.to_bits(positions) for k, positions in postings.items()},
+        )
+        return by_key.get(key, 0)
+
+    def classes(
+        self, name: str, key: Callable[[object], Hashable]
+    ) -> Tuple[Tuple[Hashable, int], ...]:
+        """Рецепты, сгруппированные по key(рецепт) (кэшируется)"""
+        def build() -> Tuple[Tuple[Hashable, int], ...]:
+            groups: Dict[Hashable, List[int]] = defaultdict(list)
+            for pos, entry in enumerate(self._entries):
+                groups[key(entry)].append(pos)
+            return tuple((k, self.to_bits(positions)) for k, positions in groups.items())
+
+        return self.cached(("classes", name), build)
+
+    def count_planes(self, ingredients: Iterable[str], planes: Sequence[int] = ()) -> List[int]:
+        """
+        Число переданных ингредиентов в каждом рецепте, побитовым сумматором:
+        planes[b] - рецепты, у которых b-й разряд числа равен 1. Каждый список
+        позиций прибавляется с переносом по разрядам; planes - уже
+        посчитанное слагаемое.
+        """
+        planes = list(planes)
+        for ingredient in set(ingredients):
+            carry = self.bits("ingredient", ingredient)
+            for b, plane in enumerate(planes):
+                if not carry:
+                    break
+                planes[b], carry = plane ^ carry, plane & carry
+            if carry:
+                planes.append(carry)
+        return planes
+
+    def count_groups(self, planes: Sequence[int]) -> List[int]:
+        """groups[j] - рецепты с числом j по count_planes (до последнего непустого)"""
+        groups = []
+        for j in range(min(1 << len(planes), self._max_ingredients + 1)):
+            group = self.all_bits
+            for b, plane in enumerate(planes):
+                # group & ~plane без отрицательных int
+                group = group & plane if j >> b & 1 else group ^ (group & plane)
+            groups.append(group)
+        while groups and not groups[-1]:
+            groups.pop()
+        return groups
+
+    def missing_bits(
+        self,
+        available: Set[str],
+        pantry: FrozenSet[str],
+        max_missing: int,
+        planes: Optional[List[int]] = None,
+    ) -> int:
+        """
+        Рецепты, где недостающих ингредиентов не больше max_missing
+
+        Недостающие = ингредиенты рецепта минус доступные минус базовые.
+        planes - готовый count_planes(available - pantry), если есть.
+        """
+        def build() -> List[int]:
+            # outside[c] - рецепты ровно с c ингредиентами вне базовых
+            positions: List[List[int]] = [[] for _ in range(self._max_ingredients + 1)]
+            for pos, entry in enumerate(self._entries):
+                positions[len(entry.ingredients - pantry)].append(pos)
+            return [self.to_bits(group) for group in positions]
+
+        outside = self.cached(("outside_pantry_bits", pantry), build)
+        if planes is None:
+            planes = self.count_planes(available - pantry)
+        groups = self.count_groups(planes)
+        # covered[t] - рецепты, где доступных (не базовых) не меньше t
+        covered = [0] * (len(outside) + 1)
+        covered[0] = self.all_bits
+        for t in range(len(groups) - 1, 0, -1):
+            covered[t] = covered[t + 1] | groups[t]
+        allowed = 0
+        for count, bits in enumerate(outside):
+            if bits:
+                allowed |= bits & covered[max(count - max_missing, 0)]
+        return allowed
+
+    def search(
+        self,
+        terms: Sequence[Tuple[Term, float]],
+        classes: Sequence[Tuple[Hashable, int]],
+        combine: Callable[[float, Hashable], float],
+        available: Optional[Set[str]] = None,
+        overlap_weight: float = 0.0,
+        pantry: Optional[FrozenSet[str]] = None,
+        max_missing: int = 0,
+    ) -> RankedSearch:
+        """
+        Ленивый обход по убыванию скора, см. RankedSearch
+
+        С available каждый доступный ингредиент рецепта добавляет
+        overlap_weight; с pantry остаются только рецепты, которым не
+        хватает не больше max_missing ингредиентов.
+        """
+        available = available or set()
+        allowed = self.all_bits
+        planes: List[int] = []
+        if pantry is not None:
+            # Сначала не базовые ингредиенты - для фильтра, затем базовые
+            planes = self.count_planes(available - pantry)
+            allowed = self.missing_bits(available, pantry, max_missing, planes)
+            planes = self.count_planes(available & pantry, planes)
+        elif available:
+            planes = self.count_planes(available)
+        overlap = self.count_groups(planes) if available else []
+        return RankedSearch(self, terms, overlap, overlap_weight, classes, combine, allowed)
+
+    def cached(self, key: Tuple, build: Callable[[], object]):
+        """Значение, вычисляемое один раз на снимок (потокобезопасно)"""
+        value = self._cache.get(key)
+        if value is None:
+            with self._lock:
+                value = self._cache.get(key)
+                if value is None:
+                    value = build()
+                    self._cache[key] = value
+        return value
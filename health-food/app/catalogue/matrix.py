@@ -0,0 +1,197 @@
+"""Векторизованный скоринг каталога на NumPy: матрица признаков и выбор топ-k"""
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import numpy as np
+
+# Допуск на расхождение матричного скора с точной формулой, относительно
+# суммы модулей слагаемых. Ошибка округления суммы из сотен слагаемых
+# float64 на много порядков меньше
+RELATIVE_TOLERANCE = 1e-9
+
+
+class FeatureMatrix:
+    """
+    Плотная 0/1 матрица: строка - элемент каталога, столбец - признак
+
+    Скор линейной формулы по всем элементам считается одним произведением
+    матрицы на вектор весов запроса.
+    """
+
+    def __init__(self, rows: Sequence[Iterable[Hashable]]):
+        rows = [frozenset(row) for row in rows]
+        names = sorted({feature for row in rows for feature in row}, key=repr)
+        self.columns: Dict[Hashable, int] = {name: i for i, name in enumerate(names)}
+        self.values = np.zeros((len(rows), len(names)), dtype=np.float64)
+        for i, row in enumerate(rows):
+            for feature in row:
+                self.values[i, self.columns[feature]] = 1.0
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def weights(self) -> np.ndarray:
+        """Пустой вектор весов запроса"""
+        return np.zeros(self.values.shape[1], dtype=np.float64)
+
+    def add_weight(self, weights: np.ndarray, feature: Hashable, weight: float) -> None:
+        """Добавить вес признаку (неизвестные признаки ни у кого не встречаются)"""
+        column = self.columns.get(feature)
+        if column is not None:
+            weights[column] += weight
+
+    def scores(self, weights: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Скоры всех строк (или только rows) для вектора весов"""
+        values = self.values if rows is None else self.values[rows]
+        return values @ weights
+
+    def column(self, feature: Hashable, positions: np.ndarray) -> Optional[np.ndarray]:
+        """Значения признака (0/1) для указанных строк, None - признака нет ни у кого"""
+        column = self.columns.get(feature)
+        if column is None:
+            return None
+        return self.values[positions, column]
+
+
+class RecipeMatrix:
+    """Матрица тегов и нутриентов снимка каталога рецептов"""
+
+    def __init__(self, entries: Sequence, index):
+        self.features = FeatureMatrix(
+            [
+                [("tag", tag) for tag in entry.tags]
+                + [("nutrient", nutrient) for nutrient in entry.nutrients]
+                for entry in entries
+            ]
+        )
+        self._entries = entries
+        self._index = index
+
+    def add_tag_weight(self, weights: np.ndarray, tag: str, weight: float) -> None:
+        self.features.add_weight(weights, ("tag", tag), weight)
+
+    def add_nutrient_weight(self, weights: np.ndarray, nutrient: str, weight: float) -> None:
+        self.features.add_weight(weights, ("nutrient", nutrient), weight)
+
+    def tag_column(self, tag: str, positions: np.ndarray) -> Optional[np.ndarray]:
+        return self.features.column(("tag", tag), positions)
+
+    def nutrient_column(self, nutrient: str, positions: np.ndarray) -> Optional[np.ndarray]:
+        return self.features.column(("nutrient", nutrient), positions)
+
+    def ingredient_counts(self, ingredients: Iterable[str]) -> np.ndarray:
+        """Сколько из переданных ингредиентов входит в каждый рецепт"""
+        postings = [
+            self._index.by_ingredient.get(ingredient, ()) for ingredient in ingredients
+        ]
+        positions = np.fromiter(
+            (pos for posting in postings for pos in posting), dtype=np.intp
+        )
+        return np.bincount(positions, minlength=len(self._entries))
+
+    def missing_mask(
+        self, available: Set[str], pantry: FrozenSet[str], max_missing: int
+    ) -> np.ndarray:
+        """Маска рецептов, где недостающих ингредиентов не больше max_missing"""
+        outside_pantry = self._index.cached(
+            ("outside_pantry_array", pantry),
+            lambda: np.array(
+                [len(entry.ingredients - pantry) for entry in self._entries],
+                dtype=np.intp,
+            ),
+        )
+        return outside_pantry - self.ingredient_counts(available - pantry) <= max_missing
+
+    def static_scores(self, name: str, base: Callable[[object], float]) -> np.ndarray:
+        """Базовый скор всех рецептов (кэшируется на снимок)"""
+        return self._index.cached(
+            ("static_array", name),
+            lambda: np.array([base(entry) for entry in self._entries], dtype=np.float64),
+        )
+
+
+def tolerance_for(*magnitudes: float) -> float:
+    """Допуск для скоров, составленных из слагаемых с указанной суммой модулей"""
+    return RELATIVE_TOLERANCE * (1.0 + sum(magnitudes))
+
+
+def iter_ranked(
+    approx: np.ndarray,
+    exact: Callable[[np.ndarray], np.ndarray],
+    allowed: Optional[np.ndarray] = None,
+    k: int = 16,
+    tolerance: float = RELATIVE_TOLERANCE,
+) -> Iterator[Tuple[int, float]]:
+    """
+    Позиции по убыванию точного скора (при равенстве - по позиции), лениво
+
+    approx - скоры из матричных операций, отличаются от точных не больше чем
+    на tolerance. exact(позиции) возвращает точные скоры этих позиций. Топ-k
+    выбирается через argpartition, точная формула считается только для окна
+    вокруг порога; следующие порции - с удвоенным k.
+    """
+    if allowed is None:
+        remaining = np.arange(len(approx))
+    else:
+        remaining = np.flatnonzero(allowed)
+
+    while remaining.size:
+        values = approx[remaining]
+        if k < remaining.size:
+            top = np.argpartition(-values, k - 1)[:k]
+            threshold = float(values[top].min())
+            window = values >= threshold - 2 * tolerance
+            # Элементы вне окна точно ниже threshold - tolerance
+            bound = threshold - tolerance
+        else:
+            window = np.ones(remaining.size, dtype=bool)
+            bound = -np.inf
+
+        candidates = remaining[window]
+        scores = np.asarray(exact(candidates), dtype=np.float64)
+        safe = scores >= bound
+        candidates, scores = candidates[safe], scores[safe]
+        # remaining упорядочен по позиции, lexsort стабилен
+        order = np.lexsort((candidates, -scores))
+        for pos, score in zip(candidates[order].tolist(), scores[order].tolist()):
+            yield pos, score
+
+        remaining = remaining[~np.isin(remaining, candidates)]
+        k *= 2
+
+
+def select_top(
+    approx: np.ndarray,
+    exact: Callable[[np.ndarray], np.ndarray],
+    k: int,
+    margin: float = 0.0,
+    tolerance: float = RELATIVE_TOLERANCE,
+) -> List[int]:
+    """
+    k позиций с наибольшим точным скором (при равенстве - по позиции)
+
+    margin - насколько точный скор может "сжаться" при сравнении, например
+    шаг округления: элементы дальше порога на margin + tolerance не проверяются.
+    """
+    if k <= 0 or not len(approx):
+        return []
+    if k < len(approx):
+        top = np.argpartition(-approx, k - 1)[:k]
+        threshold = float(approx[top].min())
+        candidates = np.flatnonzero(approx >= threshold - margin - 2 * tolerance)
+    else:
+        candidates = np.arange(len(approx))
+
+    scores = np.asarray(exact(candidates), dtype=np.float64)
+    return candidates[np.lexsort((candidates, -scores))][:k].tolist()
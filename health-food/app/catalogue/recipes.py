@@ -0,0 +1,72 @@
+"""Снимок публичного каталога рецептов в памяти процесса"""
+import time
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Tuple
+
+from ..repositories.recipe_repository import RecipeRepository
+from .index import RecipeIndex
+from .matrix import RecipeMatrix
+from .versioned import VersionedCatalogue
+
+
+class CatalogueEntry(NamedTuple):
+    """Рецепт с заранее подготовленными структурами для подбора"""
+    recipe: Dict[str, Any]  # Общий для всех запросов - не изменять, копировать
+    ingredients: FrozenSet[str]  # Названия ингредиентов в нижнем регистре
+    tags: FrozenSet[str]
+    nutrients: FrozenSet[str]
+    nutrient_vector: Tuple[float, ...]  # Выровнен по CatalogueSnapshot.nutrient_names
+
+
+class CatalogueSnapshot:
+    """Неизменяемый снимок каталога для конкретной версии"""
+
+    __slots__ = ("version", "entries", "nutrient_names", "index", "built_at")
+
+    def __init__(self, version: int, recipes: List[Dict[str, Any]]):
+        self.version = version
+        self.nutrient_names: Tuple[str, ...] = tuple(
+            sorted({name for recipe in recipes for name in recipe.get("nutrients", {})})
+        )
+        self.entries: Tuple[CatalogueEntry, ...] = tuple(
+            self._make_entry(recipe) for recipe in recipes
+        )
+        self.index = RecipeIndex(self.entries)
+        self.built_at = time.time()
+
+    @property
+    def matrix(self) -> RecipeMatrix:
+        """Матрица признаков для движка "numpy" - строится при первом запросе"""
+        return self.index.cached(("matrix",), lambda: RecipeMatrix(self.entries, self.index))
+
+    def _make_entry(self, recipe: Dict[str, Any]) -> CatalogueEntry:
+        nutrients = recipe.get("nutrients", {})
+        return CatalogueEntry(
+            recipe=recipe,
+            ingredients=frozenset(
+                ing["name"].lower() for ing in recipe.get("ingredients", [])
+            ),
+            tags=frozenset(recipe.get("tags", [])),
+            nutrients=frozenset(nutrients),
+            nutrient_vector=tuple(
+                float(nutrients.get(name, 0.0)) for name in self.nutrient_names
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class RecipeCatalogue(VersionedCatalogue[CatalogueSnapshot]):
+    """
+    Кэш каталога публичных рецептов на процесс
+
+    Версию увеличивают триггеры на recipes и recipe_nutrients.
+    """
+
+    NAME = "recipes"
+
+    def _load(self, conn, version: int) -> CatalogueSnapshot:
+        return CatalogueSnapshot(version, RecipeRepository(conn).get_all_public())
+
+
+recipe_catalogue = RecipeCatalogue()
@@ -0,0 +1,101 @@
+"""Снимок ресторанов и блюд в памяти процесса с геоиндексом"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import get_geo_fast_distance, get_geo_grid_cell_deg
+from ..repositories.restaurant_repository import RestaurantRepository
+from .geo_index import GeoGrid
+from .matrix import FeatureMatrix
+from .versioned import VersionedCatalogue
+
+
+class RestaurantSnapshot:
+    """
+    Неизменяемый снимок ресторанов для конкретной версии
+
+    Координаты ресторанов - непрерывные массивы float64 (lats, lons) для
+    пакетного расчёта расстояний. Блюда всех ресторанов лежат подряд: блюда
+    ресторана i занимают позиции dish_offsets[i]:dish_offsets[i + 1] в dishes
+    и в строках dish_matrix.
+    """
+
+    __slots__ = (
+        "version", "restaurants", "lats", "lons", "grid", "fast_distance",
+        "dishes", "dish_offsets", "dish_matrix", "built_at",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        restaurants: List[Dict[str, Any]],
+        cell_deg: Optional[float] = None,
+    ):
+        self.version = version
+        # Общие для всех запросов - не изменять, копировать
+        self.restaurants: Tuple[Dict[str, Any], ...] = tuple(restaurants)
+        self.lats = np.array([r["lat"] for r in self.restaurants], dtype=np.float64)
+        self.lons = np.array([r["lon"] for r in self.restaurants], dtype=np.float64)
+        self.grid = GeoGrid(self.lats, self.lons, cell_deg or get_geo_grid_cell_deg())
+        self.fast_distance = get_geo_fast_distance()
+
+        dishes: List[Tuple[int, Dict[str, Any]]] = []
+        offsets = [0]
+        for pos, restaurant in enumerate(self.restaurants):
+            dishes.extend((pos, dish) for dish in restaurant.get("dishes", []))
+            offsets.append(len(dishes))
+        self.dishes: Tuple[Tuple[int, Dict[str, Any]], ...] = tuple(dishes)
+        self.dish_offsets = np.array(offsets, dtype=np.intp)
+        self.dish_matrix = FeatureMatrix(
+            [dish.get("nutrients", {}) for _, dish in self.dishes]
+        )
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.restaurants)
+
+    def nearby(
+        self, lat: float, lon: float, radius_km: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Рестораны в радиусе: (позиции в порядке каталога, расстояния км)"""
+        return self.grid.query(lat, lon, radius_km, self.fast_distance)
+
+    def get_nearby(self, lat: float, lon: float, radius_km: float) -> List[Dict[str, Any]]:
+        """Рестораны в радиусе с блюдами и полем distance_km (копии)"""
+        positions, distances = self.nearby(lat, lon, radius_km)
+        return [
+            dict(self.restaurants[pos], distance_km=distance)
+            for pos, distance in zip(positions.tolist(), distances.tolist())
+        ]
+
+    def dish_positions(self, restaurant_positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Позиции блюд указанных ресторанов (подряд, в порядке ресторанов) и
+        для каждого блюда - индекс его ресторана в restaurant_positions
+        """
+        starts = self.dish_offsets[restaurant_positions]
+        counts = self.dish_offsets[restaurant_positions + 1] - starts
+        owners = np.repeat(np.arange(len(restaurant_positions)), counts)
+        if not owners.size:
+            return owners, owners
+        # Сдвиг внутри своего ресторана: сквозной номер минус начало группы
+        group_starts = np.repeat(np.cumsum(counts) - counts, counts)
+        positions = starts[owners] + np.arange(owners.size) - group_starts
+        return positions, owners
+
+
+class RestaurantCatalogue(VersionedCatalogue[RestaurantSnapshot]):
+    """
+    Кэш ресторанов и блюд на процесс
+
+    Версию увеличивают триггеры на restaurants и dishes.
+    """
+
+    NAME = "restaurants"
+
+    def _load(self, conn, version: int) -> RestaurantSnapshot:
+        return RestaurantSnapshot(version, RestaurantRepository(conn).get_all_with_dishes())
+
+
+restaurant_catalogue = RestaurantCatalogue()
@@ -0,0 +1,119 @@
+"""Кэш снимка каталога в памяти процесса со сверкой версии в БД"""
+import threading
+import time
+from typing import Any, Dict, Generic, Optional, TypeVar
+
+from ..config import get_catalogue_check_interval
+from ..db import connection
+
+S = TypeVar("S")
+
+
+class VersionedCatalogue(Generic[S]):
+    """
+    Кэш каталога на процесс
+
+    Снимок строится один раз и подменяется целиком, когда меняется счётчик
+    catalogue_version[NAME] в БД (его увеличивают триггеры на таблицах
+    каталога). Счётчик проверяется не чаще check_interval секунд, поэтому
+    горячий путь обходится без обращений к БД и разбора JSON.
+    """
+
+    NAME = ""
+
+    def __init__(self, check_interval: Optional[float] = None):
+        self._check_interval = check_interval
+        self._snapshot: Optional[S] = None
+        self._checked_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+        # Метрики
+        self._hits = 0
+        self._misses = 0
+        self._rebuilds = 0
+        self._version_checks = 0
+        self._last_build_ms = 0.0
+
+    @property
+    def check_interval(self) -> float:
+        # Читается лениво: экземпляр создаётся при импорте, до load_env()
+        if self._check_interval is None:
+            self._check_interval = get_catalogue_check_interval()
+        return self._check_interval
+
+    def get(self) -> S:
+        """Вернуть актуальный снимок, при необходимости перестроив его"""
+        snapshot = self._snapshot
+        if (
+            snapshot is not None
+            and not self._stale
+            and time.monotonic() - self._checked_at < self.check_interval
+        ):
+            self._hits += 1
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if (
+                snapshot is not None
+                and not self._stale
+                and time.monotonic() - self._checked_at < self.check_interval
+            ):
+                self._hits += 1
+                return snapshot
+
+            # Флаг снимается до чтения версии: invalidate() во время чтения
+            # поднимет его снова, и следующий get() сверит версию ещё раз
+            self._stale = False
+            checked_at = time.monotonic()
+            try:
+                with connection() as conn:
+                    version = self._read_version(conn)
+                    self._version_checks += 1
+                    if snapshot is None or snapshot.version != version:
+                        self._misses += 1
+                        snapshot = self._build(conn, version)
+                        self._snapshot = snapshot
+                    else:
+                        self._hits += 1
+            except BaseException:
+                self._stale = True
+                raise
+
+            self._checked_at = checked_at
+            return snapshot
+
+    def invalidate(self) -> None:
+        """Пометить снимок для проверки версии при следующем обращении"""
+        self._stale = True
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "size": len(snapshot) if snapshot else 0,
+            "hits": self._hits,
+            "misses": self._misses,
+            "rebuilds": self._rebuilds,
+            "version_checks": self._version_checks,
+            "last_build_ms": round(self._last_build_ms, 3),
+        }
+
+    def _read_version(self, conn) -> int:
+        row = conn.execute(
+            "SELECT version FROM catalogue_version WHERE name = ?", (self.NAME,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _build(self, conn, version: int) -> S:
+        started = time.perf_counter()
+        # Версия читается до загрузки: параллельная запись даст новую версию
+        # и следующий get() перестроит снимок
+        snapshot = self._load(conn, version)
+        self._last_build_ms = (time.perf_counter() - started) * 1000
+        self._rebuilds += 1
+        return snapshot
+
+    def _load(self, conn, version: int) -> S:
+        """Загрузить данные каталога из БД и построить снимок"""
+        raise NotImplementedError
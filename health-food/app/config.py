@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -18,3 +18,276 @@ def get_openai_api_key() -> Optional[str]:
 
 def has_openai_api_key() -> bool:
     return bool(get_openai_api_key())
+
+
+def _get_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _get_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_db_pool_size() -> int:
+    # Max number of SQLite connections kept by the pool per process
+    return _get_int("DB_POOL_SIZE", 8)
+
+
+def get_db_executor_workers() -> int:
+    # Threads running blocking DB calls of async handlers; as many as
+    # there are pooled connections by default
+    return _get_int("DB_EXECUTOR_WORKERS", get_db_pool_size())
+
+
+def get_db_pool_timeout() -> float:
+    # Seconds a request waits for a free connection before failing
+    return _get_float("DB_POOL_TIMEOUT", 10.0)
+
+
+def get_db_storage_profile() -> Dict[str, Any]:
+    # PRAGMAs applied to every SQLite connection (pooled and writer)
+    return {
+        "journal_mode": os.getenv("DB_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+        "mmap_size": _get_int("DB_MMAP_SIZE", 256 * 1024 * 1024),
+        # Negative value = size in KiB
+        "cache_size": _get_int("DB_CACHE_SIZE", -16000),
+        "busy_timeout": _get_int("DB_BUSY_TIMEOUT_MS", 5000),
+    }
+
+
+def get_db_write_batch_size() -> int:
+    # Max number of queued writes committed in one transaction
+    return _get_int("DB_WRITE_BATCH_SIZE", 64)
+
+
+def get_db_write_batch_window() -> float:
+    # Seconds the writer lingers for more writes before committing a batch
+    return _get_int("DB_WRITE_BATCH_WINDOW_MS", 0) / 1000
+
+
+def get_catalogue_check_interval() -> float:
+    # Seconds between checks of the catalogue version counter in the DB
+    return _get_float("CATALOGUE_CHECK_INTERVAL", 2.0)
+
+
+SCORING_ENGINES = ("auto", "numpy", "python")
+
+
+def get_scoring_engine() -> str:
+    # Recipe/dish scoring backend: "numpy" (vectorized), "python" (inverted
+    # index for recipes, plain loop for dishes) or "auto" - the faster one per
+    # catalogue: the index for recipes (~25x faster at 100k), numpy for dishes
+    engine = os.getenv("SCORING_ENGINE", "auto").strip().lower()
+    if engine not in SCORING_ENGINES:
+        raise ValueError(f"Unknown SCORING_ENGINE {engine!r}, expected one of {SCORING_ENGINES}")
+    return engine
+
+
+JSON_BACKENDS = ("auto", "orjson", "json")
+
+
+def get_json_backend() -> str:
+    # JSON encoder/decoder: "orjson", stdlib "json", or "auto" (orjson if installed)
+    backend = os.getenv("JSON_BACKEND", "auto").strip().lower()
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON_BACKEND {backend!r}, expected one of {JSON_BACKENDS}")
+    return backend
+
+
+def get_geo_grid_cell_deg() -> float:
+    # Cell size (degrees) of the in-process restaurant grid; 0.05° ≈ 5.5 km
+    return _get_float("GEO_GRID_CELL_DEG", 0.05)
+
+
+def get_geo_fast_distance() -> bool:
+    # Use the equirectangular approximation for small search radii
+    # (see app.geo for its error bound); haversine otherwise
+    return _get_bool("GEO_FAST_DISTANCE", False)
+
+
+def get_openai_http_settings() -> Dict[str, Any]:
+    # Shared HTTP transport of the OpenAI client (keep-alive pool and timeouts)
+    return {
+        "max_connections": _get_int("OPENAI_MAX_CONNECTIONS", 20),
+        "max_keepalive_connections": _get_int("OPENAI_MAX_KEEPALIVE", 10),
+        "keepalive_expiry": _get_float("OPENAI_KEEPALIVE_EXPIRY", 30.0),
+        "connect_timeout": _get_float("OPENAI_CONNECT_TIMEOUT", 5.0),
+        # Read timeout covers slow vision/agent responses
+        "timeout": _get_float("OPENAI_TIMEOUT", 90.0),
+        # Retries are done by AIService admission control (with backoff and
+        # circuit breaker), the SDK's own retries would multiply them
+        "max_retries": _get_int("OPENAI_MAX_RETRIES", 0),
+    }
+
+
+# Default concurrent upstream calls per AIService operation
+AI_OPERATION_CONCURRENCY = {
+    "photo": 4,
+    "recipes": 2,
+    "consultation": 4,
+}
+
+
+def get_ai_admission_settings(operation: str) -> Dict[str, Any]:
+    # Admission control for LLM calls: concurrency, bounded wait queue,
+    # retries with backoff and circuit breaker
+    env = operation.upper()
+    return {
+        "max_concurrent": _get_int(
+            f"AI_{env}_MAX_CONCURRENT", AI_OPERATION_CONCURRENCY.get(operation, 2)
+        ),
+        "max_queue": _get_int(f"AI_{env}_MAX_QUEUE", _get_int("AI_MAX_QUEUE", 16)),
+        "queue_timeout": _get_float("AI_QUEUE_TIMEOUT", 10.0),
+        "retry_attempts": _get_int("AI_RETRY_ATTEMPTS", 3),
+        "retry_base_delay": _get_float("AI_RETRY_BASE_DELAY", 0.5),
+        "retry_max_delay": _get_float("AI_RETRY_MAX_DELAY", 8.0),
+    }
+
+
+def get_ai_circuit_breaker_settings() -> Dict[str, Any]:
+    return {
+        "failure_threshold": _get_int("AI_BREAKER_FAILURES", 5),
+        "reset_timeout": _get_float("AI_BREAKER_RESET_TIMEOUT", 30.0),
+    }
+
+
+def get_llm_cache_settings() -> Dict[str, Any]:
+    # Cache of LLM responses (ai_recipe): in-memory TTL+LRU tier and an
+    # optional persistent tier in the llm_cache table
+    return {
+        "enabled": _get_bool("LLM_CACHE_ENABLED", True),
+        "ttl": _get_float("LLM_CACHE_TTL", 24 * 3600.0),
+        "max_entries": _get_int("LLM_CACHE_MAX_ENTRIES", 512),
+        "persistent": _get_bool("LLM_CACHE_PERSISTENT", False),
+    }
+
+
+IMAGE_FORMATS = ("jpeg", "webp")
+
+
+def get_image_settings() -> Dict[str, Any]:
+    # Fridge photo preprocessing before the vision call. The defaults match
+    # what the vision model actually looks at: longest side 2048 px,
+    # shortest side 768 px
+    output_format = os.getenv("IMAGE_FORMAT", "jpeg").strip().lower()
+    if output_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported IMAGE_FORMAT: {output_format}")
+    return {
+        "max_upload_bytes": _get_int("IMAGE_MAX_UPLOAD_BYTES", 10 * 1024 * 1024),
+        "max_side": _get_int("IMAGE_MAX_SIDE", 2048),
+        "short_side": _get_int("IMAGE_SHORT_SIDE", 768),
+        "format": output_format,
+        "quality": _get_int("IMAGE_QUALITY", 85),
+    }
+
+
+def get_sse_heartbeat_interval() -> float:
+    # Comment frames keep idle SSE connections open through proxies
+    return _get_float("SSE_HEARTBEAT_SECONDS", 15.0)
+
+
+def get_thread_settings() -> Dict[str, Any]:
+    # Conversation threads of the nutrition agent: how many recent tokens
+    # of history go into the prompt, how long the summary of older turns
+    # may grow, and after how many idle days a thread is deleted (0 - never)
+    return {
+        "history_token_budget": _get_int("THREAD_HISTORY_TOKEN_BUDGET", 1500),
+        "summary_token_budget": _get_int("THREAD_SUMMARY_TOKEN_BUDGET", 300),
+        "cache_size": _get_int("THREAD_CACHE_SIZE", 256),
+        "ttl": _get_float("THREAD_TTL_DAYS", 30.0) * 86400,
+    }
+
+
+LLM_PROVIDERS = ("openai", "stub")
+STUB_LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+
+def get_llm_provider_name() -> str:
+    # "stub" - deterministic local provider for offline load testing
+    name = os.getenv("LLM_PROVIDER", "openai").strip().lower()
+    if name not in LLM_PROVIDERS:
+        raise ValueError(f"Unsupported LLM_PROVIDER: {name}")
+    return name
+
+
+def get_stub_llm_settings() -> Dict[str, Any]:
+    distribution = os.getenv("STUB_LLM_LATENCY_DIST", "lognormal").strip().lower()
+    if distribution not in STUB_LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unsupported STUB_LLM_LATENCY_DIST: {distribution}")
+    return {
+        # Time to the first token / whole non-streaming response
+        "latency_ms": _get_float("STUB_LLM_LATENCY_MS", 800.0),
+        "jitter_ms": _get_float("STUB_LLM_JITTER_MS", 250.0),
+        "distribution": distribution,
+        # Delay between streamed chunks
+        "chunk_ms": _get_float("STUB_LLM_CHUNK_MS", 15.0),
+        # Probabilities of injected retryable failures and 429 responses
+        "failure_rate": _get_float("STUB_LLM_FAILURE_RATE", 0.0),
+        "rate_limit_rate": _get_float("STUB_LLM_RATE_LIMIT_RATE", 0.0),
+        "retry_after": _get_float("STUB_LLM_RETRY_AFTER", 1.0),
+        "seed": _get_int("STUB_LLM_SEED", 0),
+    }
+
+
+def get_metrics_window() -> float:
+    # Rolling window of the latency/token percentiles in /health and /metrics
+    return _get_float("METRICS_WINDOW_SECONDS", 300.0)
+
+
+def get_llm_token_budget_settings() -> Dict[str, Any]:
+    # Per-user limit of LLM tokens (prompt + completion) per window;
+    # 0 disables the limit
+    return {
+        "limit": _get_int("LLM_USER_TOKEN_BUDGET", 0),
+        "window": _get_float("LLM_USER_TOKEN_BUDGET_WINDOW", 24 * 3600.0),
+    }
+
+
+def get_password_hashing_settings() -> Dict[str, Any]:
+    # bcrypt runs in a dedicated thread pool (bcrypt releases the GIL);
+    # hashes with a different cost are upgraded on the next login
+    return {
+        "rounds": _get_int("BCRYPT_ROUNDS", 12),
+        "workers": _get_int("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)),
+        # Hashing jobs waiting for a worker; beyond that logins get 503
+        "max_pending": _get_int("PASSWORD_HASH_MAX_PENDING", 64),
+    }
+
+
+def get_principal_cache_settings() -> Dict[str, Any]:
+    # Authenticated users by token; an entry never outlives its token.
+    # ttl = 0 disables the cache
+    return {
+        "ttl": _get_float("AUTH_PRINCIPAL_CACHE_TTL", 60.0),
+        "max_entries": _get_int("AUTH_PRINCIPAL_CACHE_SIZE", 1024),
+    }
+
+
+def get_compression_settings() -> Dict[str, Any]:
+    # On-the-fly br/gzip of API responses; smaller bodies are sent as is.
+    # Brotli quality 4 costs about as much CPU as gzip -6 and compresses better
+    return {
+        "enabled": _get_bool("COMPRESSION_ENABLED", True),
+        "min_size": _get_int("COMPRESSION_MIN_SIZE", 1024),
+        "gzip_level": _get_int("COMPRESSION_GZIP_LEVEL", 6),
+        "brotli_quality": _get_int("COMPRESSION_BROTLI_QUALITY", 4),
+    }
+
+
+def get_static_settings() -> Dict[str, Any]:
+    # Static assets: .br/.gz variants are built once (max compression) and
+    # served as is; content-hashed file names are cached as immutable
+    return {
+        "precompress": _get_bool("STATIC_PRECOMPRESS", True),
+        "immutable_max_age": _get_int("STATIC_IMMUTABLE_MAX_AGE", 31536000),
+    }
@@ -1,209 +1,731 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
 import json
+import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from . import serialization
+from .config import (
+    get_db_executor_workers,
+    get_db_pool_size,
+    get_db_pool_timeout,
+    get_db_storage_profile,
+    get_db_write_batch_size,
+    get_db_write_batch_window,
+)
 
 DB_PATH = Path(__file__).resolve().parent.parent / "data.db"
 
+logger = logging.getLogger(__name__)
 
-def get_conn():
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """Opens a connection with the configured storage profile applied."""
+    profile = get_db_storage_profile()
+    journal_mode = profile["journal_mode"].upper()
+    synchronous = profile["synchronous"].upper()
+    if journal_mode not in _JOURNAL_MODES:
+        raise ValueError(f"Unsupported DB_JOURNAL_MODE: {journal_mode}")
+    if synchronous not in _SYNCHRONOUS_MODES:
+        raise ValueError(f"Unsupported DB_SYNCHRONOUS: {synchronous}")
+
+    conn = sqlite3.connect(
+        path, check_same_thread=False, timeout=profile["busy_timeout"] / 1000
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+    conn.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
     return conn
 
 
-def _seed_data(conn):
-    from .recipe_utils import RECIPE_DB
-    from .restaurants import RESTAURANTS_DB
-    from .rules import BIOMARKER_RULES
+class PoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection becomes free within the wait timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by all requests of a process.
+
+    Idle connections are reused LIFO so the hottest connection (with a warm
+    page cache) is handed out first. Checkout blocks up to ``timeout`` seconds
+    once ``max_size`` connections are in use.
+    """
+
+    def __init__(self, path: str, max_size: int = 8, timeout: float = 10.0):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: List[sqlite3.Connection] = []
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        # Metrics
+        self._created = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self) -> sqlite3.Connection:
+        started = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    conn = None
+                    break
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._in_use >= self.max_size:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No free database connection after {self.timeout:.1f}s"
+                        )
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                elapsed = time.perf_counter() - started
+                self._waits += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+
+        if conn is None:
+            try:
+                conn = _connect(self.path)
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._created += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False) -> None:
+        if not discard:
+            try:
+                # Never hand out a connection with a dangling transaction
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.row_factory = sqlite3.Row
+            except sqlite3.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                conn.close()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._in_use + len(self._idle),
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "created": self._created,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_ms_total": round(self._wait_total * 1000, 3),
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+# Connection already checked out by the current thread/task, for nested use
+_current_conn: contextvars.ContextVar[Optional[sqlite3.Connection]] = contextvars.ContextVar(
+    "current_conn", default=None
+)
+
+
+def get_pool() -> ConnectionPool:
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # Connections must not be shared with a forked parent process
+                _pool = ConnectionPool(
+                    str(DB_PATH),
+                    max_size=get_db_pool_size(),
+                    timeout=get_db_pool_timeout(),
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def close_pool() -> None:
+    """Closes all pooled connections. Called on application shutdown."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    return get_pool().stats()
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection]:
+    """Checks a connection out of the pool for the duration of the block.
+
+    Nested blocks in the same thread/task reuse the outer connection instead
+    of taking a second one from the pool.
+    """
+    current = _current_conn.get()
+    if current is not None:
+        yield current
+        return
+
+    pool = get_pool()
+    conn = pool.acquire()
+    token = _current_conn.set(conn)
+    broken = False
+    try:
+        yield conn
+    except sqlite3.DatabaseError:
+        broken = not _is_usable(conn)
+        raise
+    finally:
+        _current_conn.reset(token)
+        pool.release(conn, discard=broken)
+
+
+def _is_usable(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("SELECT 1")
+        return True
+    except sqlite3.Error:
+        return False
+
+
+class WriteQueue:
+    """Single writer thread that applies queued writes as group commits.
+
+    Each submitted callable receives the writer connection and must not
+    commit itself: all writes that are queued at the same time run inside
+    one ``BEGIN IMMEDIATE ... COMMIT`` transaction, each under its own
+    savepoint so a failing write does not roll back its neighbours.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, max_batch: int = 64, batch_window: float = 0.0):
+        self.path = path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        # Metrics
+        self._batches = 0
+        self._writes = 0
+        self._failed = 0
+        self._max_batch_seen = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sqlite-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        if self._closed:
+            raise RuntimeError("Write queue is closed")
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def execute(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Queues a write and blocks until its batch is committed."""
+        return self.submit(fn).result()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(self._STOP)
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self._batches,
+            "writes": self._writes,
+            "failed": self._failed,
+            "max_batch": self._max_batch_seen,
+            "avg_batch": round(self._writes / self._batches, 2) if self._batches else 0.0,
+        }
+
+    def _run(self) -> None:
+        conn = _connect(self.path)
+        # Transactions are managed explicitly below
+        conn.isolation_level = None
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is self._STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.batch_window
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        if remaining > 0:
+                            item = self._queue.get(timeout=remaining)
+                        else:
+                            item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._apply(conn, batch)
+        finally:
+            conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, batch: List[Any]) -> None:
+        pending = [(fn, fut) for fn, fut in batch if fut.set_running_or_notify_cancel()]
+        if not pending:
+            return
+
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, fut in pending:
+                conn.execute("SAVEPOINT queued_write")
+                try:
+                    value = fn(conn)
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO queued_write")
+                    conn.execute("RELEASE queued_write")
+                    outcomes.append((fut, None, exc))
+                else:
+                    conn.execute("RELEASE queued_write")
+                    outcomes.append((fut, value, None))
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self._failed += len(pending)
+            for _, fut in pending:
+                fut.set_exception(exc)
+            return
+
+        self._batches += 1
+        self._writes += len(pending)
+        self._max_batch_seen = max(self._max_batch_seen, len(pending))
+        for fut, value, exc in outcomes:
+            if exc is not None:
+                self._failed += 1
+                fut.set_exception(exc)
+            else:
+                fut.set_result(value)
+
+
+_write_queue: Optional[WriteQueue] = None
+_write_queue_pid: Optional[int] = None
+
+
+def get_write_queue() -> WriteQueue:
+    global _write_queue, _write_queue_pid
+    pid = os.getpid()
+    if _write_queue is None or _write_queue_pid != pid:
+        with _pool_lock:
+            if _write_queue is None or _write_queue_pid != pid:
+                _write_queue = WriteQueue(
+                    str(DB_PATH),
+                    max_batch=get_db_write_batch_size(),
+                    batch_window=get_db_write_batch_window(),
+                )
+                _write_queue_pid = pid
+    return _write_queue
+
+
+def run_write(fn: Callable[[sqlite3.Connection], Any]) -> Any:
+    """Runs ``fn(conn)`` on the single writer and waits for its group commit."""
+    return get_write_queue().execute(fn)
+
+
+async def write(fn: Callable[[sqlite3.Connection], Any]) -> Any:
+    """Awaitable :func:`run_write`: no thread is parked while the commit is pending."""
+    return await asyncio.wrap_future(get_write_queue().submit(fn))
+
+
+def log_failed_write(future: Future, description: str) -> Future:
+    """Logs the error of a write that nobody awaits; returns ``future``."""
+    def done(fut: Future) -> None:
+        exc = fut.exception()
+        if exc is not None:
+            logger.error(f"Queued write failed ({description}): {exc!r}")
+
+    future.add_done_callback(done)
+    return future
+
+
+def get_write_queue_stats() -> Dict[str, Any]:
+    return get_write_queue().stats()
+
+
+def close_write_queue() -> None:
+    """Flushes pending writes and stops the writer thread."""
+    global _write_queue
+    with _pool_lock:
+        write_queue, _write_queue = _write_queue, None
+    if write_queue is not None:
+        write_queue.close()
+
+
+class DBExecutor:
+    """Dedicated thread pool for blocking SQLite work of async handlers.
+
+    Awaiting :meth:`run` keeps the event loop free while a query runs, so a
+    slow statement only delays its own request. The pool is sized like the
+    connection pool: more threads would only queue on connection checkout.
+    Writes are better awaited with :func:`write`, which holds no thread
+    while the single writer is busy.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="db")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _call(self, submitted: float, fn: Callable[[], Any]) -> Any:
+        waited = time.perf_counter() - submitted
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        # Never inherit a connection checked out by the awaiting task
+        _current_conn.set(None)
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            self._queued += 1
+        context = contextvars.copy_context()
+        call = functools.partial(
+            context.run, self._call, time.perf_counter(), functools.partial(fn, *args, **kwargs)
+        )
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
 
-    cur = conn.cursor()
-    # Create a default user - REMOVED for auth implementation
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
 
-    # Seed recipes
-    for recipe in RECIPE_DB:
-        cur.execute(
-            """
-            INSERT OR IGNORE INTO recipes (id, user_id, name, time_min, description, ingredients, instructions, tags)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "wait_ms_total": round(self._wait_total * 1000, 3),
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+            }
+
+
+_db_executor: Optional[DBExecutor] = None
+_db_executor_pid: Optional[int] = None
+
+
+def get_db_executor() -> DBExecutor:
+    global _db_executor, _db_executor_pid
+    pid = os.getpid()
+    if _db_executor is None or _db_executor_pid != pid:
+        with _pool_lock:
+            if _db_executor is None or _db_executor_pid != pid:
+                _db_executor = DBExecutor(get_db_executor_workers())
+                _db_executor_pid = pid
+    return _db_executor
+
+
+async def run_db(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Awaits ``fn(*args, **kwargs)`` run on the DB thread pool.
+
+    For functions that take their own connection (``connection()``,
+    ``run_write``) or need none.
+    """
+    return await get_db_executor().run(fn, *args, **kwargs)
+
+
+async def run_with_conn(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Awaits ``fn(conn, *args, **kwargs)`` with a pooled connection, on the DB thread pool."""
+    def call() -> Any:
+        with connection() as conn:
+            return fn(conn, *args, **kwargs)
+
+    return await run_db(call)
+
+
+def get_db_executor_stats() -> Dict[str, Any]:
+    return get_db_executor().stats()
+
+
+def close_db_executor() -> None:
+    """Waits for running DB calls and stops the threads."""
+    global _db_executor
+    with _pool_lock:
+        executor, _db_executor = _db_executor, None
+    if executor is not None:
+        executor.close()
+
+
+def get_conn() -> Iterator[sqlite3.Connection]:
+    """FastAPI dependency: one pooled connection per request, returned on exit."""
+    pool = get_pool()
+    conn = pool.acquire()
+    broken = False
+    try:
+        yield conn
+    except sqlite3.DatabaseError:
+        broken = not _is_usable(conn)
+        raise
+    finally:
+        pool.release(conn, discard=broken)
+
+
+# Bump when the way seed data is written changes, to force a re-seed
+SEED_REVISION = 2
+
+
+def _seed_hash(items: List[Dict[str, Any]]) -> str:
+    payload = json.dumps(
+        {"revision": SEED_REVISION, "items": items}, sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _seed_recipes(conn: sqlite3.Connection, recipes: List[Dict[str, Any]]) -> None:
+    conn.executemany(
+        """
+        INSERT INTO recipes (id, user_id, name, time_min, description, ingredients, instructions, tags, difficulty)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            name = excluded.name,
+            time_min = excluded.time_min,
+            description = excluded.description,
+            ingredients = excluded.ingredients,
+            instructions = excluded.instructions,
+            tags = excluded.tags,
+            difficulty = excluded.difficulty
+        WHERE recipes.user_id IS NULL
+        """,
+        [
             (
                 recipe["id"],
                 None,  # Public recipe
                 recipe["name"],
                 recipe.get("time_min"),
                 recipe.get("description"),
-                json.dumps(recipe.get("ingredients", [])),
-                json.dumps(recipe.get("instructions", [])),
-                json.dumps(recipe.get("tags", [])),
-            ),
-        )
+                serialization.dumps(recipe.get("ingredients", [])),
+                serialization.dumps(recipe.get("instructions", [])),
+                serialization.dumps(recipe.get("tags", [])),
+                recipe.get("difficulty"),
+            )
+            for recipe in recipes
+        ],
+    )
+    conn.executemany(
+        "DELETE FROM recipe_nutrients WHERE recipe_id = ?",
+        [(recipe["id"],) for recipe in recipes],
+    )
+    conn.executemany(
+        "INSERT INTO recipe_nutrients (recipe_id, nutrient, amount) VALUES (?, ?, ?)",
+        [
+            (recipe["id"], nutrient, amount)
+            for recipe in recipes
+            for nutrient, amount in recipe.get("nutrients", {}).items()
+        ],
+    )
 
-    # Seed restaurants and dishes
-    for restaurant in RESTAURANTS_DB:
-        cur.execute("SELECT id FROM restaurants WHERE id = ?", (restaurant["id"],))
-        if cur.fetchone():
-            continue  # Skip if restaurant already exists
 
-        cur.execute(
-            "INSERT INTO restaurants (id, name, lat, lon) VALUES (?, ?, ?, ?)",
-            (
-                restaurant["id"],
-                restaurant["name"],
-                restaurant["lat"],
-                restaurant["lon"],
-            ),
-        )
-        restaurant_id = restaurant["id"]
-        for dish in restaurant.get("dishes", []):
-            cur.execute(
-                "INSERT INTO dishes (restaurant_id, name, nutrients) VALUES (?, ?, ?)",
-                (restaurant_id, dish["name"], json.dumps(dish.get("nutrients", {}))),
-            )
+def _seed_restaurants(conn: sqlite3.Connection, restaurants: List[Dict[str, Any]]) -> None:
+    conn.executemany(
+        """
+        INSERT INTO restaurants (id, name, lat, lon) VALUES (?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET name = excluded.name, lat = excluded.lat, lon = excluded.lon
+        """,
+        [(r["id"], r["name"], r["lat"], r["lon"]) for r in restaurants],
+    )
+    # Seeded menus are replaced as a whole
+    conn.executemany(
+        "DELETE FROM dishes WHERE restaurant_id = ?",
+        [(r["id"],) for r in restaurants],
+    )
+    conn.executemany(
+        "INSERT INTO dishes (restaurant_id, name, nutrients) VALUES (?, ?, ?)",
+        [
+            (r["id"], dish["name"], serialization.dumps(dish.get("nutrients", {})))
+            for r in restaurants
+            for dish in r.get("dishes", [])
+        ],
+    )
 
-    # Seed biomarker rules
-    cur.execute("DELETE FROM biomarker_rules")
-    for rule in BIOMARKER_RULES:
-        cur.execute(
-            """
-            INSERT INTO biomarker_rules (marker_key, operator, threshold, deficit_tag, reason_template, targets, foods)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
+
+def _seed_biomarker_rules(conn: sqlite3.Connection, rules: List[Dict[str, Any]]) -> None:
+    conn.execute("DELETE FROM biomarker_rules")
+    conn.executemany(
+        """
+        INSERT INTO biomarker_rules (marker_key, operator, threshold, deficit_tag, reason_template, targets, foods)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
             (
                 rule["marker_key"],
                 rule["operator"],
                 rule["threshold"],
                 rule["deficit_tag"],
                 rule["reason_template"],
-                json.dumps(rule.get("targets", {})),
-                json.dumps(rule.get("foods", [])),
-            ),
-        )
+                serialization.dumps(rule.get("targets", {})),
+                serialization.dumps(rule.get("foods", [])),
+            )
+            for rule in rules
+        ],
+    )
 
-    conn.commit()
 
+def _seed_data(conn):
+    """Seeds the catalogue only when the content of a seed source changed.
 
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
+    The content hash of every source is stored in ``seed_manifest``. The
+    comparison is repeated under ``BEGIN IMMEDIATE`` so that when several
+    workers boot at once exactly one of them writes and the rest no-op.
+    """
+    from .recipe_utils import RECIPE_DB
+    from .restaurants import RESTAURANTS_DB
+    from .rules import BIOMARKER_RULES
 
-    # Main tables
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            hashed_password TEXT NOT NULL,
-            goals TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS recipes (
-            id TEXT PRIMARY KEY,
-            user_id INTEGER,
-            name TEXT NOT NULL,
-            time_min INTEGER,
-            description TEXT,
-            ingredients TEXT,
-            instructions TEXT,
-            tags TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS restaurants (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            lat REAL NOT NULL,
-            lon REAL NOT NULL
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS dishes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            restaurant_id TEXT,
-            name TEXT NOT NULL,
-            nutrients TEXT,
-            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS biomarker_rules (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            marker_key TEXT NOT NULL,
-            operator TEXT NOT NULL,
-            threshold REAL NOT NULL,
-            deficit_tag TEXT NOT NULL,
-            reason_template TEXT,
-            targets TEXT,
-            foods TEXT
-        )
-        """
-    )
+    sources = [
+        ("recipes", RECIPE_DB, _seed_recipes),
+        ("restaurants", RESTAURANTS_DB, _seed_restaurants),
+        ("biomarker_rules", BIOMARKER_RULES, _seed_biomarker_rules),
+    ]
+    hashes = {name: _seed_hash(items) for name, items, _ in sources}
 
-    # Dependent tables
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS labs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            data_json TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            due_at TEXT NOT NULL,
-            kind TEXT NOT NULL,
-            note TEXT,
-            done INTEGER DEFAULT 0,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
+    def stale_sources() -> List[str]:
+        stored = dict(
+            conn.execute("SELECT source, content_hash FROM seed_manifest").fetchall()
         )
-        """
-    )
-    conn.commit()
+        return [name for name, content_hash in hashes.items() if stored.get(name) != content_hash]
+
+    # Fast path: nothing changed, no write lock taken
+    if not stale_sources():
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stale = stale_sources()
+        for name, items, seed in sources:
+            if name not in stale:
+                continue
+            logger.info(f"Seeding {name}: {len(items)} items")
+            seed(conn, items)
+            conn.execute(
+                """
+                INSERT INTO seed_manifest (source, content_hash) VALUES (?, ?)
+                ON CONFLICT (source) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    applied_at = CURRENT_TIMESTAMP
+                """,
+                (name, hashes[name]),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def init_db():
+    from .migrations import find_unindexed_queries, migrate
+
+    with connection() as conn:
+        migrate(conn)
 
-    # Seed initial data
-    _seed_data(conn)
+        unindexed = find_unindexed_queries(conn)
+        for name, plan in unindexed.items():
+            logger.warning(f"Hot query {name} is not served by an index: {plan}")
 
-    conn.close()
+        # Seed initial data
+        _seed_data(conn)
 
 
-def save_labs_and_schedule(
+async def save_labs_and_schedule(
     labs: Dict[str, Any], weeks_from_now: int = 10, note: str = "Re-test labs"
 ) -> Dict[str, Any]:
     import datetime as dt
 
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO labs (user_id, data_json) VALUES (1, ?)", (json.dumps(labs),)
-    )
     due_date = dt.datetime.utcnow() + dt.timedelta(weeks=weeks_from_now)
-    cur.execute(
-        "INSERT INTO reminders (user_id, due_at, kind, note) VALUES (1, ?, ?, ?)",
-        (due_date.strftime("%Y-%m-%dT%H:%M:%SZ"), "labs_retest", note),
-    )
-    conn.commit()
-    conn.close()
+
+    def insert(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "INSERT INTO labs (user_id, data_json) VALUES (1, ?)", (serialization.dumps(labs),)
+        )
+        conn.execute(
+            "INSERT INTO reminders (user_id, due_at, kind, note) VALUES (1, ?, ?, ?)",
+            (due_date.strftime("%Y-%m-%dT%H:%M:%SZ"), "labs_retest", note),
+        )
+
+    await write(insert)
     return {"status": "ok", "due_at": due_date.strftime("%Y-%m-%dT%H:%M:%SZ")}
 
 
@@ -212,95 +734,68 @@ def get_upcoming_reminders(days: int = 120) -> List[Dict[str, Any]]:
 
     now = dt.datetime.utcnow()
     until = now + dt.timedelta(days=days)
-    conn = get_conn()
-    cur = conn.cursor()
-    rows = cur.execute(
-        "SELECT id, due_at, kind, note, done FROM reminders WHERE done=0 AND user_id = 1 AND due_at BETWEEN ? AND ? ORDER BY due_at ASC",
-        (now.strftime("%Y-%m-%dT%H:%M:%SZ"), until.strftime("%Y-%m-%dT%H:%M:%SZ")),
-    ).fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT id, due_at, kind, note, done FROM reminders WHERE done=0 AND user_id = 1 AND due_at BETWEEN ? AND ? ORDER BY due_at ASC",
+            (now.strftime("%Y-%m-%dT%H:%M:%SZ"), until.strftime("%Y-%m-%dT%H:%M:%SZ")),
+        ).fetchall()
     return [dict(r) for r in rows]
 
 
 def get_restaurants_with_dishes() -> List[Dict[str, Any]]:
-    conn = get_conn()
-    cur = conn.cursor()
-
     restaurants = {}
 
-    rows = cur.execute("SELECT id, name, lat, lon FROM restaurants").fetchall()
+    with connection() as conn:
+        cur = conn.cursor()
+        rows = cur.execute("SELECT id, name, lat, lon FROM restaurants").fetchall()
+        dish_rows = cur.execute(
+            "SELECT restaurant_id, name, nutrients FROM dishes"
+        ).fetchall()
+
     for row in rows:
         restaurants[row["id"]] = dict(row)
         restaurants[row["id"]]["dishes"] = []
 
-    dish_rows = cur.execute(
-        "SELECT restaurant_id, name, nutrients FROM dishes"
-    ).fetchall()
     for dish_row in dish_rows:
         res_id = dish_row["restaurant_id"]
         if res_id in restaurants:
             dish = dict(dish_row)
-            dish["nutrients"] = json.loads(dish["nutrients"])
+            dish["nutrients"] = serialization.loads(dish["nutrients"])
             restaurants[res_id]["dishes"].append(dish)
 
-    conn.close()
     return list(restaurants.values())
 
 
 def get_biomarker_rules() -> List[Dict[str, Any]]:
-    conn = get_conn()
-    cur = conn.cursor()
-    rows = cur.execute("SELECT * FROM biomarker_rules").fetchall()
-    conn.close()
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM biomarker_rules").fetchall()
 
     rules = []
     for row in rows:
         rule = dict(row)
-        rule["targets"] = json.loads(rule["targets"])
-        rule["foods"] = json.loads(rule["foods"])
+        rule["targets"] = serialization.loads(rule["targets"])
+        rule["foods"] = serialization.loads(rule["foods"])
         rules.append(rule)
     return rules
 
 
 def get_public_recipes() -> List[Dict[str, Any]]:
-    conn = get_conn()
-    cur = conn.cursor()
-    rows = cur.execute("SELECT * FROM recipes WHERE user_id IS NULL").fetchall()
-    conn.close()
+    from .repositories.recipe_repository import RecipeRepository
 
-    recipes = []
-    for row in rows:
-        recipe = dict(row)
-        recipe["ingredients"] = json.loads(recipe["ingredients"])
-        recipe["instructions"] = json.loads(recipe["instructions"])
-        recipe["tags"] = json.loads(recipe["tags"])
-        recipes.append(recipe)
-    return recipes
+    with connection() as conn:
+        return RecipeRepository(conn).get_all_public()
 
 
-def save_user_recipe(conn: sqlite3.Connection, user_id: int, recipe: Dict[str, Any]) -> Dict[str, Any]:
-    """Saves a new recipe for a specific user."""
-    cur = conn.cursor()
+async def save_user_recipe(user_id: int, recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """Saves a new recipe (with its nutrients) for a specific user.
 
-    recipe_id = recipe.get("id", f"ai_{uuid.uuid4().hex[:8]}")
+    Awaits the single writer's group commit without parking a thread:
+    concurrent saves are committed together.
+    """
+    from .repositories.recipe_repository import RecipeRepository
 
-    cur.execute(
-        """
-        INSERT INTO recipes (id, user_id, name, time_min, description, ingredients, instructions, tags)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            recipe_id,
-            user_id,
-            recipe.get("name"),
-            recipe.get("time_min"),
-            recipe.get("description"),
-            json.dumps(recipe.get("ingredients", [])),
-            json.dumps(recipe.get("instructions", [])),
-            json.dumps(recipe.get("tags", [])),
-        ),
-    )
-    conn.commit()
+    recipe_id = recipe.get("id") or f"ai_{uuid.uuid4().hex[:8]}"
+    await write(lambda writer: RecipeRepository.insert(writer, recipe_id, recipe, user_id))
 
     saved_recipe = recipe.copy()
     saved_recipe["id"] = recipe_id
@@ -309,20 +804,22 @@ def save_user_recipe(conn: sqlite3.Connection, user_id: int, recipe: Dict[str, A
     return saved_recipe
 
 
-def save_profile(name: str = "", email: str = "", goals: str = "", user_id: int = None) -> Dict[str, Any]:
-    """Updates user profile information (name, email, and goals)."""
-    conn = get_conn()
-    cur = conn.cursor()
-    
-    cur.execute(
-        """
-        UPDATE users 
-        SET username = ?, email = ?, goals = ?
-        WHERE id = ?
-        """,
-        (name, email, goals, user_id)
+async def save_profile(name: str = "", email: str = "", goals: str = "", user_id: int = None) -> Dict[str, Any]:
+    """Updates user profile information (name, email, and goals).
+
+    The caller drops the user's cached principals afterwards, see
+    ``app.auth.principal_cache.invalidate_principal``.
+    """
+    await write(
+        lambda conn: conn.execute(
+            """
+            UPDATE users 
+            SET username = ?, email = ?, goals = ?
+            WHERE id = ?
+            """,
+            (name, email, goals, user_id)
+        )
     )
-    conn.commit()
     
     result = {
         "username": name,
@@ -330,7 +827,6 @@ def save_profile(name: str = "", email: str = "", goals: str = "", user_id: int
         "goals": goals
     }
     
-    conn.close()
     return result
 
 
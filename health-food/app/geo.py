@@ -0,0 +1,127 @@
+"""Great-circle distance helpers shared by restaurant search and scoring."""
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# The equirectangular approximation (flat-earth projection around the mean
+# latitude) is only used inside this envelope. Measured against haversine
+# over random bearings and distances, its relative error there stays below
+# EQUIRECTANGULAR_REL_ERROR: at most ~1.1 m at 50 km, ~1 cm at 10 km.
+# The error grows with distance squared and with tan(latitude).
+EQUIRECTANGULAR_MAX_KM = 50.0
+EQUIRECTANGULAR_MAX_LAT = 70.0
+EQUIRECTANGULAR_REL_ERROR = 3e-5
+
+# Slack added to bounding boxes so points exactly on the radius survive
+# floating point rounding in the prefilter (~0.1 mm)
+_BOX_EPSILON_DEG = 1e-9
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance between two points in kilometres (haversine formula)."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+
+    a = (
+        math.sin(dphi / 2) ** 2 +
+        math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_many(
+    lat: float, lon: float, lats: np.ndarray, lons: np.ndarray
+) -> np.ndarray:
+    """Distances in kilometres from one point to arrays of points, in one pass.
+
+    Same formula as :func:`haversine_km`; results may differ from it in the
+    last bit because NumPy and ``math`` use different sin/cos kernels.
+    """
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = np.radians(lats - lat)
+    dlambda = np.radians(lons - lon)
+
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def equirectangular_many(
+    lat: float, lon: float, lats: np.ndarray, lons: np.ndarray
+) -> np.ndarray:
+    """Approximate distances in kilometres (equirectangular projection).
+
+    Scales longitudes by cos of the mean latitude, itself taken to first
+    order around ``lat``, so no per-point trigonometry is needed: about
+    3-4x cheaper than :func:`haversine_many`. Only accurate for short
+    distances away from the poles, see ``EQUIRECTANGULAR_*``. Longitudes
+    are expected in [-180, 180].
+    """
+    dlon = lons - lon
+    dlon = np.where(dlon > 180.0, dlon - 360.0, np.where(dlon < -180.0, dlon + 360.0, dlon))
+    dphi = np.radians(lats - lat)
+    phi = math.radians(lat)
+    x = np.radians(dlon) * (math.cos(phi) - math.sin(phi) * 0.5 * dphi)
+    return EARTH_RADIUS_KM * np.sqrt(x * x + dphi * dphi)
+
+
+def equirectangular_applies(lat: float, radius_km: float) -> bool:
+    """True if every point within ``radius_km`` lies inside the documented envelope."""
+    reach = math.degrees(radius_km / EARTH_RADIUS_KM)
+    return radius_km <= EQUIRECTANGULAR_MAX_KM and abs(lat) + reach <= EQUIRECTANGULAR_MAX_LAT
+
+
+def distances_km(
+    lat: float,
+    lon: float,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    radius_km: float = math.inf,
+    fast: bool = False,
+) -> np.ndarray:
+    """Batched distance kernel: haversine, or equirectangular if ``fast``
+    is requested and the search radius is inside its error envelope."""
+    if fast and equirectangular_applies(lat, radius_km):
+        return equirectangular_many(lat, lon, lats, lons)
+    return haversine_many(lat, lon, lats, lons)
+
+
+def bounding_box(
+    lat: float, lon: float, radius_km: float
+) -> Tuple[float, float, Optional[float]]:
+    """Smallest lat/lon box containing the circle of ``radius_km`` around a point.
+
+    Returns ``(min_lat, max_lat, lon_delta)``: every point of the circle has
+    a latitude within ``[min_lat, max_lat]`` and a longitude within
+    ``lon_delta`` degrees of ``lon`` (across the antimeridian as well).
+    ``lon_delta`` is None when the circle covers a pole and therefore spans
+    all longitudes.
+    """
+    angular = max(radius_km, 0.0) / EARTH_RADIUS_KM
+    phi = math.radians(lat)
+    min_lat = math.degrees(phi - angular) - _BOX_EPSILON_DEG
+    max_lat = math.degrees(phi + angular) + _BOX_EPSILON_DEG
+    if min_lat <= -90.0 or max_lat >= 90.0 or angular >= math.pi / 2:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None
+
+    ratio = math.sin(angular) / math.cos(phi)
+    if ratio >= 1.0:
+        return min_lat, max_lat, None
+    return min_lat, max_lat, math.degrees(math.asin(ratio)) + _BOX_EPSILON_DEG
+
+
+def lon_offset(lon, origin: float):
+    """Signed longitude difference ``lon - origin`` wrapped to [-180, 180).
+
+    Works on scalars and NumPy arrays alike.
+    """
+    return (lon - origin + 180.0) % 360.0 - 180.0
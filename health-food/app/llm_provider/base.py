@@ -1,15 +1,45 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+class ConversationHistory:
+    """
+    Prior turns of a conversation thread, bounded to a token budget.
+
+    :param summary: Compact summary of turns that no longer fit the budget.
+    :param turns: Recent turns, oldest first, as ``{"role", "content"}``
+        with role ``"user"`` or ``"assistant"``.
+    """
+
+    __slots__ = ("summary", "turns")
+
+    def __init__(self, summary: str = "", turns: Optional[List[Dict[str, str]]] = None):
+        self.summary = summary
+        self.turns = turns or []
+
+    def __bool__(self) -> bool:
+        return bool(self.summary or self.turns)
 
 
 class BaseLLMProvider(ABC):
+    """
+    Interface of an LLM backend.
+
+    Upstream failures (network, rate limits, provider errors) must be raised
+    as :class:`~app.llm_provider.errors.LLMProviderError` so that callers can
+    tell transient failures from bad requests and retry only the former.
+    """
+
     @abstractmethod
-    async def analyze_image(self, image_data: bytes, prompt: str) -> List[str]:
+    async def analyze_image(
+        self, image_data: bytes, prompt: str, mime_type: str = "image/jpeg"
+    ) -> List[str]:
         """
         Analyzes an image and returns a list of detected items based on the prompt.
 
         :param image_data: The image data in bytes.
         :param prompt: The instruction or question for the model.
+        :param mime_type: The real format of ``image_data``.
         :return: A list of strings representing the detected items.
         """
         pass
@@ -28,7 +58,11 @@ class BaseLLMProvider(ABC):
 
     @abstractmethod
     async def get_vitamin_recommendations(
-        self, user_message: str, thread_id: str, user_context: Dict[str, Any]
+        self,
+        user_message: str,
+        thread_id: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory] = None,
     ) -> Dict[str, Any]:
         """
         Gets vitamin and supplement recommendations based on user's lab results.
@@ -36,6 +70,41 @@ class BaseLLMProvider(ABC):
         :param user_message: The user's message or query.
         :param thread_id: The thread ID for continuing a conversation, or None for a new one.
         :param user_context: A dictionary containing user's labs, deficits, preferences, etc.
+        :param history: Earlier turns of the thread, if any; only the new
+            message is not part of it.
         :return: A dictionary with the recommendation reply and thread ID.
         """
         pass
+
+    async def stream_vitamin_recommendations(
+        self,
+        user_message: str,
+        thread_id: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Streams the recommendation reply as text chunks while it is generated.
+
+        Closing the iterator early must cancel the upstream generation. The
+        default implementation yields the whole non-streaming reply at once.
+
+        :param user_message: The user's message or query.
+        :param thread_id: The thread ID for continuing a conversation, or None for a new one.
+        :param user_context: A dictionary containing user's labs, deficits, preferences, etc.
+        :param history: Earlier turns of the thread, if any.
+        :return: An async iterator of reply text chunks.
+        """
+        result = await self.get_vitamin_recommendations(
+            user_message=user_message,
+            thread_id=thread_id,
+            user_context=user_context,
+            history=history,
+        )
+        yield result["reply"]
+
+    async def aclose(self) -> None:
+        """
+        Releases network resources held by the provider (connection pools).
+        Called once on application shutdown.
+        """
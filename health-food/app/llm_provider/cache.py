@@ -0,0 +1,288 @@
+"""Response cache for LLM calls keyed on a canonicalized request context."""
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from .. import serialization
+from ..config import get_llm_cache_settings
+from ..db import connection, get_write_queue, run_with_conn
+from ..rules import BIOMARKER_RULES, SEVERE_THRESHOLDS
+
+logger = logging.getLogger(__name__)
+
+# Expired rows of the persistent tier are purged once per this many stores
+_PURGE_EVERY = 100
+
+
+def _band_edges() -> Dict[str, List[Tuple[str, float]]]:
+    edges: Dict[str, List[Tuple[str, float]]] = {}
+    for rule in BIOMARKER_RULES:
+        marker = rule["marker_key"]
+        edges.setdefault(marker, []).append((rule["operator"], rule["threshold"]))
+        if marker in SEVERE_THRESHOLDS:
+            edges[marker].append((rule["operator"], SEVERE_THRESHOLDS[marker]))
+    return edges
+
+
+# marker -> [(operator, threshold)]: a value is "past" an edge when
+# ``value < threshold`` (for "<") or ``value > threshold`` (for ">")
+LAB_BAND_EDGES = _band_edges()
+
+
+def lab_band(marker: str, value: Any) -> Any:
+    """Clinically equivalent band of a lab value.
+
+    Known markers map to an integer: 0 inside the reference range, -1/-2
+    for a low/markedly low value, 1/2 for an elevated/markedly elevated
+    one (see ``BIOMARKER_RULES`` and ``SEVERE_THRESHOLDS``). Other markers
+    are rounded to two significant digits.
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return canonical_value(value)
+    if not math.isfinite(value):
+        return None
+
+    edges = LAB_BAND_EDGES.get(marker)
+    if edges is None:
+        if value == 0:
+            return 0.0
+        digits = 1 - math.floor(math.log10(abs(value)))
+        return round(value, digits)
+
+    band = 0
+    for operator, threshold in edges:
+        if operator == "<" and value < threshold:
+            band -= 1
+        elif operator == ">" and value > threshold:
+            band += 1
+    return band
+
+
+def canonical_value(value: Any) -> Any:
+    """Order- and case-insensitive form of preferences and similar values."""
+    if isinstance(value, str):
+        return " ".join(value.lower().replace("ё", "е").split())
+    if isinstance(value, dict):
+        return {str(k).strip().lower(): canonical_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [canonical_value(item) for item in value]
+        unique = {json.dumps(item, sort_keys=True, ensure_ascii=False): item for item in items}
+        return [unique[key] for key in sorted(unique)]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def canonical_recipe_context(user_context: Dict[str, Any]) -> Dict[str, Any]:
+    """Canonical form of an ai_recipe context: banded labs, sorted preferences."""
+    labs = user_context.get("labs") or {}
+    canonical = {
+        key: canonical_value(value)
+        for key, value in user_context.items()
+        if key != "labs"
+    }
+    canonical["labs"] = {
+        str(marker).strip().lower(): lab_band(str(marker).strip().lower(), value)
+        for marker, value in labs.items()
+    }
+    return canonical
+
+
+def context_key(namespace: str, canonical_context: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        canonical_context, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    )
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class ResponseCache:
+    """Two-tier cache of JSON-serializable LLM responses.
+
+    The in-memory tier is a TTL + LRU map of encoded JSON, so every hit
+    decodes a private copy and callers can mutate results freely. The
+    optional persistent tier lives in the ``llm_cache`` table and survives
+    restarts and is shared by workers; its writes go through the
+    single-writer queue without waiting for the commit.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float,
+        max_entries: int,
+        persistent: bool = False,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.persistent = persistent
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Metrics
+        self._hits = 0
+        self._persistent_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._persistent_errors = 0
+
+    def key(self, canonical_context: Dict[str, Any]) -> str:
+        return context_key(self.namespace, canonical_context)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Синхронный поиск; в async-коде - :meth:`aget`"""
+        now = time.time()
+        payload = self._get_memory(key, now)
+        if payload is not None:
+            return serialization.loads(payload)
+        row = self._load(key, now) if self.persistent else None
+        return self._found(key, row)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Поиск без блокировки цикла событий: SQLite-уровень читается в пуле потоков БД"""
+        now = time.time()
+        payload = self._get_memory(key, now)
+        if payload is not None:
+            return serialization.loads(payload)
+        row = await self._aload(key, now) if self.persistent else None
+        return self._found(key, row)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return payload
+                del self._entries[key]
+                self._expirations += 1
+        return None
+
+    def _found(self, key: str, row: Optional[Tuple[float, str]]) -> Optional[Any]:
+        if row is None:
+            with self._lock:
+                self._misses += 1
+            return None
+        expires_at, payload = row
+        self._remember(key, expires_at, payload)
+        with self._lock:
+            self._persistent_hits += 1
+        return serialization.loads(payload)
+
+    def set(self, key: str, value: Any) -> None:
+        payload = serialization.dumps(value)
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, payload)
+        with self._lock:
+            self._stores += 1
+            purge = self._stores % _PURGE_EVERY == 0
+        if self.persistent:
+            self._store(key, expires_at, payload, purge)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, expires_at: float, payload: str) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    @staticmethod
+    def _select(conn: Any, key: str, now: float) -> Optional[Tuple[float, str]]:
+        row = conn.execute(
+            "SELECT expires_at, value FROM llm_cache WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _load(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        try:
+            with connection() as conn:
+                return self._select(conn, key, now)
+        except Exception as e:
+            self._read_failed(e)
+            return None
+
+    async def _aload(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        try:
+            return await run_with_conn(self._select, key, now)
+        except Exception as e:
+            self._read_failed(e)
+            return None
+
+    def _read_failed(self, error: Exception) -> None:
+        with self._lock:
+            self._persistent_errors += 1
+        logger.warning(f"LLM cache read failed: {error}")
+
+    def _store(self, key: str, expires_at: float, payload: str, purge: bool) -> None:
+        def write(writer) -> None:
+            writer.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, payload, expires_at),
+            )
+            if purge:
+                writer.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+        try:
+            future = get_write_queue().submit(write)
+        except Exception as e:
+            self._write_failed(e)
+            return
+        # Запись не ждём, но ошибку INSERT/коммита учитываем
+        def done(fut: Future) -> None:
+            if fut.exception() is not None:
+                self._write_failed(fut.exception())
+
+        future.add_done_callback(done)
+
+    def _write_failed(self, error: BaseException) -> None:
+        with self._lock:
+            self._persistent_errors += 1
+        logger.warning(f"LLM cache write failed: {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._persistent_hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "persistent": self.persistent,
+                "hits": self._hits,
+                "persistent_hits": self._persistent_hits,
+                "misses": self._misses,
+                "hit_rate": round((lookups - self._misses) / lookups, 4) if lookups else 0.0,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "persistent_errors": self._persistent_errors,
+            }
+
+
+def create_response_cache(namespace: str) -> Optional[ResponseCache]:
+    """Cache configured from LLM_CACHE_* settings, or None if disabled."""
+    settings = get_llm_cache_settings()
+    if not settings["enabled"]:
+        return None
+    return ResponseCache(
+        namespace,
+        ttl=settings["ttl"],
+        max_entries=settings["max_entries"],
+        persistent=settings["persistent"],
+    )
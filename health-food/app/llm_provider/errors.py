@@ -0,0 +1,29 @@
+"""Typed errors raised by LLM providers."""
+from typing import Optional
+
+
+class LLMProviderError(RuntimeError):
+    """An upstream LLM call failed.
+
+    :param retryable: True for transient failures (timeouts, connection
+        errors, rate limits, 5xx) that are worth retrying and that count
+        towards the circuit breaker.
+    :param retry_after: Delay in seconds suggested by the provider, if any.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        retryable: bool = False,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class LLMRateLimitError(LLMProviderError):
+    """The provider rejected the call with 429 Too Many Requests."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message, retryable=True, retry_after=retry_after)
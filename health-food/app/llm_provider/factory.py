@@ -0,0 +1,28 @@
+"""Selection of the LLM provider from configuration."""
+import logging
+from typing import Optional
+
+from ..config import get_llm_provider_name, has_openai_api_key
+from .base import BaseLLMProvider
+
+logger = logging.getLogger(__name__)
+
+
+def create_llm_provider() -> Optional[BaseLLMProvider]:
+    """Provider selected by LLM_PROVIDER, or None if it cannot be used.
+
+    Must be called inside the running event loop (the OpenAI provider
+    creates its HTTP client there).
+    """
+    name = get_llm_provider_name()
+    if name == "stub":
+        from .stub_provider import StubLLMProvider
+
+        logger.warning("LLM_PROVIDER=stub: AI responses are generated locally")
+        return StubLLMProvider()
+
+    if not has_openai_api_key():
+        return None
+    from .openai_provider import OpenAIProvider
+
+    return OpenAIProvider()
@@ -0,0 +1,304 @@
+"""Per-call spans, token accounting and metrics for LLM providers."""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from ..metrics import TOKEN_BUCKETS, MetricsRegistry, registry
+from .base import BaseLLMProvider, ConversationHistory
+from .errors import LLMProviderError, LLMRateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Caller of the current LLM call and whether a response cache was consulted
+_call_context: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "llm_call_context", default=None
+)
+# Span of the provider call currently running in this task
+_current_span: contextvars.ContextVar[Optional["LLMSpan"]] = contextvars.ContextVar(
+    "llm_span", default=None
+)
+
+
+@contextlib.contextmanager
+def llm_call_context(caller: Optional[str], cache: str = "bypass") -> Iterator[None]:
+    """Attributes provider calls made inside the block.
+
+    :param caller: Budget/accounting key of the end user, e.g. ``user:42``.
+    :param cache: ``"miss"`` if a response cache was consulted and missed,
+        ``"bypass"`` if the call is not cacheable.
+    """
+    token = _call_context.set({"caller": caller, "cache": cache})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def record_usage(model: str, prompt_tokens: int, completion_tokens: int) -> None:
+    """Reports the model and token usage of the running provider call.
+
+    Called by provider implementations; a no-op outside an instrumented call.
+    Repeated reports within one call (e.g. several agent turns) add up.
+    """
+    span = _current_span.get()
+    if span is None:
+        return
+    span.model = model or span.model
+    span.prompt_tokens += int(prompt_tokens or 0)
+    span.completion_tokens += int(completion_tokens or 0)
+
+
+class LLMSpan:
+    """One upstream provider call (one retry attempt)."""
+
+    __slots__ = (
+        "operation", "model", "caller", "cache", "status", "started",
+        "latency", "first_chunk", "prompt_tokens", "completion_tokens",
+    )
+
+    def __init__(self, operation: str, caller: Optional[str], cache: str):
+        self.operation = operation
+        self.model = "unknown"
+        self.caller = caller
+        self.cache = cache
+        self.status = "ok"
+        self.started = time.perf_counter()
+        self.latency = 0.0
+        # Streaming only: seconds to the first text chunk
+        self.first_chunk: Optional[float] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def fail(self, exc: BaseException) -> None:
+        if isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+            self.status = "cancelled"
+        elif isinstance(exc, LLMRateLimitError):
+            self.status = "rate_limited"
+        elif isinstance(exc, LLMProviderError):
+            self.status = "retryable" if exc.retryable else "error"
+        else:
+            self.status = "exception"
+
+    def finish(self) -> None:
+        self.latency = time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "operation": self.operation,
+            "model": self.model,
+            "caller": self.caller,
+            "cache": self.cache,
+            "status": self.status,
+            "latency_ms": round(self.latency * 1000, 1),
+            "first_chunk_ms": round(self.first_chunk * 1000, 1) if self.first_chunk is not None else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class LLMMetrics:
+    """Aggregates finished spans into process metrics."""
+
+    def __init__(self, metrics: Optional[MetricsRegistry] = None):
+        metrics = metrics or registry
+        self.requests = metrics.counter(
+            "llm_requests_total",
+            "LLM calls by outcome; cache=hit calls never reached the provider",
+            ("operation", "model", "status", "cache"),
+        )
+        self.tokens = metrics.counter(
+            "llm_tokens_total", "Tokens used by LLM calls", ("operation", "model", "kind")
+        )
+        self.latency = metrics.histogram(
+            "llm_request_duration_seconds",
+            "Latency of upstream LLM calls",
+            ("operation", "model", "status"),
+        )
+        self.first_chunk = metrics.histogram(
+            "llm_time_to_first_chunk_seconds",
+            "Time to the first streamed text chunk",
+            ("operation", "model"),
+        )
+        self.call_tokens = metrics.histogram(
+            "llm_request_tokens",
+            "Prompt + completion tokens per LLM call",
+            ("operation", "model"),
+            buckets=TOKEN_BUCKETS,
+        )
+
+    def record(self, span: LLMSpan) -> None:
+        self.requests.inc(
+            operation=span.operation, model=span.model, status=span.status, cache=span.cache
+        )
+        self.latency.observe(
+            span.latency, operation=span.operation, model=span.model, status=span.status
+        )
+        if span.first_chunk is not None:
+            self.first_chunk.observe(span.first_chunk, operation=span.operation, model=span.model)
+        if span.total_tokens:
+            self.tokens.inc(span.prompt_tokens, operation=span.operation, model=span.model, kind="prompt")
+            self.tokens.inc(
+                span.completion_tokens, operation=span.operation, model=span.model, kind="completion"
+            )
+            self.call_tokens.observe(span.total_tokens, operation=span.operation, model=span.model)
+
+    def record_cache_hit(self, operation: str) -> None:
+        self.requests.inc(operation=operation, model="none", status="ok", cache="hit")
+
+    def stats(self) -> Dict[str, Any]:
+        """Per operation: calls by cache status, tokens and recent latency."""
+        result: Dict[str, Dict[str, Any]] = {}
+
+        def entry(operation: str) -> Dict[str, Any]:
+            return result.setdefault(
+                operation,
+                {"calls": 0, "cache_hits": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0},
+            )
+
+        for labels, value in self.requests.samples():
+            stats = entry(labels["operation"])
+            if labels["cache"] == "hit":
+                stats["cache_hits"] += int(value)
+                continue
+            stats["calls"] += int(value)
+            if labels["status"] != "ok":
+                stats["errors"] += int(value)
+        for labels, value in self.tokens.samples():
+            entry(labels["operation"])[f"{labels['kind']}_tokens"] += int(value)
+        for labels, summary in self.latency.summary():
+            if labels["status"] == "ok":
+                entry(labels["operation"]).setdefault("latency_s", {})[labels["model"]] = {
+                    key: summary[key] for key in ("window_count", "p50", "p95", "p99", "max")
+                }
+        return result
+
+
+class InstrumentedLLMProvider(BaseLLMProvider):
+    """
+    Wraps a provider: every call becomes an :class:`LLMSpan` with latency,
+    outcome, model and token usage (reported by the provider through
+    :func:`record_usage`), recorded into :class:`LLMMetrics`.
+
+    The caller and cache status come from :func:`llm_call_context`; each
+    retry attempt is a separate span. ``on_span`` is invoked with every
+    finished span (used for per-user token budgets).
+    """
+
+    def __init__(
+        self,
+        provider: BaseLLMProvider,
+        metrics: Optional[LLMMetrics] = None,
+        on_span: Optional[Callable[[LLMSpan], None]] = None,
+    ):
+        self.provider = provider
+        self.metrics = metrics or LLMMetrics()
+        self.on_span = on_span
+
+    def _span(self, operation: str) -> LLMSpan:
+        context = _call_context.get() or {}
+        return LLMSpan(operation, context.get("caller"), context.get("cache", "bypass"))
+
+    def _finish(self, span: LLMSpan) -> None:
+        span.finish()
+        self.metrics.record(span)
+        if self.on_span is not None:
+            self.on_span(span)
+        level = logging.INFO if span.status in ("ok", "cancelled") else logging.WARNING
+        logger.log(level, f"LLM call: {span.as_dict()}")
+
+    async def _run(self, operation: str, call: Callable[[], Any]) -> Any:
+        span = self._span(operation)
+        token = _current_span.set(span)
+        try:
+            return await call()
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def record_cache_hit(self, operation: str) -> None:
+        self.metrics.record_cache_hit(operation)
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+    async def analyze_image(
+        self, image_data: bytes, prompt: str, mime_type: str = "image/jpeg"
+    ) -> List[str]:
+        return await self._run(
+            "photo", lambda: self.provider.analyze_image(image_data, prompt, mime_type)
+        )
+
+    async def generate_recipes(self, user_context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await self._run("recipes", lambda: self.provider.generate_recipes(user_context))
+
+    async def get_vitamin_recommendations(
+        self,
+        user_message: str,
+        thread_id: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory] = None,
+    ) -> Dict[str, Any]:
+        return await self._run(
+            "consultation",
+            lambda: self.provider.get_vitamin_recommendations(
+                user_message=user_message,
+                thread_id=thread_id,
+                user_context=user_context,
+                history=history,
+            ),
+        )
+
+    def stream_vitamin_recommendations(
+        self,
+        user_message: str,
+        thread_id: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory] = None,
+    ) -> AsyncIterator[str]:
+        # Not a generator itself: the call context is captured here, where
+        # the caller opens the stream, not at the first iteration
+        span = self._span("consultation_stream")
+        stream = self.provider.stream_vitamin_recommendations(
+            user_message=user_message,
+            thread_id=thread_id,
+            user_context=user_context,
+            history=history,
+        )
+        return self._stream(span, stream)
+
+    async def _stream(self, span: LLMSpan, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        span.started = time.perf_counter()
+        try:
+            while True:
+                # The span is current only while the provider runs, never
+                # across a yield into the consumer's code
+                token = _current_span.set(span)
+                try:
+                    chunk = await anext(stream)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current_span.reset(token)
+                if span.first_chunk is None:
+                    span.first_chunk = time.perf_counter() - span.started
+                yield chunk
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            token = _current_span.set(span)
+            try:
+                await stream.aclose()
+            finally:
+                _current_span.reset(token)
+                self._finish(span)
@@ -1,17 +1,76 @@
 import base64
 import json
+import logging
 import os
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 
-from agents import Agent, Runner
-from openai import OpenAI
+import httpx
+import openai
+from agents import Agent, Runner, set_default_openai_client
+from openai import AsyncOpenAI
+from openai.types.responses import ResponseTextDeltaEvent
 
-from .base import BaseLLMProvider
+from ..config import get_openai_http_settings
+from .base import BaseLLMProvider, ConversationHistory
+from .errors import LLMProviderError, LLMRateLimitError
+from .instrumentation import record_usage
+
+logger = logging.getLogger(__name__)
+
+
+def _retry_after(exc: openai.APIStatusError) -> Optional[float]:
+    """Seconds from the Retry-After header of a failed response, if present."""
+    value = exc.response.headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _provider_error(exc: Exception) -> LLMProviderError:
+    """Maps OpenAI SDK exceptions onto typed provider errors."""
+    if isinstance(exc, openai.RateLimitError):
+        return LLMRateLimitError(str(exc), retry_after=_retry_after(exc))
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return LLMProviderError(str(exc), retryable=True)
+    if isinstance(exc, openai.APIStatusError):
+        return LLMProviderError(
+            str(exc),
+            retryable=exc.status_code >= 500 or exc.status_code in (408, 409),
+            retry_after=_retry_after(exc),
+        )
+    return LLMProviderError(str(exc))
+
+
+def _record_run_usage(agent: Agent, result: Any) -> None:
+    """Token usage of an agents Runner run (all model requests of the run)."""
+    usage = result.context_wrapper.usage
+    record_usage(str(agent.model), usage.input_tokens, usage.output_tokens)
 
 
 class OpenAIProvider(BaseLLMProvider):
+    VISION_MODEL = "gpt-4o-mini"
+
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # One pooled keep-alive transport per worker, shared by direct API
+        # calls and by the agents Runner. Must be created inside the event loop.
+        settings = get_openai_http_settings()
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_keepalive_connections"],
+                keepalive_expiry=settings["keepalive_expiry"],
+            ),
+            timeout=httpx.Timeout(
+                settings["timeout"], connect=settings["connect_timeout"]
+            ),
+        )
+        self.client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=self._http_client,
+            max_retries=settings["max_retries"],
+        )
+        set_default_openai_client(self.client)
         self.assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
         self.nutrition_agent = self._create_nutrition_agent()
         self.recipe_agent = self._create_recipe_agent()
@@ -88,11 +147,16 @@ class OpenAIProvider(BaseLLMProvider):
             model="gpt-4o-mini",
         )
 
-    async def analyze_image(self, image_data: bytes, prompt: str) -> List[str]:
+    async def aclose(self) -> None:
+        await self._http_client.aclose()
+
+    async def analyze_image(
+        self, image_data: bytes, prompt: str, mime_type: str = "image/jpeg"
+    ) -> List[str]:
         base64_image = base64.b64encode(image_data).decode("utf-8")
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
+            response = await self.client.chat.completions.create(
+                model=self.VISION_MODEL,
                 messages=[
                     {
                         "role": "user",
@@ -101,21 +165,29 @@ class OpenAIProvider(BaseLLMProvider):
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": f"data:{mime_type};base64,{base64_image}"
                                 },
                             },
                         ],
                     }
                 ],
             )
+            if response.usage:
+                record_usage(
+                    response.model,
+                    response.usage.prompt_tokens,
+                    response.usage.completion_tokens,
+                )
             content = response.choices[0].message.content
             if content:
                 if content.startswith("```json"):
                     content = content[7:-3]
                 data = json.loads(content)
                 return data.get("items", [])
+        except openai.OpenAIError as e:
+            raise _provider_error(e) from e
         except Exception as e:
-            print(f"Failed to analyze image with OpenAI: {e}")
+            logger.warning(f"Failed to analyze image with OpenAI: {e}")
         return []
         # return [
         #     "овсянка",
@@ -181,6 +253,7 @@ class OpenAIProvider(BaseLLMProvider):
             )
 
             result = await Runner.run(self.recipe_agent, prompt)
+            _record_run_usage(self.recipe_agent, result)
             content = result.final_output
 
             if content:
@@ -191,8 +264,10 @@ class OpenAIProvider(BaseLLMProvider):
                 return data.get("recipes", [])
 
             return []
+        except openai.OpenAIError as e:
+            raise _provider_error(e) from e
         except Exception as e:
-            print(f"Failed to generate recipes with agent: {e}")
+            logger.warning(f"Failed to generate recipes with agent: {e}")
             return []
         # return [
         #     {
@@ -216,7 +291,11 @@ class OpenAIProvider(BaseLLMProvider):
         # ]
 
     async def get_vitamin_recommendations(
-        self, user_message: str, thread_id: str, user_context: Dict[str, Any]
+        self,
+        user_message: str,
+        thread_id: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory] = None,
     ) -> Dict[str, Any]:
         """
         Получает рекомендации по витаминам от агента на основе анализов пользователя.
@@ -225,26 +304,91 @@ class OpenAIProvider(BaseLLMProvider):
             user_message: Сообщение пользователя
             thread_id: Идентификатор диалога или None для нового диалога
             user_context: Контекст пользователя (анализы, дефициты, предпочтения)
+            history: Сжатая история диалога (краткое содержание + последние реплики)
 
         Returns:
             Dict с ответом агента и id диалога
         """
         try:
-            prompt = f"""
-            Контекст о пользователе:
-            Анализы: {json.dumps(user_context.get("labs", {}), ensure_ascii=False)}
-            Дефициты: {json.dumps(user_context.get("deficits", {}), ensure_ascii=False)}
-            Предпочтения: {json.dumps(user_context.get("preferences", {}), ensure_ascii=False)}
-            
-            Вопрос пользователя: {user_message}
-            """
+            prompt = self._consultation_input(user_message, user_context, history)
 
             result = await Runner.run(self.nutrition_agent, prompt)
+            _record_run_usage(self.nutrition_agent, result)
 
             return {
                 "reply": result.final_output,
-                "thread_id": thread_id or "nutrition-agent",
+                "thread_id": thread_id,
             }
+        except openai.OpenAIError as e:
+            raise _provider_error(e) from e
         except Exception as e:
-            print(f"Error in vitamins recommendations: {str(e)}")
+            logger.error(f"Error in vitamins recommendations: {e}")
             raise e
+
+    async def stream_vitamin_recommendations(
+        self,
+        user_message: str,
+        thread_id: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Потоковый вариант get_vitamin_recommendations: текст ответа по мере
+        генерации. Закрытие генератора (отключение клиента) отменяет запуск
+        агента.
+        """
+        prompt = self._consultation_input(user_message, user_context, history)
+        result = Runner.run_streamed(self.nutrition_agent, prompt)
+        try:
+            async for event in result.stream_events():
+                if event.type == "raw_response_event" and isinstance(
+                    event.data, ResponseTextDeltaEvent
+                ):
+                    if event.data.delta:
+                        yield event.data.delta
+        except openai.OpenAIError as e:
+            raise _provider_error(e) from e
+        finally:
+            if not result.is_complete:
+                result.cancel()
+            # Partial usage of a cancelled run is still billed
+            _record_run_usage(self.nutrition_agent, result)
+
+    def _consultation_input(
+        self,
+        user_message: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory],
+    ) -> Union[str, List[Dict[str, str]]]:
+        """
+        Вход агента: для нового диалога - один промпт, для продолжения -
+        контекст с кратким содержанием, последние реплики и новый вопрос
+        """
+        if not history:
+            return self._consultation_prompt(user_message, user_context)
+
+        context = (
+            "Контекст о пользователе: "
+            + json.dumps(
+                {key: user_context.get(key, {}) for key in ("labs", "deficits", "preferences")},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        )
+        if history.summary:
+            context += f"\nКратко о предыдущей части диалога:\n{history.summary}"
+        return (
+            [{"role": "user", "content": context}]
+            + [{"role": turn["role"], "content": turn["content"]} for turn in history.turns]
+            + [{"role": "user", "content": user_message}]
+        )
+
+    def _consultation_prompt(self, user_message: str, user_context: Dict[str, Any]) -> str:
+        return f"""
+            Контекст о пользователе:
+            Анализы: {json.dumps(user_context.get("labs", {}), ensure_ascii=False)}
+            Дефициты: {json.dumps(user_context.get("deficits", {}), ensure_ascii=False)}
+            Предпочтения: {json.dumps(user_context.get("preferences", {}), ensure_ascii=False)}
+            
+            Вопрос пользователя: {user_message}
+            """
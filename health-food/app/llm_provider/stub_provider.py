@@ -0,0 +1,170 @@
+"""Deterministic local LLM provider for offline load testing."""
+import asyncio
+import hashlib
+import json
+import math
+import random
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from ..config import get_stub_llm_settings
+from .base import BaseLLMProvider, ConversationHistory
+from .errors import LLMProviderError, LLMRateLimitError
+from .instrumentation import record_usage
+
+MODEL = "stub"
+
+# Product vocabulary of the fake vision model
+_PRODUCTS = [
+    "яйца", "молоко", "курица", "помидоры", "огурцы", "яблоки", "морковь",
+    "лук", "сыр", "йогурт", "шпинат", "брокколи", "лосось", "гречка",
+    "овсянка", "чечевица", "нут", "говядина", "перец", "кабачок", "творог",
+    "киви", "апельсины", "орехи", "фасоль", "тыква", "свёкла", "капуста",
+]
+
+_COOKING = ["Запечённый", "Тушёный", "Тёплый салат:", "Боул:", "Быстрый", "Пряный"]
+_DIFFICULTIES = {"легкий": (10, 30), "средний": (30, 60), "сложный": (60, 120)}
+
+
+def _seed(*parts: Any) -> int:
+    """Stable seed from the request content (same input - same output)."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.sha256(payload.encode("utf-8")).digest()[:8], "big")
+
+
+def _record_usage(prompt: Any, completion: Any) -> None:
+    """Plausible token counts: ~4 bytes of JSON per token."""
+    def tokens(value: Any) -> int:
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        return max(1, len(text.encode("utf-8")) // 4)
+
+    record_usage(MODEL, tokens(prompt), tokens(completion))
+
+
+class StubLLMProvider(BaseLLMProvider):
+    """
+    Fake provider with deterministic outputs and tunable behaviour.
+
+    Responses depend only on the request, so caching and request
+    coalescing behave exactly as with a real model. Latency is sampled per
+    call from the configured distribution, and a share of calls fails with
+    injected retryable errors or 429s, which exercises admission control,
+    retries and the circuit breaker without any network access.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None, **overrides: Any):
+        self.settings = {**(settings or get_stub_llm_settings()), **overrides}
+        # Latency and failures are random per call; content is not
+        self._rng = random.Random(self.settings["seed"])
+        self.calls = 0
+
+    async def _respond(self) -> None:
+        """Waits the sampled latency, then maybe raises an injected error."""
+        self.calls += 1
+        await asyncio.sleep(self._latency() / 1000)
+        roll = self._rng.random()
+        if roll < self.settings["rate_limit_rate"]:
+            raise LLMRateLimitError(
+                "stub: injected rate limit", retry_after=self.settings["retry_after"]
+            )
+        if roll < self.settings["rate_limit_rate"] + self.settings["failure_rate"]:
+            raise LLMProviderError("stub: injected upstream failure", retryable=True)
+
+    def _latency(self) -> float:
+        mean = self.settings["latency_ms"]
+        jitter = self.settings["jitter_ms"]
+        distribution = self.settings["distribution"]
+        if distribution == "fixed" or mean <= 0:
+            return max(mean, 0.0)
+        if distribution == "uniform":
+            return max(0.0, self._rng.uniform(mean - jitter, mean + jitter))
+        if distribution == "normal":
+            return max(0.0, self._rng.gauss(mean, jitter))
+        # Lognormal with the given mean and standard deviation: long tail
+        sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+        return self._rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+
+    async def analyze_image(
+        self, image_data: bytes, prompt: str, mime_type: str = "image/jpeg"
+    ) -> List[str]:
+        await self._respond()
+        rng = random.Random(_seed(hashlib.sha256(image_data).hexdigest()))
+        items = rng.sample(_PRODUCTS, rng.randint(5, 9))
+        # An image is billed as a fixed number of tiles
+        record_usage(MODEL, 255 + len(prompt) // 4, len(items) * 4)
+        return items
+
+    async def generate_recipes(self, user_context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        await self._respond()
+        rng = random.Random(_seed(user_context))
+        preferences = user_context.get("preferences") or {}
+        available = list(preferences.get("available") or []) or rng.sample(_PRODUCTS, 6)
+        difficulty = str(user_context.get("difficulty") or "легкий").replace("ё", "е")
+        min_time, max_time = _DIFFICULTIES.get(difficulty, _DIFFICULTIES["легкий"])
+        deficits = sorted((user_context.get("labs") or {}).keys()) or ["баланс"]
+
+        recipes = []
+        for i in range(3):
+            ingredients = rng.sample(available, min(len(available), rng.randint(2, 4)))
+            name = f"{rng.choice(_COOKING)} {', '.join(ingredients)}"
+            recipes.append({
+                "id": f"stub_recipe_{i}",
+                "name": name,
+                "time_min": rng.randrange(min_time, max_time + 1, 5),
+                "description": f"Блюдо из {', '.join(ingredients)} с упором на {deficits[i % len(deficits)]}.",
+                "ingredients": [
+                    {"name": item, "amount": f"{rng.randint(1, 4) * 50} г"} for item in ingredients
+                ],
+                "instructions": [
+                    f"Подготовьте {item}." for item in ingredients
+                ] + ["Соедините, приправьте солью и перцем и подавайте."],
+                "tags": ["ai_generated", difficulty, deficits[i % len(deficits)]],
+            })
+        _record_usage(user_context, recipes)
+        return recipes
+
+    def _reply(
+        self,
+        user_message: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory],
+    ) -> str:
+        rng = random.Random(_seed(user_message, user_context, history.summary if history else ""))
+        labs = user_context.get("labs") or {}
+        lines = [f"Вы спросили: «{user_message.strip()}»."]
+        if history:
+            lines.append(f"Продолжаем разговор ({len(history.turns) // 2} предыдущих вопросов).")
+        for marker, value in sorted(labs.items()):
+            lines.append(
+                f"{marker}: {value} - {rng.choice(['в норме', 'стоит обсудить с врачом', 'ниже оптимума', 'выше оптимума'])}."
+            )
+        lines.append(f"Добавьте в рацион: {', '.join(rng.sample(_PRODUCTS, 3))}.")
+        lines.append("Это не медицинская рекомендация, проконсультируйтесь с врачом.")
+        return " ".join(lines)
+
+    async def get_vitamin_recommendations(
+        self,
+        user_message: str,
+        thread_id: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory] = None,
+    ) -> Dict[str, Any]:
+        await self._respond()
+        reply = self._reply(user_message, user_context, history)
+        _record_usage([user_message, user_context, history.turns if history else []], reply)
+        return {"reply": reply, "thread_id": thread_id}
+
+    async def stream_vitamin_recommendations(
+        self,
+        user_message: str,
+        thread_id: str,
+        user_context: Dict[str, Any],
+        history: Optional[ConversationHistory] = None,
+    ) -> AsyncIterator[str]:
+        await self._respond()
+        reply = self._reply(user_message, user_context, history)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.settings["chunk_ms"] / 1000)
+            yield word if i == len(words) - 1 else word + " "
+        _record_usage([user_message, user_context, history.turns if history else []], reply)
@@ -2,34 +2,53 @@
 Health Food - Главный модуль приложения
 Персонализированный сервис питания на основе анализов крови
 """
+import asyncio
 import json
 import logging
 from typing import Any, Dict, Optional
 
 from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
-from sqlite3 import Connection
 
 from .auth import schemas
+from .auth.principal_cache import get_principal_cache_stats, invalidate_principal
+from .auth.security import close_password_hasher, get_password_hasher_stats
 from .auth.dependencies import get_current_user
 from .auth.router import router as auth_router
 from .recipes.router import router as recipes_router
-from .config import has_openai_api_key, load_env
-from .db import get_conn, get_upcoming_reminders, init_db, save_labs_and_schedule, save_profile
-from .llm_provider.openai_provider import OpenAIProvider
+from .catalogue.recipes import recipe_catalogue
+from .catalogue.restaurants import restaurant_catalogue
+from .compression import CompressionMiddleware
+from .config import get_static_settings, load_env
+from .db import (
+    close_db_executor,
+    close_pool,
+    close_write_queue,
+    get_db_executor_stats,
+    get_pool_stats,
+    get_write_queue_stats,
+    get_upcoming_reminders,
+    init_db,
+    save_labs_and_schedule,
+    run_db,
+    save_profile,
+)
+from .images import ImageTooLargeError, UnsupportedImageError
+from .llm_provider.errors import LLMProviderError
+from .llm_provider.factory import create_llm_provider
+from .metrics import registry, render_prometheus
+from .serialization import JSONResponse, get_serializer_stats
+from .static import PrecompressedStaticFiles, precompress_directory
+from . import serialization
 
 # Новые сервисы
-from .repositories.recipe_repository import RecipeRepository
-from .repositories.restaurant_repository import RestaurantRepository
-from .repositories.biomarker_repository import BiomarkerRepository
-from .services.recipe_service import RecipeService
-from .services.restaurant_service import RestaurantService
-from .services.biomarker_service import BiomarkerService
 from .services.ai_service import AIService
+from .services.generate_pipelines import GENERATE_PIPELINES, GenerateContext
+from .services.admission import AdmissionError
+from .sse import sse_response, text_event_stream
 
 # Настройка логирования
 logging.basicConfig(
@@ -41,7 +60,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Health Food",
     description="Персонализированный сервис питания на основе анализов крови",
-    version="2.0.0"
+    version="2.0.0",
+    # orjson, если установлен (JSON_BACKEND)
+    default_response_class=JSONResponse,
 )
 
 app.include_router(auth_router)
@@ -58,7 +79,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/assets", StaticFiles(directory="frontend/dist/assets"), name="assets")
+# br/gzip для ответов API; статика отдаётся заранее сжатыми вариантами
+app.add_middleware(CompressionMiddleware, exclude_paths=("/assets/",))
+
+ASSETS_DIR = "frontend/dist/assets"
+app.mount("/assets", PrecompressedStaticFiles(directory=ASSETS_DIR), name="assets")
 
 templates = Jinja2Templates(directory="frontend/dist/")
 
@@ -78,7 +103,22 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     thread_id: Optional[str] = None
-    context: Dict[str, Any]
+    # В продолжении диалога можно не передавать - используется сохранённый
+    context: Dict[str, Any] = {}
+
+
+def _admission_http_error(error: AdmissionError) -> HTTPException:
+    """429/503 с Retry-After, когда AI сервис перегружен или деградировал"""
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": error.retry_after_header},
+    )
+
+
+def _client_caller(request: Request) -> Optional[str]:
+    """Ключ учёта токенов для эндпоинтов без авторизации - адрес клиента"""
+    return f"ip:{request.client.host}" if request.client else None
 
 
 @app.on_event("startup")
@@ -95,10 +135,18 @@ async def _startup():
     logger.info("Инициализация базы данных...")
     init_db()
     
-    # Инициализация AI сервиса
-    if has_openai_api_key():
-        logger.info("OpenAI API ключ найден, инициализация AI сервиса...")
-        llm_provider = OpenAIProvider()
+    # Сжатые варианты статики (.br/.gz): пересобираются только изменённые файлы
+    if get_static_settings()["precompress"]:
+        try:
+            stats = await asyncio.to_thread(precompress_directory, ASSETS_DIR)
+            logger.info(f"Предварительное сжатие статики: {stats}")
+        except OSError as e:
+            logger.warning(f"Не удалось сжать статику в {ASSETS_DIR}: {e}")
+    
+    # Инициализация AI сервиса (провайдер выбирается LLM_PROVIDER)
+    llm_provider = create_llm_provider()
+    if llm_provider is not None:
+        logger.info(f"Инициализация AI сервиса: {type(llm_provider).__name__}")
         ai_service = AIService(llm_provider)
     else:
         logger.warning("OpenAI API ключ не найден. AI функции будут недоступны.")
@@ -107,6 +155,18 @@ async def _startup():
     logger.info("Health Food приложение успешно запущено!")
 
 
+@app.on_event("shutdown")
+async def _shutdown():
+    """Освобождение ресурсов при остановке"""
+    logger.info("Остановка Health Food приложения, закрытие соединений с БД...")
+    if ai_service:
+        await ai_service.aclose()
+    close_password_hasher()
+    close_db_executor()
+    close_write_queue()
+    close_pool()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -115,7 +175,6 @@ async def index(request: Request):
 @app.post("/api/generate")
 async def generate(
     request: Request,
-    conn: Connection = Depends(get_conn),
     current_user: schemas.User = Depends(get_current_user),
     mode: str = Form(...),
     labs_json: str = Form("{}"),
@@ -128,131 +187,82 @@ async def generate(
     """
     Главный эндпоинт генерации рекомендаций
     Поддерживает режимы: diy, restaurants, photo, ai_recipe
+    
+    Каждый режим - конвейер стадий (app.services.generate_pipelines):
+    независимые стадии выполняются параллельно, длительность каждой
+    возвращается в заголовке Server-Timing.
     """
     try:
         # Парсинг входных данных
         try:
-            labs = json.loads(labs_json or "{}")
+            labs = serialization.loads(labs_json or "{}")
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Неверный формат labs_json")
         
         try:
-            preferences = json.loads(preferences_json or "{}")
+            preferences = serialization.loads(preferences_json or "{}")
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Неверный формат preferences_json")
         
-        # Инициализация сервисов
-        biomarker_repo = BiomarkerRepository(conn)
-        biomarker_service = BiomarkerService(biomarker_repo)
+        if mode not in GENERATE_PIPELINES:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Неизвестный режим: {mode}"
+            )
         
-        recipe_repo = RecipeRepository(conn)
-        recipe_service = RecipeService(recipe_repo)
+        # Проверки входных данных до запуска конвейера
+        if mode == "restaurants" and (lat is None or lon is None):
+            raise HTTPException(
+                status_code=400, 
+                detail="Для режима restaurants требуются координаты (lat, lon)"
+            )
         
-        # Анализ биомаркеров
-        logger.info(f"Анализ биомаркеров для пользователя {current_user.id}")
-        deficits = biomarker_service.analyze_labs(labs)
-        vitamins = biomarker_service.generate_vitamin_recommendations(labs, deficits)
+        if mode in ("photo", "ai_recipe") and not ai_service.is_available():
+            raise HTTPException(
+                status_code=503,
+                detail="AI сервис недоступен. Требуется OpenAI API ключ."
+            )
+        
+        if mode == "photo" and photo is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Требуется загрузка фотографии"
+            )
+        
+        pipeline, output_stage = GENERATE_PIPELINES[mode]
+        ctx = GenerateContext(
+            mode=mode,
+            user_id=current_user.id,
+            labs=labs,
+            preferences=preferences,
+            lat=lat,
+            lon=lon,
+            photo=photo,
+            difficulty=difficulty,
+            ai_service=ai_service,
+        )
+        try:
+            run = await pipeline.run(ctx)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=f"Слишком большое изображение: {e}")
+        except UnsupportedImageError as e:
+            raise HTTPException(status_code=415, detail=f"Неподдерживаемое изображение: {e}")
         
         result: Dict[str, Any] = {
             "mode": mode, 
-            "deficits": deficits, 
-            "vitamins": vitamins
+            "deficits": run["labs"], 
+            "vitamins": run["vitamins"],
+            **run[output_stage],
         }
         
-        # Обработка по режимам
-        if mode == "diy":
-            logger.info("Режим DIY: подбор рецептов")
-            chosen = recipe_service.select_recipes_for_plan(deficits, preferences)
-            shopping = recipe_service.build_shopping_list(chosen)
-            
-            result.update({
-                "plan": chosen,
-                "shopping_list": shopping,
-            })
-            
-        elif mode == "restaurants":
-            if lat is None or lon is None:
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Для режима restaurants требуются координаты (lat, lon)"
-                )
-            
-            logger.info(f"Режим Restaurants: поиск вблизи ({lat}, {lon})")
-            restaurant_repo = RestaurantRepository(conn)
-            restaurant_service = RestaurantService(restaurant_repo)
-            
-            location = {"lat": lat, "lon": lon}
-            scored = restaurant_service.find_best_dishes(deficits, location, limit=20)
-            result.update({"restaurants": scored})
-            
-        elif mode == "photo":
-            if not ai_service.is_available():
-                raise HTTPException(
-                    status_code=503,
-                    detail="AI сервис недоступен. Требуется OpenAI API ключ."
-                )
-            
-            if photo is None:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Требуется загрузка фотографии"
-                )
-            
-            logger.info("Режим Photo: анализ холодильника")
-            image_data = await photo.read()
-            detected = await ai_service.analyze_fridge_photo(image_data)
-            
-            logger.info(f"Обнаружено продуктов: {len(detected)}")
-            preferences_with_available = {**preferences, "available": detected}
-            
-            chosen = recipe_service.select_recipes_for_plan(
-                deficits, 
-                preferences_with_available,
-                available_ingredients=detected
-            )
-            shopping = recipe_service.build_shopping_list(chosen, detected)
-            
-            result.update({
-                "detected": detected,
-                "plan": chosen,
-                "shopping_list": shopping,
-            })
-            
-        elif mode == "ai_recipe":
-            if not ai_service.is_available():
-                raise HTTPException(
-                    status_code=503,
-                    detail="AI сервис недоступен. Требуется OpenAI API ключ."
-                )
-            
-            logger.info("Режим AI Recipe: генерация персонализированных рецептов")
-            user_context = {
-                "labs": labs,
-                "preferences": preferences,
-                "difficulty": difficulty or "легкий",
-            }
-            
-            recipes = await ai_service.generate_personalized_recipes(user_context)
-            
-            # Сохраняем рецепты в БД
-            saved_recipes = [
-                recipe_repo.create(recipe, user_id=current_user.id) 
-                for recipe in recipes
-            ]
-            
-            result.update({"recipes": saved_recipes})
-            
-        else:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Неизвестный режим: {mode}"
-            )
-        
-        logger.info(f"Успешно обработан запрос в режиме {mode}")
-        return JSONResponse(result)
+        logger.info(f"Успешно обработан запрос в режиме {mode}: {run.server_timing()}")
+        return JSONResponse(result, headers={"Server-Timing": run.server_timing()})
         
     except HTTPException:
         raise
+    except AdmissionError as e:
+        logger.warning(f"AI запрос отклонён: {e}")
+        raise _admission_http_error(e)
     except Exception as e:
         logger.error(f"Ошибка при обработке запроса: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -261,10 +271,33 @@ async def generate(
         )
 
 
+def _runtime_stats() -> Dict[str, Any]:
+    return {
+        "db_pool": get_pool_stats(),
+        "db_executor": get_db_executor_stats(),
+        "db_writer": get_write_queue_stats(),
+        "password_hasher": get_password_hasher_stats(),
+        "principal_cache": get_principal_cache_stats(),
+        "json": get_serializer_stats(),
+        "recipe_catalogue": recipe_catalogue.stats(),
+        "restaurant_catalogue": restaurant_catalogue.stats(),
+        "ai": ai_service.stats() if ai_service else None,
+    }
+
+
 # Simple health check
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", **_runtime_stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики в формате Prometheus: вызовы LLM (задержки, токены) и статистика /health"""
+    return PlainTextResponse(
+        render_prometheus(registry, _runtime_stats()),
+        media_type="text/plain; version=0.0.4",
+    )
 
 @app.post("/api/profile")
 async def api_save_profile(
@@ -273,7 +306,10 @@ async def api_save_profile(
     goals: str = Form(""),
     current_user: schemas.User = Depends(get_current_user),
 ):
-    return save_profile(name=name, email=email, goals=goals, user_id=current_user.id)
+    profile = await save_profile(name=name, email=email, goals=goals, user_id=current_user.id)
+    # Кэшированный пользователь со старыми полями больше не выдаётся
+    invalidate_principal(current_user.id)
+    return profile
 
 
 # Labs save + reminder
@@ -283,20 +319,20 @@ async def api_save_labs(
     weeks: int = Form(10),
 ):
     try:
-        labs = json.loads(labs_json or "{}")
+        labs = serialization.loads(labs_json or "{}")
     except Exception:
         return JSONResponse({"error": "invalid labs_json"}, status_code=400)
-    return save_labs_and_schedule(labs, weeks_from_now=int(weeks))
+    return await save_labs_and_schedule(labs, weeks_from_now=int(weeks))
 
 
 # Reminders
 @app.get("/api/reminders/upcoming")
 async def api_upcoming(days: int = 120):
-    return {"items": get_upcoming_reminders(days=days)}
+    return {"items": await run_db(get_upcoming_reminders, days=days)}
 
 
 @app.post("/api/vitamins/recommendations")
-async def api_vitamins_recommendations(request: ChatRequest):
+async def api_vitamins_recommendations(request: ChatRequest, http_request: Request):
     """
     Эндпоинт для получения AI консультации по витаминам и добавкам
     """
@@ -313,12 +349,72 @@ async def api_vitamins_recommendations(request: ChatRequest):
             user_message=request.message,
             user_context=request.context,
             thread_id=request.thread_id,
+            caller=_client_caller(http_request),
         )
 
         return result
+    except AdmissionError as e:
+        logger.warning(f"AI запрос отклонён: {e}")
+        raise _admission_http_error(e)
     except Exception as e:
         logger.error(f"Ошибка при получении рекомендаций по витаминам: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при генерации рекомендаций: {str(e)}"
         )
+
+
+def _stream_error(error: BaseException) -> Dict[str, Any]:
+    """Событие error потокового ответа (HTTP статус уже отправлен)"""
+    if isinstance(error, AdmissionError):
+        return {
+            "status": error.status_code,
+            "detail": str(error),
+            "retry_after": error.retry_after_header,
+        }
+    if isinstance(error, LLMProviderError):
+        logger.warning(f"Ошибка провайдера при потоковой консультации: {error}")
+        return {"status": 502, "detail": "AI сервис вернул ошибку, повторите позже"}
+    logger.error(f"Ошибка потоковой консультации: {error}", exc_info=error)
+    return {"status": 500, "detail": "Ошибка при генерации рекомендаций"}
+
+
+@app.post("/api/vitamins/recommendations/stream")
+async def api_vitamins_recommendations_stream(request: ChatRequest, http_request: Request):
+    """
+    Потоковая AI консультация по витаминам (Server-Sent Events)
+    
+    События: start {thread_id}, delta {text} - по мере генерации,
+    done {thread_id, reply} или error {status, detail}. Пока текста нет,
+    отправляются комментарии-heartbeat; отключение клиента отменяет генерацию.
+    """
+    if not ai_service or not ai_service.is_available():
+        raise HTTPException(
+            status_code=503,
+            detail="AI сервис недоступен. Требуется OpenAI API ключ."
+        )
+    
+    # Перегрузку сообщаем статусом 429/503, пока ответ не начат
+    try:
+        ai_service.check_admission("consultation", caller=_client_caller(http_request))
+    except AdmissionError as e:
+        raise _admission_http_error(e)
+    
+    logger.info(f"Потоковый запрос консультации по витаминам: {request.message[:50]}...")
+    thread = await ai_service.open_thread(
+        request.thread_id, request.context, caller=_client_caller(http_request)
+    )
+    chunks = ai_service.stream_nutrition_consultation(
+        user_message=request.message,
+        thread=thread,
+        user_context=request.context,
+        caller=_client_caller(http_request),
+    )
+    return sse_response(
+        text_event_stream(
+            chunks,
+            http_request,
+            start={"thread_id": thread.id},
+            on_error=_stream_error,
+        )
+    )
@@ -0,0 +1,267 @@
+"""In-process metrics: labelled counters, histograms with a rolling window, Prometheus text export."""
+import bisect
+import math
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import get_metrics_window
+
+# Seconds; LLM calls range from a cached 50 ms to multi-minute agent runs
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_INVALID_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name}: expected labels {self.label_names}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.label_names, key)), value) for key, value in items]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class _Series:
+    """One label set of a histogram: all-time buckets plus recent samples."""
+
+    __slots__ = ("counts", "count", "sum", "recent")
+
+    def __init__(self, buckets: int, max_samples: int):
+        self.counts = [0] * (buckets + 1)
+        self.count = 0
+        self.sum = 0.0
+        # (monotonic time, value), oldest first
+        self.recent: deque = deque(maxlen=max_samples)
+
+
+class Histogram(_Metric):
+    """Histogram per label set.
+
+    Bucket counts, sum and count are cumulative since start (what Prometheus
+    expects). Percentiles are computed over a rolling window of the last
+    ``window`` seconds (at most ``max_samples`` observations), so they
+    reflect current behaviour rather than the whole process lifetime.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+        window: Optional[float] = None,
+        max_samples: int = 4096,
+    ):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window or get_metrics_window()
+        self.max_samples = max_samples
+        self._series: Dict[LabelValues, _Series] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        now = time.monotonic()
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets), self.max_samples)
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.count += 1
+            series.sum += value
+            series.recent.append((now, value))
+
+    def _recent(self, series: _Series, now: float) -> List[float]:
+        while series.recent and series.recent[0][0] < now - self.window:
+            series.recent.popleft()
+        return sorted(value for _, value in series.recent)
+
+    def summary(self) -> List[Tuple[Dict[str, str], Dict[str, Any]]]:
+        """Per label set: totals and percentiles of the rolling window."""
+        now = time.monotonic()
+        result = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                recent = self._recent(series, now)
+                stats: Dict[str, Any] = {
+                    "count": series.count,
+                    "sum": round(series.sum, 3),
+                    "window_count": len(recent),
+                }
+                for q in QUANTILES:
+                    stats[f"p{int(q * 100)}"] = round(_percentile(recent, q), 3)
+                stats["max"] = round(recent[-1], 3) if recent else 0.0
+                result.append((dict(zip(self.label_names, key)), stats))
+        return result
+
+    def render(self) -> List[str]:
+        lines = []
+        now = time.monotonic()
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), series.counts):
+                    cumulative += count
+                    labels = _format_labels(
+                        self.label_names + ("le",), key + (_format_value(bound),)
+                    )
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series.sum)}")
+                lines.append(f"{self.name}_count{labels} {series.count}")
+            # Rolling percentiles as a separate gauge family
+            window_lines = []
+            for key, series in sorted(self._series.items()):
+                recent = self._recent(series, now)
+                for q in QUANTILES:
+                    labels = _format_labels(self.label_names + ("quantile",), key + (str(q),))
+                    window_lines.append(
+                        f"{self.name}_window{labels} {_format_value(_percentile(recent, q))}"
+                    )
+        if window_lines:
+            lines.append(
+                f"# HELP {self.name}_window Percentiles over the last {int(self.window)} s"
+            )
+            lines.append(f"# TYPE {self.name}_window gauge")
+            lines.extend(window_lines)
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of the process; creating an existing metric returns it."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args: Any, **kwargs: Any):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return lines
+
+
+def _flatten(prefix: str, value: Any, out: Dict[str, float]) -> None:
+    if isinstance(value, bool):
+        out[prefix] = float(value)
+    elif isinstance(value, (int, float)):
+        out[prefix] = float(value)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}_{_INVALID_NAME.sub('_', str(key))}", item, out)
+
+
+def render_prometheus(
+    registry: "MetricsRegistry", gauges: Optional[Dict[str, Any]] = None, prefix: str = "health_food"
+) -> str:
+    """Text exposition format (version 0.0.4).
+
+    ``gauges`` is a nested stats dict (as served by /health); its numeric
+    and boolean leaves are exported as gauges named after their path.
+    """
+    lines = registry.render()
+    flat: Dict[str, float] = {}
+    for key, value in (gauges or {}).items():
+        _flatten(f"{prefix}_{_INVALID_NAME.sub('_', key)}", value, flat)
+    for name, value in flat.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
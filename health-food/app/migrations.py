@@ -0,0 +1,394 @@
+"""Versioned schema migrations for the SQLite store.
+
+Each migration is applied exactly once, in order, and recorded in the
+``schema_version`` table. To evolve the schema append a new step to
+``MIGRATIONS``; never edit a step that has already shipped.
+"""
+import logging
+import sqlite3
+import sys
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+# Version 1 adopts databases created before versioning existed, which is why
+# it is the only step allowed to use IF NOT EXISTS.
+_INITIAL_SCHEMA: List[Step] = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        hashed_password TEXT NOT NULL,
+        goals TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS recipes (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        name TEXT NOT NULL,
+        time_min INTEGER,
+        description TEXT,
+        ingredients TEXT,
+        instructions TEXT,
+        tags TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS restaurants (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dishes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        restaurant_id TEXT,
+        name TEXT NOT NULL,
+        nutrients TEXT,
+        FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS biomarker_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        marker_key TEXT NOT NULL,
+        operator TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        deficit_tag TEXT NOT NULL,
+        reason_template TEXT,
+        targets TEXT,
+        foods TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS labs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        data_json TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reminders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        due_at TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        note TEXT,
+        done INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+]
+
+_SECONDARY_INDEXES: List[Step] = [
+    # get_user_recipes (user_id = ? ORDER BY name), get_all_public (user_id IS NULL)
+    "CREATE INDEX idx_recipes_user_name ON recipes (user_id, name)",
+    # get_upcoming_reminders: only pending reminders are ever queried
+    "CREATE INDEX idx_reminders_pending ON reminders (user_id, due_at) WHERE done = 0",
+    # dishes of a restaurant
+    "CREATE INDEX idx_dishes_restaurant ON dishes (restaurant_id)",
+    # labs history of a user
+    "CREATE INDEX idx_labs_user_created ON labs (user_id, created_at)",
+]
+
+_SEED_MANIFEST: List[Step] = [
+    """
+    CREATE TABLE seed_manifest (
+        source TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+_RECIPE_NUTRIENTS: List[Step] = [
+    "ALTER TABLE recipes ADD COLUMN difficulty INTEGER",
+    """
+    CREATE TABLE recipe_nutrients (
+        recipe_id TEXT NOT NULL REFERENCES recipes (id),
+        nutrient TEXT NOT NULL,
+        amount REAL NOT NULL,
+        PRIMARY KEY (recipe_id, nutrient)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX idx_recipe_nutrients_nutrient ON recipe_nutrients (nutrient, recipe_id)",
+    # foreign_keys is off, so nutrients are cleaned up explicitly
+    """
+    CREATE TRIGGER trg_recipes_delete_nutrients AFTER DELETE ON recipes
+    BEGIN
+        DELETE FROM recipe_nutrients WHERE recipe_id = OLD.id;
+    END
+    """,
+]
+
+_CATALOGUE_VERSION: List[Step] = [
+    """
+    CREATE TABLE catalogue_version (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT INTO catalogue_version (name, version) VALUES ('recipes', 0)",
+    # Any change to public recipes (or their nutrients) bumps the counter, so
+    # in-memory snapshots in every worker notice writes from any process
+    """
+    CREATE TRIGGER trg_recipes_catalogue_insert AFTER INSERT ON recipes
+    WHEN NEW.user_id IS NULL
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = 'recipes';
+    END
+    """,
+    """
+    CREATE TRIGGER trg_recipes_catalogue_update AFTER UPDATE ON recipes
+    WHEN NEW.user_id IS NULL OR OLD.user_id IS NULL
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = 'recipes';
+    END
+    """,
+    """
+    CREATE TRIGGER trg_recipes_catalogue_delete AFTER DELETE ON recipes
+    WHEN OLD.user_id IS NULL
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = 'recipes';
+    END
+    """,
+    """
+    CREATE TRIGGER trg_recipe_nutrients_catalogue_insert AFTER INSERT ON recipe_nutrients
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = 'recipes';
+    END
+    """,
+    """
+    CREATE TRIGGER trg_recipe_nutrients_catalogue_update AFTER UPDATE ON recipe_nutrients
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = 'recipes';
+    END
+    """,
+    """
+    CREATE TRIGGER trg_recipe_nutrients_catalogue_delete AFTER DELETE ON recipe_nutrients
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = 'recipes';
+    END
+    """,
+]
+
+_RESTAURANT_CATALOGUE_VERSION: List[Step] = [
+    "INSERT INTO catalogue_version (name, version) VALUES ('restaurants', 0)",
+] + [
+    f"""
+    CREATE TRIGGER trg_{table}_catalogue_{event.lower()} AFTER {event} ON {table}
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = 'restaurants';
+    END
+    """
+    for table in ("restaurants", "dishes")
+    for event in ("INSERT", "UPDATE", "DELETE")
+]
+
+_LLM_RESPONSE_CACHE: List[Step] = [
+    """
+    CREATE TABLE llm_cache (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX idx_llm_cache_expires ON llm_cache (expires_at)",
+]
+
+_CONVERSATION_THREADS: List[Step] = [
+    """
+    CREATE TABLE conversation_threads (
+        id TEXT PRIMARY KEY,
+        context TEXT NOT NULL DEFAULT '{}',
+        summary TEXT NOT NULL DEFAULT '',
+        -- messages up to this seq are folded into summary
+        summarized_seq INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE conversation_messages (
+        thread_id TEXT NOT NULL REFERENCES conversation_threads (id),
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        tokens INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (thread_id, seq)
+    ) WITHOUT ROWID
+    """,
+]
+
+# Threads belong to the caller that started them; idle ones are purged by
+# updated_at. Threads from before this migration have no owner and are
+# never continued
+_CONVERSATION_THREAD_OWNER: List[Step] = [
+    "ALTER TABLE conversation_threads ADD COLUMN owner TEXT",
+    "CREATE INDEX idx_conversation_threads_updated_at ON conversation_threads (updated_at)",
+]
+
+# Nutrients of private (user) recipes must not invalidate the public
+# catalogue, just like the triggers on recipes itself
+_PUBLIC_RECIPE_NUTRIENTS_VERSION: List[Step] = [
+    f"DROP TRIGGER trg_recipe_nutrients_catalogue_{event}"
+    for event in ("insert", "update", "delete")
+] + [
+    f"""
+    CREATE TRIGGER trg_recipe_nutrients_catalogue_{event.lower()} AFTER {event} ON recipe_nutrients
+    WHEN {condition}
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = 'recipes';
+    END
+    """
+    for event, condition in (
+        ("INSERT", "EXISTS (SELECT 1 FROM recipes WHERE id = NEW.recipe_id AND user_id IS NULL)"),
+        (
+            "UPDATE",
+            "EXISTS (SELECT 1 FROM recipes WHERE id IN (NEW.recipe_id, OLD.recipe_id) AND user_id IS NULL)",
+        ),
+        ("DELETE", "EXISTS (SELECT 1 FROM recipes WHERE id = OLD.recipe_id AND user_id IS NULL)"),
+    )
+]
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "initial schema", _INITIAL_SCHEMA),
+    (2, "secondary indexes for hot queries", _SECONDARY_INDEXES),
+    (3, "seed manifest", _SEED_MANIFEST),
+    (4, "recipe difficulty and normalized nutrients", _RECIPE_NUTRIENTS),
+    (5, "catalogue version counter", _CATALOGUE_VERSION),
+    (6, "restaurant catalogue version counter", _RESTAURANT_CATALOGUE_VERSION),
+    (7, "persistent LLM response cache", _LLM_RESPONSE_CACHE),
+    (8, "conversation threads of the nutrition agent", _CONVERSATION_THREADS),
+    (9, "catalogue version ignores nutrients of private recipes", _PUBLIC_RECIPE_NUTRIENTS_VERSION),
+    (10, "conversation thread owner and retention", _CONVERSATION_THREAD_OWNER),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Applies all pending migrations and returns the resulting version.
+
+    The whole run happens under ``BEGIN IMMEDIATE``, so when several workers
+    start at once only one applies the steps and the others see them done.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.commit()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = get_schema_version(conn)
+        for version, description, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            logger.info(f"Applying schema migration {version}: {description}")
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description),
+            )
+            current = version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return current
+
+
+# Hot queries with representative parameters; every one must be served by an index
+HOT_QUERIES: Dict[str, Tuple[str, Sequence[Any]]] = {
+    "recipes.get_all_public": (
+        "SELECT * FROM recipes WHERE user_id IS NULL ORDER BY name",
+        (),
+    ),
+    "recipes.get_user_recipes": (
+        "SELECT * FROM recipes WHERE user_id = ? ORDER BY name",
+        (1,),
+    ),
+    "recipes.get_user_and_public": (
+        "SELECT * FROM recipes WHERE user_id = ? OR user_id IS NULL",
+        (1,),
+    ),
+    "reminders.get_upcoming": (
+        "SELECT id, due_at, kind, note, done FROM reminders "
+        "WHERE done=0 AND user_id = 1 AND due_at BETWEEN ? AND ? ORDER BY due_at ASC",
+        ("2000-01-01T00:00:00Z", "2100-01-01T00:00:00Z"),
+    ),
+    "dishes.by_restaurant": (
+        "SELECT restaurant_id, name, nutrients FROM dishes WHERE restaurant_id IN (?, ?)",
+        ("r1", "r2"),
+    ),
+    "recipe_nutrients.by_nutrient": (
+        "SELECT recipe_id, nutrient FROM recipe_nutrients WHERE nutrient IN (?, ?)",
+        ("iron", "b12"),
+    ),
+    "recipe_nutrients.by_recipe": (
+        "SELECT recipe_id, nutrient, amount FROM recipe_nutrients WHERE recipe_id IN (?, ?)",
+        ("a", "b"),
+    ),
+    "users.by_username": (
+        "SELECT * FROM users WHERE username = ?",
+        ("user",),
+    ),
+}
+
+
+def explain_hot_queries(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """Returns the EXPLAIN QUERY PLAN details of every hot query."""
+    return {
+        name: [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        for name, (sql, params) in HOT_QUERIES.items()
+    }
+
+
+def find_unindexed_queries(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """Returns the plans of hot queries that fall back to a full table scan."""
+    return {
+        name: plan
+        for name, plan in explain_hot_queries(conn).items()
+        if any(line.startswith("SCAN") and "INDEX" not in line for line in plan)
+    }
+
+
+if __name__ == "__main__":
+    # python -m app.migrations: migrate the database and verify the hot query plans
+    from .db import connection
+
+    with connection() as conn:
+        print(f"schema version: {migrate(conn)}")
+        plans = explain_hot_queries(conn)
+        unindexed = find_unindexed_queries(conn)
+    for name, plan in plans.items():
+        status = "FULL SCAN" if name in unindexed else "ok"
+        print(f"[{status}] {name}: {'; '.join(plan)}")
+    sys.exit(1 if unindexed else 0)
@@ -0,0 +1,128 @@
+"""Request pipelines: declared stages with dependencies, run concurrently, timed per stage."""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+StageFunc = Callable[..., Union[Any, Awaitable[Any]]]
+# Awaits ``func(*args, **kwargs)`` off the event loop
+BlockingRunner = Callable[..., Awaitable[Any]]
+
+
+class Stage:
+    """A named step of a pipeline.
+
+    ``func(ctx, **deps)`` receives the request context and the results of
+    the stages named in ``deps`` as keyword arguments. Coroutine functions
+    are awaited on the event loop; with ``blocking=True`` a plain function
+    runs through the pipeline's blocking runner (DB queries, CPU-bound
+    scoring), otherwise it runs inline and must be cheap.
+    """
+
+    __slots__ = ("name", "func", "deps", "blocking")
+
+    def __init__(self, name: str, func: StageFunc, deps: Sequence[str] = (), blocking: bool = False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.blocking = blocking
+
+    async def run(self, ctx: Any, deps: Dict[str, Any], run_blocking: BlockingRunner = asyncio.to_thread) -> Any:
+        if asyncio.iscoroutinefunction(self.func):
+            return await self.func(ctx, **deps)
+        if self.blocking:
+            return await run_blocking(self.func, ctx, **deps)
+        return self.func(ctx, **deps)
+
+
+class PipelineRun:
+    """Results and timings of one pipeline execution."""
+
+    def __init__(self):
+        self.results: Dict[str, Any] = {}
+        # Stage name -> duration in ms (own work, without waiting for deps)
+        self.timings: Dict[str, float] = {}
+        self.total_ms = 0.0
+
+    def __getitem__(self, name: str) -> Any:
+        return self.results[name]
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value: one metric per stage plus total."""
+        metrics = [f"{name};dur={duration:.1f}" for name, duration in self.timings.items()]
+        metrics.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(metrics)
+
+
+class Pipeline:
+    """
+    A DAG of stages.
+
+    Every stage starts as soon as all of its dependencies have finished, so
+    independent stages overlap: coroutines interleave on the event loop and
+    blocking stages run in parallel threads. If a stage fails, stages still
+    running are cancelled and the exception propagates unchanged.
+
+    Blocking stages go through ``run_blocking`` (``asyncio.to_thread`` by
+    default), e.g. a dedicated DB thread pool.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stages: Optional[List[Stage]] = None,
+        run_blocking: BlockingRunner = asyncio.to_thread,
+    ):
+        self.name = name
+        self.run_blocking = run_blocking
+        self.stages: List[Stage] = []
+        for stage in stages or []:
+            self.add(stage)
+
+    def add(self, stage: Stage) -> "Pipeline":
+        known = {s.name for s in self.stages}
+        if stage.name in known:
+            raise ValueError(f"{self.name}: duplicate stage {stage.name}")
+        # Dependencies must be declared first, which also rules out cycles
+        missing = [dep for dep in stage.deps if dep not in known]
+        if missing:
+            raise ValueError(f"{self.name}: stage {stage.name} depends on unknown {missing}")
+        self.stages.append(stage)
+        return self
+
+    def stage(self, name: str, deps: Sequence[str] = (), blocking: bool = False):
+        """Decorator form of :meth:`add`."""
+        def register(func: StageFunc) -> StageFunc:
+            self.add(Stage(name, func, deps, blocking))
+            return func
+
+        return register
+
+    async def run(self, ctx: Any) -> PipelineRun:
+        run = PipelineRun()
+        tasks: Dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+
+        async def execute(stage: Stage) -> Any:
+            deps = {dep: await tasks[dep] for dep in stage.deps}
+            stage_started = time.perf_counter()
+            try:
+                result = await stage.run(ctx, deps, self.run_blocking)
+            finally:
+                run.timings[stage.name] = (time.perf_counter() - stage_started) * 1000
+            run.results[stage.name] = result
+            return result
+
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.ensure_future(execute(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            run.total_ms = (time.perf_counter() - started) * 1000
+        # Declaration order, not completion order
+        run.timings = {s.name: run.timings[s.name] for s in self.stages if s.name in run.timings}
+        return run
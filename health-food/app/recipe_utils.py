@@ -1,7 +1,7 @@
 from collections import defaultdict
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, FrozenSet, List
 
-from .db import get_public_recipes
+from .catalogue.recipes import CatalogueEntry, recipe_catalogue
 
 RECIPE_DB: List[Dict[str, Any]] = [
     {
@@ -139,57 +139,56 @@ RECIPE_DB: List[Dict[str, Any]] = [
 ]
 
 
-def _score_recipe_for_deficits(
-    recipe: Dict[str, Any], deficits: List[Dict[str, Any]], available: Set[str]
-) -> float:
-    score = 0.0
-    tags = set(recipe.get("tags", []))
-    for d in deficits:
-        if d["marker"] in tags:
-            score += 2
-        # heuristic: nutrients present add small points
-        for t in d.get("targets", {}).keys():
-            if t in recipe.get("nutrients", {}):
-                score += 0.5
-    # prefer available ingredients
-    if available:
-        ing = set(x["name"].lower() for x in recipe["ingredients"])
-        avail_lower = set(x.lower() for x in available)
-        overlap = len(ing & avail_lower)
-        score += 0.2 * overlap
+# Items that are assumed to be at hand when filtering by available ingredients
+COMMON_PANTRY_ITEMS: FrozenSet[str] = frozenset(
+    {
+        "оливковое масло",
+        "соль",
+        "перец",
+        "вода",
+        "чеснок",
+        "лук репчатый",
+    }
+)
+
+
+def _simplicity_bonus(entry: CatalogueEntry) -> float:
     # prefer simplicity
-    score += max(0, 5 - recipe.get("difficulty", 1)) * 0.05
-    return score
+    difficulty = entry.recipe.get("difficulty")
+    if difficulty is None:
+        difficulty = 1
+    return max(0, 5 - difficulty) * 0.05
 
 
 def select_recipes_for_deficits(deficits, preferences=None):
     preferences = preferences or {}
     available = set(p.lower() for p in preferences.get("available", []))
 
-    db = get_public_recipes()
-    filtered_db = db
-    if available:
-        common_pantry_items = {
-            "оливковое масло",
-            "соль",
-            "перец",
-            "вода",
-            "чеснок",
-            "лук репчатый",
-        }
-        filtered_db = []
-        for recipe in db:
-            required_ingredients = {
-                ing["name"].lower() for ing in recipe["ingredients"]
-            }
-            missing_ingredients = required_ingredients - available - common_pantry_items
-            if not missing_ingredients:
-                filtered_db.append(recipe)
+    snapshot = recipe_catalogue.get()
+    index = snapshot.index
 
-    scored = [
-        (r, _score_recipe_for_deficits(r, deficits, available)) for r in filtered_db
-    ]
-    scored.sort(key=lambda x: x[1], reverse=True)
+    # query-dependent score terms, in summation order
+    terms = []
+    for d in deficits:
+        terms.append((("tag", d["marker"]), 2))
+        # heuristic: nutrients present add small points
+        for t in d.get("targets", {}).keys():
+            terms.append((("nutrient", t), 0.5))
+
+    def combine(value: float, bonus: float) -> float:
+        return value + bonus
+
+    # prefer available ingredients, and only those missing none of them
+    ranked = index.search(
+        terms,
+        index.classes("recipe_utils", _simplicity_bonus),
+        combine,
+        available,
+        overlap_weight=0.2,
+        pantry=COMMON_PANTRY_ITEMS if available else None,
+        max_missing=0,
+    )
+    scored = ((snapshot.entries[pos].recipe, score) for pos, score in ranked)
     plan = []
     used = set()
     for r, _ in scored:
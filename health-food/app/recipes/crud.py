@@ -1,8 +1,9 @@
-import json
 import uuid
 from sqlite3 import Connection
 from typing import List, Optional
 
+from .. import serialization
+from ..db import run_write
 from . import schemas
 
 
@@ -11,9 +12,9 @@ def _row_to_recipe(row) -> Optional[schemas.Recipe]:
         return None
     
     recipe_dict = dict(row)
-    recipe_dict["ingredients"] = json.loads(recipe_dict.get("ingredients", "[]") or "[]")
-    recipe_dict["instructions"] = json.loads(recipe_dict.get("instructions", "[]") or "[]")
-    recipe_dict["tags"] = json.loads(recipe_dict.get("tags", "[]") or "[]")
+    recipe_dict["ingredients"] = serialization.loads(recipe_dict.get("ingredients", "[]") or "[]")
+    recipe_dict["instructions"] = serialization.loads(recipe_dict.get("instructions", "[]") or "[]")
+    recipe_dict["tags"] = serialization.loads(recipe_dict.get("tags", "[]") or "[]")
     return schemas.Recipe(**recipe_dict)
 
 
@@ -22,24 +23,25 @@ class RecipeCRUD:
         self, conn: Connection, recipe: schemas.RecipeCreate, user_id: int
     ) -> schemas.Recipe:
         recipe_id = f"custom_{uuid.uuid4().hex[:8]}"
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO recipes (id, user_id, name, time_min, description, ingredients, instructions, tags)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                recipe_id,
-                user_id,
-                recipe.name,
-                recipe.time_min,
-                recipe.description,
-                json.dumps([i.dict() for i in recipe.ingredients]),
-                json.dumps(recipe.instructions),
-                json.dumps(recipe.tags),
-            ),
+        run_write(
+            lambda writer: writer.execute(
+                """
+                INSERT INTO recipes (id, user_id, name, time_min, description, ingredients, instructions, tags, difficulty)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    recipe_id,
+                    user_id,
+                    recipe.name,
+                    recipe.time_min,
+                    recipe.description,
+                    serialization.dumps([i.dict() for i in recipe.ingredients]),
+                    serialization.dumps(recipe.instructions),
+                    serialization.dumps(recipe.tags),
+                    recipe.difficulty,
+                ),
+            )
         )
-        conn.commit()
         return self.get_recipe(conn, recipe_id)
 
     def get_recipe(self, conn: Connection, recipe_id: str) -> Optional[schemas.Recipe]:
@@ -62,7 +64,7 @@ class RecipeCRUD:
         # Serialize JSON fields
         for field in ["ingredients", "instructions", "tags"]:
             if field in update_data:
-                update_data[field] = json.dumps(update_data[field])
+                update_data[field] = serialization.dumps(update_data[field])
 
         if not update_data:
             return self.get_recipe(conn, recipe_id)
@@ -71,16 +73,20 @@ class RecipeCRUD:
         params = list(update_data.values())
         params.append(recipe_id)
 
-        cur = conn.cursor()
-        cur.execute(f"UPDATE recipes SET {set_clause} WHERE id = ?", tuple(params))
-        conn.commit()
+        run_write(
+            lambda writer: writer.execute(
+                f"UPDATE recipes SET {set_clause} WHERE id = ?", tuple(params)
+            )
+        )
         
         return self.get_recipe(conn, recipe_id)
 
     def delete_recipe(self, conn: Connection, recipe_id: str) -> bool:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
-        conn.commit()
-        return cur.rowcount > 0
+        deleted = run_write(
+            lambda writer: writer.execute(
+                "DELETE FROM recipes WHERE id = ?", (recipe_id,)
+            ).rowcount
+        )
+        return deleted > 0
 
 recipe_crud = RecipeCRUD()
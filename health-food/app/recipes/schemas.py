@@ -14,6 +14,7 @@ class RecipeBase(BaseModel):
     ingredients: Optional[List[Ingredient]] = []
     instructions: Optional[List[str]] = []
     tags: Optional[List[str]] = []
+    difficulty: Optional[int] = None
 
 
 class RecipeCreate(RecipeBase):
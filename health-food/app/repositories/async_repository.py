@@ -0,0 +1,42 @@
+"""Асинхронный фасад репозиториев для async-обработчиков"""
+import sqlite3
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+from ..db import run_with_conn
+
+R = TypeVar("R")
+
+
+class AsyncRepository(Generic[R]):
+    """
+    Awaitable-обёртка синхронного репозитория
+
+    Каждый вызов метода выполняется в пуле потоков БД на собственном
+    соединении из пула, поэтому медленный запрос не блокирует цикл событий
+    и другие запросы воркера::
+
+        thread = await AsyncRepository(ThreadRepository).get(thread_id)
+
+    Соединение живёт один вызов: несколько операций в одной транзакции
+    выполняются одной функцией через ``run_with_conn``.
+    """
+
+    def __init__(self, factory: Callable[[sqlite3.Connection], R]):
+        self._factory = factory
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        factory = self._factory
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await run_with_conn(
+                lambda conn: getattr(factory(conn), name)(*args, **kwargs)
+            )
+
+        call.__name__ = name
+        return call
+
+    async def run(self, fn: Callable[[R], Any]) -> Any:
+        """Выполнить ``fn(repository)`` в пуле потоков БД"""
+        return await run_with_conn(lambda conn: fn(self._factory(conn)))
@@ -1,8 +1,10 @@
 """Repository для работы с биомаркерами и правилами"""
-import json
 import sqlite3
 from typing import Any, Dict, List
 
+from .. import serialization
+from ..db import run_write
+
 
 class BiomarkerRepository:
     """Репозиторий для работы с правилами биомаркеров"""
@@ -19,36 +21,33 @@ class BiomarkerRepository:
         rules = []
         for row in rows:
             rule = dict(row)
-            rule["targets"] = json.loads(rule["targets"])
-            rule["foods"] = json.loads(rule["foods"])
+            rule["targets"] = serialization.loads(rule["targets"])
+            rule["foods"] = serialization.loads(rule["foods"])
             rules.append(rule)
         
         return rules
     
     def create_rule(self, rule: Dict[str, Any]) -> int:
         """Создать новое правило биомаркера"""
-        cur = self.conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO biomarker_rules 
-            (marker_key, operator, threshold, deficit_tag, reason_template, targets, foods)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                rule["marker_key"],
-                rule["operator"],
-                rule["threshold"],
-                rule["deficit_tag"],
-                rule["reason_template"],
-                json.dumps(rule.get("targets", {}), ensure_ascii=False),
-                json.dumps(rule.get("foods", []), ensure_ascii=False),
-            ),
+        return run_write(
+            lambda writer: writer.execute(
+                """
+                INSERT INTO biomarker_rules 
+                (marker_key, operator, threshold, deficit_tag, reason_template, targets, foods)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    rule["marker_key"],
+                    rule["operator"],
+                    rule["threshold"],
+                    rule["deficit_tag"],
+                    rule["reason_template"],
+                    serialization.dumps(rule.get("targets", {})),
+                    serialization.dumps(rule.get("foods", [])),
+                ),
+            ).lastrowid
         )
-        self.conn.commit()
-        return cur.lastrowid
     
     def delete_all_rules(self):
         """Удалить все правила (для пересоздания)"""
-        cur = self.conn.cursor()
-        cur.execute("DELETE FROM biomarker_rules")
-        self.conn.commit()
+        run_write(lambda writer: writer.execute("DELETE FROM biomarker_rules"))
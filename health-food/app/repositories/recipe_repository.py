@@ -1,13 +1,18 @@
 """Repository для работы с рецептами в БД"""
-import json
 import sqlite3
 import uuid
 from typing import Any, Dict, List, Optional
 
+from .. import serialization
+from ..db import run_write
+
 
 class RecipeRepository:
     """Репозиторий для работы с рецептами"""
     
+    # Сколько ID подставлять в один запрос IN (...)
+    _ID_CHUNK = 500
+    
     def __init__(self, conn: sqlite3.Connection):
         self.conn = conn
         self.conn.row_factory = sqlite3.Row
@@ -19,7 +24,7 @@ class RecipeRepository:
             "SELECT * FROM recipes WHERE user_id IS NULL ORDER BY name"
         ).fetchall()
         
-        return [self._row_to_dict(row) for row in rows]
+        return self._attach_nutrients([self._row_to_dict(row) for row in rows])
     
     def get_user_recipes(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить рецепты пользователя"""
@@ -29,7 +34,7 @@ class RecipeRepository:
             (user_id,)
         ).fetchall()
         
-        return [self._row_to_dict(row) for row in rows]
+        return self._attach_nutrients([self._row_to_dict(row) for row in rows])
     
     def get_by_id(self, recipe_id: str) -> Optional[Dict[str, Any]]:
         """Получить рецепт по ID"""
@@ -39,19 +44,35 @@ class RecipeRepository:
             (recipe_id,)
         ).fetchone()
         
-        return self._row_to_dict(row) if row else None
+        if not row:
+            return None
+        return self._attach_nutrients([self._row_to_dict(row)])[0]
     
     def create(self, recipe: Dict[str, Any], user_id: Optional[int] = None) -> Dict[str, Any]:
         """Создать новый рецепт"""
-        cur = self.conn.cursor()
-        
         recipe_id = recipe.get("id") or f"recipe_{uuid.uuid4().hex[:8]}"
         
-        cur.execute(
+        # Вставка идёт через единственного писателя (групповой коммит)
+        run_write(lambda writer: self.insert(writer, recipe_id, recipe, user_id))
+        if user_id is None:
+            self._invalidate_catalogue()
+        
+        return self.get_by_id(recipe_id)
+    
+    @classmethod
+    def insert(
+        cls,
+        writer: sqlite3.Connection,
+        recipe_id: str,
+        recipe: Dict[str, Any],
+        user_id: Optional[int] = None,
+    ) -> None:
+        """Вставить рецепт с нутриентами (для функций очереди записи)"""
+        writer.execute(
             """
             INSERT INTO recipes 
-            (id, user_id, name, time_min, description, ingredients, instructions, tags)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            (id, user_id, name, time_min, description, ingredients, instructions, tags, difficulty)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 recipe_id,
@@ -59,69 +80,136 @@ class RecipeRepository:
                 recipe.get("name"),
                 recipe.get("time_min"),
                 recipe.get("description"),
-                json.dumps(recipe.get("ingredients", []), ensure_ascii=False),
-                json.dumps(recipe.get("instructions", []), ensure_ascii=False),
-                json.dumps(recipe.get("tags", []), ensure_ascii=False),
+                serialization.dumps(recipe.get("ingredients", [])),
+                serialization.dumps(recipe.get("instructions", [])),
+                serialization.dumps(recipe.get("tags", [])),
+                recipe.get("difficulty"),
             ),
         )
-        self.conn.commit()
-        
-        return self.get_by_id(recipe_id)
+        cls._write_nutrients(writer, recipe_id, recipe.get("nutrients"))
     
     def update(self, recipe_id: str, recipe: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Обновить рецепт"""
-        cur = self.conn.cursor()
+        def write(writer: sqlite3.Connection) -> None:
+            writer.execute(
+                """
+                UPDATE recipes 
+                SET name = ?, time_min = ?, description = ?, 
+                    ingredients = ?, instructions = ?, tags = ?, difficulty = ?
+                WHERE id = ?
+                """,
+                (
+                    recipe.get("name"),
+                    recipe.get("time_min"),
+                    recipe.get("description"),
+                    serialization.dumps(recipe.get("ingredients", [])),
+                    serialization.dumps(recipe.get("instructions", [])),
+                    serialization.dumps(recipe.get("tags", [])),
+                    recipe.get("difficulty"),
+                    recipe_id,
+                ),
+            )
+            if "nutrients" in recipe:
+                self._write_nutrients(writer, recipe_id, recipe["nutrients"], replace=True)
         
-        cur.execute(
-            """
-            UPDATE recipes 
-            SET name = ?, time_min = ?, description = ?, 
-                ingredients = ?, instructions = ?, tags = ?
-            WHERE id = ?
-            """,
-            (
-                recipe.get("name"),
-                recipe.get("time_min"),
-                recipe.get("description"),
-                json.dumps(recipe.get("ingredients", []), ensure_ascii=False),
-                json.dumps(recipe.get("instructions", []), ensure_ascii=False),
-                json.dumps(recipe.get("tags", []), ensure_ascii=False),
-                recipe_id,
-            ),
-        )
-        self.conn.commit()
+        run_write(write)
+        self._invalidate_catalogue()
         
         return self.get_by_id(recipe_id)
     
     def delete(self, recipe_id: str) -> bool:
         """Удалить рецепт"""
-        cur = self.conn.cursor()
-        cur.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
-        self.conn.commit()
-        return cur.rowcount > 0
+        deleted = run_write(
+            lambda writer: writer.execute(
+                "DELETE FROM recipes WHERE id = ?", (recipe_id,)
+            ).rowcount
+        )
+        self._invalidate_catalogue()
+        return deleted > 0
     
     def search_by_tags(self, tags: List[str]) -> List[Dict[str, Any]]:
-        """Поиск рецептов по тегам"""
-        cur = self.conn.cursor()
-        rows = cur.execute(
-            "SELECT * FROM recipes WHERE user_id IS NULL"
-        ).fetchall()
+        """Поиск публичных рецептов по тегам (через индекс снимка каталога)"""
+        from ..catalogue.recipes import recipe_catalogue
+        
+        snapshot = recipe_catalogue.get()
+        return [
+            dict(snapshot.entries[pos].recipe)
+            for pos in snapshot.index.tag_positions(tags)
+        ]
+    
+    def get_nutrient_matches(self, nutrients: List[str]) -> Dict[str, List[str]]:
+        """
+        Найти публичные рецепты, содержащие указанные нутриенты
         
-        recipes = [self._row_to_dict(row) for row in rows]
+        Returns:
+            {recipe_id: [совпавшие нутриенты]} - выборка идёт по индексу nutrient
+        """
+        if not nutrients:
+            return {}
         
-        # Фильтруем по тегам
-        result = []
+        placeholders = ", ".join("?" for _ in nutrients)
+        rows = self.conn.execute(
+            f"""
+            SELECT n.recipe_id, n.nutrient
+            FROM recipe_nutrients n
+            JOIN recipes r ON r.id = n.recipe_id
+            WHERE n.nutrient IN ({placeholders}) AND r.user_id IS NULL
+            """,
+            tuple(nutrients),
+        ).fetchall()
+        
+        matches: Dict[str, List[str]] = {}
+        for row in rows:
+            matches.setdefault(row["recipe_id"], []).append(row["nutrient"])
+        return matches
+    
+    def _attach_nutrients(self, recipes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Подгрузить нутриенты из recipe_nutrients (пачками по ID)"""
+        by_id = {recipe["id"]: recipe for recipe in recipes}
         for recipe in recipes:
-            recipe_tags = set(recipe.get("tags", []))
-            if any(tag in recipe_tags for tag in tags):
-                result.append(recipe)
+            recipe["nutrients"] = {}
+        
+        ids = list(by_id)
+        for start in range(0, len(ids), self._ID_CHUNK):
+            chunk = ids[start:start + self._ID_CHUNK]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = self.conn.execute(
+                f"SELECT recipe_id, nutrient, amount FROM recipe_nutrients WHERE recipe_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            for row in rows:
+                by_id[row["recipe_id"]]["nutrients"][row["nutrient"]] = row["amount"]
+        
+        return recipes
+    
+    @staticmethod
+    def _write_nutrients(
+        conn: sqlite3.Connection,
+        recipe_id: str,
+        nutrients: Optional[Dict[str, float]],
+        replace: bool = False,
+    ) -> None:
+        """Записать нутриенты рецепта в нормализованную таблицу"""
+        if replace:
+            conn.execute("DELETE FROM recipe_nutrients WHERE recipe_id = ?", (recipe_id,))
+        if not nutrients:
+            return
+        conn.executemany(
+            "INSERT INTO recipe_nutrients (recipe_id, nutrient, amount) VALUES (?, ?, ?)",
+            [(recipe_id, name, float(amount)) for name, amount in nutrients.items()],
+        )
+    
+    @staticmethod
+    def _invalidate_catalogue() -> None:
+        """Сообщить снимку каталога, что публичные рецепты могли измениться"""
+        from ..catalogue.recipes import recipe_catalogue
         
-        return result
+        recipe_catalogue.invalidate()
     
     def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
         """Конвертировать Row в Dict"""
         recipe = dict(row)
-        recipe["ingredients"] = json.loads(recipe["ingredients"])
-        recipe["instructions"] = json.loads(recipe["instructions"])
-        recipe["tags"] = json.loads(recipe["tags"])
+        recipe["ingredients"] = serialization.loads(recipe["ingredients"])
+        recipe["instructions"] = serialization.loads(recipe["instructions"])
+        recipe["tags"] = serialization.loads(recipe["tags"])
         return recipe
@@ -1,8 +1,10 @@
 """Repository для работы с ресторанами и блюдами"""
-import json
 import sqlite3
 from typing import Any, Dict, List
 
+from .. import serialization
+from ..db import run_write
+
 
 class RestaurantRepository:
     """Репозиторий для работы с ресторанами и блюдами"""
@@ -31,42 +33,57 @@ class RestaurantRepository:
             res_id = dish_row["restaurant_id"]
             if res_id in restaurants:
                 dish = dict(dish_row)
-                dish["nutrients"] = json.loads(dish["nutrients"])
+                dish["nutrients"] = serialization.loads(dish["nutrients"])
                 restaurants[res_id]["dishes"].append(dish)
         
         return list(restaurants.values())
     
     def get_nearby(self, lat: float, lon: float, radius_km: float = 10.0) -> List[Dict[str, Any]]:
-        """Получить рестораны в радиусе (упрощенный вариант)"""
-        # Упрощенная логика - просто возвращаем все рестораны
-        # В production версии можно добавить геопространственный индекс
-        return self.get_all_with_dishes()
+        """
+        Получить рестораны в радиусе с блюдами
+        
+        Поиск идёт по геоиндексу снимка каталога: просматриваются только
+        ячейки сетки вокруг точки. У каждого ресторана есть поле distance_km
+        (точное расстояние по haversine); порядок - как в get_all_with_dishes.
+        """
+        from ..catalogue.restaurants import restaurant_catalogue
+        
+        return restaurant_catalogue.get().get_nearby(lat, lon, radius_km)
     
     def create_restaurant(self, restaurant: Dict[str, Any]) -> str:
         """Создать новый ресторан"""
-        cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO restaurants (id, name, lat, lon) VALUES (?, ?, ?, ?)",
-            (
-                restaurant["id"],
-                restaurant["name"],
-                restaurant["lat"],
-                restaurant["lon"],
-            ),
+        run_write(
+            lambda writer: writer.execute(
+                "INSERT INTO restaurants (id, name, lat, lon) VALUES (?, ?, ?, ?)",
+                (
+                    restaurant["id"],
+                    restaurant["name"],
+                    restaurant["lat"],
+                    restaurant["lon"],
+                ),
+            )
         )
-        self.conn.commit()
+        self._invalidate_catalogue()
         return restaurant["id"]
     
     def create_dish(self, restaurant_id: str, dish: Dict[str, Any]) -> int:
         """Добавить блюдо в ресторан"""
-        cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO dishes (restaurant_id, name, nutrients) VALUES (?, ?, ?)",
-            (
-                restaurant_id,
-                dish["name"],
-                json.dumps(dish.get("nutrients", {}), ensure_ascii=False),
-            ),
+        dish_id = run_write(
+            lambda writer: writer.execute(
+                "INSERT INTO dishes (restaurant_id, name, nutrients) VALUES (?, ?, ?)",
+                (
+                    restaurant_id,
+                    dish["name"],
+                    serialization.dumps(dish.get("nutrients", {})),
+                ),
+            ).lastrowid
         )
-        self.conn.commit()
-        return cur.lastrowid
+        self._invalidate_catalogue()
+        return dish_id
+    
+    @staticmethod
+    def _invalidate_catalogue() -> None:
+        """Сообщить снимку каталога, что рестораны или блюда могли измениться"""
+        from ..catalogue.restaurants import restaurant_catalogue
+        
+        restaurant_catalogue.invalidate()
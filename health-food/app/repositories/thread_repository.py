@@ -0,0 +1,134 @@
+"""Repository для диалогов AI диетолога"""
+import sqlite3
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from .. import serialization
+from ..db import get_write_queue
+
+
+class ThreadRepository:
+    """
+    Репозиторий диалогов и их сообщений
+
+    Записи ставятся в очередь единственного писателя без ожидания коммита:
+    порядок записей сохраняется, а обработчик запроса не блокируется.
+    """
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None):
+        self.conn = conn
+        if self.conn is not None:
+            self.conn.row_factory = sqlite3.Row
+
+    def get(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Диалог с сообщениями после свёрнутых в краткое содержание"""
+        row = self.conn.execute(
+            "SELECT * FROM conversation_threads WHERE id = ?", (thread_id,)
+        ).fetchone()
+        if not row:
+            return None
+
+        thread = dict(row)
+        thread["context"] = serialization.loads(thread["context"] or "{}")
+        thread["messages"] = [
+            dict(message)
+            for message in self.conn.execute(
+                """
+                SELECT seq, role, content, tokens FROM conversation_messages
+                WHERE thread_id = ? AND seq > ?
+                ORDER BY seq
+                """,
+                (thread_id, thread["summarized_seq"]),
+            ).fetchall()
+        ]
+        thread["last_seq"] = self.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM conversation_messages WHERE thread_id = ?",
+            (thread_id,),
+        ).fetchone()[0]
+        return thread
+
+    def create(self, thread_id: str, context: Dict[str, Any], owner: Optional[str]) -> Future:
+        """Создать диалог, owner - вызывающий, которому он принадлежит"""
+        now = time.time()
+        payload = serialization.dumps(context)
+
+        def write(writer: sqlite3.Connection) -> None:
+            writer.execute(
+                """
+                INSERT INTO conversation_threads (id, context, owner, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (thread_id, payload, owner, now, now),
+            )
+
+        return get_write_queue().submit(write)
+
+    def delete_idle(self, before: float) -> Future:
+        """Удалить диалоги без реплик с момента before; результат - их число"""
+        def write(writer: sqlite3.Connection) -> int:
+            writer.execute(
+                """
+                DELETE FROM conversation_messages WHERE thread_id IN (
+                    SELECT id FROM conversation_threads WHERE updated_at < ?
+                )
+                """,
+                (before,),
+            )
+            return writer.execute(
+                "DELETE FROM conversation_threads WHERE updated_at < ?", (before,)
+            ).rowcount
+
+        return get_write_queue().submit(write)
+
+    def save_turn(
+        self,
+        thread_id: str,
+        messages: List[Dict[str, Any]],
+        summary: str,
+        summarized_seq: int,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> Future:
+        """
+        Добавить сообщения и обновить краткое содержание (и контекст)
+
+        Номера сообщений выдаются внутри записи от MAX(seq) в таблице: тот же
+        диалог мог продолжить другой воркер, и его номера в памяти устарели.
+        Результат Future - сдвиг выданных номеров относительно переданных
+        (0, если диалог никто не менял).
+        """
+        now = time.time()
+        payload = serialization.dumps(context) if context is not None else None
+        first_seq = messages[0]["seq"]
+
+        def write(writer: sqlite3.Connection) -> int:
+            stored = writer.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM conversation_messages WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchone()[0]
+            offset = stored + 1 - first_seq
+            # Свёрнутые сейчас новые сообщения сдвигаются вместе с ними
+            stored_summarized = summarized_seq + offset if summarized_seq >= first_seq else summarized_seq
+            writer.executemany(
+                """
+                INSERT INTO conversation_messages
+                (thread_id, seq, role, content, tokens, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (thread_id, m["seq"] + offset, m["role"], m["content"], m["tokens"], now)
+                    for m in messages
+                ],
+            )
+            writer.execute(
+                """
+                UPDATE conversation_threads
+                SET summary = ?, summarized_seq = ?, updated_at = ?,
+                    context = COALESCE(?, context)
+                WHERE id = ?
+                """,
+                (summary, stored_summarized, now, payload, thread_id),
+            )
+            return offset
+
+        return get_write_queue().submit(write)
@@ -1,6 +1,9 @@
-import math
 from typing import Any, Dict, List
+
+import numpy as np
+
 from .db import get_restaurants_with_dishes
+from .geo import haversine_many
 
 RESTAURANTS_DB: List[Dict[str, Any]] = [
     {
@@ -29,27 +32,20 @@ RESTAURANTS_DB: List[Dict[str, Any]] = [
 ]
 
 
-def _haversine(lat1, lon1, lat2, lon2):
-    R = 6371
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dl = math.radians(lon2 - lon1)
-    a = (
-        math.sin(dphi / 2) ** 2
-        + math.cos(phi1) * math.cos(phi2) * math.sin(dl / 2) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
 def score_restaurant_dishes(deficits, location):
     user_lat, user_lon = location["lat"], location["lon"]
     results = []
     markers = set(d["marker"] for d in deficits)
 
     db = get_restaurants_with_dishes()
-    for r in db:
-        dist = _haversine(user_lat, user_lon, r["lat"], r["lon"])  # km
+    # all distances in one batched call, km
+    distances = haversine_many(
+        user_lat,
+        user_lon,
+        np.array([r["lat"] for r in db], dtype=np.float64),
+        np.array([r["lon"] for r in db], dtype=np.float64),
+    ).tolist()
+    for r, dist in zip(db, distances):
         for d in r["dishes"]:
             score = 5
             for m in markers:
@@ -77,6 +77,20 @@ BIOMARKER_RULES: List[Dict[str, Any]] = [
     },
 ]
 
+# Cut-offs of a marked deviation, beyond the BIOMARKER_RULES thresholds:
+# iron deficiency, B12/folate/vitamin D deficiency (vs insufficiency),
+# diabetes-range HbA1c, high LDL and TG, CRP of acute inflammation
+SEVERE_THRESHOLDS: Dict[str, float] = {
+    "ferritin": 15,
+    "b12": 200,
+    "folate": 3,
+    "vitamin_d": 20,
+    "hba1c": 6.5,
+    "ldl": 160,
+    "triglycerides": 200,
+    "crp": 10,
+}
+
 
 def analyze_biomarkers(labs: Dict[str, float]) -> List[Dict[str, Any]]:
     deficits: List[Dict[str, Any]] = []
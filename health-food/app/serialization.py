@@ -0,0 +1,140 @@
+"""JSON encoding for API responses and JSON columns: orjson if installed, stdlib json otherwise."""
+import datetime
+import json
+import logging
+import threading
+import uuid
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+from .config import get_json_backend
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see JSON_BACKEND
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _default(obj: Any) -> Any:
+    """Types both backends encode the same way (orjson handles most natively)."""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    # float32 as its shortest repr, like orjson, not the widened float64 value
+    if isinstance(obj, np.float32):
+        return float(str(obj))
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == np.float32:
+            return obj.astype(str).astype(np.float64).tolist()
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONSerializer:
+    """Stdlib backend. Output is compact UTF-8 without ASCII escaping, like orjson's.
+
+    Both backends decode to the same values; the bytes may differ in float
+    formatting (``1e-06`` vs ``1e-6``). NaN and infinity raise ``ValueError``
+    here, while orjson writes ``null``.
+    """
+
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(
+            ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+        )
+        self._decoder = json.JSONDecoder()
+
+    def dumps(self, obj: Any) -> str:
+        return self._encoder.encode(obj)
+
+    def dumpb(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode("utf-8")
+        return self._decoder.decode(data)
+
+
+class OrjsonSerializer:
+    """orjson backend: encodes straight to UTF-8 bytes, several times faster than stdlib."""
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("JSON_BACKEND=orjson, but orjson is not installed")
+        self._option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj: Any) -> str:
+        return orjson.dumps(obj, default=_default, option=self._option).decode("utf-8")
+
+    def dumpb(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=self._option)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+SERIALIZERS = {"json": JSONSerializer, "orjson": OrjsonSerializer}
+
+_serializer: Optional[Any] = None
+_serializer_lock = threading.Lock()
+
+
+def create_serializer(backend: str) -> Any:
+    if backend == "auto":
+        backend = "orjson" if orjson is not None else "json"
+    return SERIALIZERS[backend]()
+
+
+def get_serializer() -> Any:
+    global _serializer
+    if _serializer is None:
+        with _serializer_lock:
+            if _serializer is None:
+                _serializer = create_serializer(get_json_backend())
+                logger.info(f"JSON backend: {_serializer.name}")
+    return _serializer
+
+
+def set_serializer(backend: str) -> Any:
+    """Switches the process-wide backend ("auto", "orjson" or "json"); returns it."""
+    global _serializer
+    with _serializer_lock:
+        _serializer = create_serializer(backend)
+    return _serializer
+
+
+def dumps(obj: Any) -> str:
+    """Encodes to ``str``, e.g. for a TEXT column."""
+    return get_serializer().dumps(obj)
+
+
+def dumpb(obj: Any) -> bytes:
+    """Encodes to UTF-8 bytes, e.g. for a response body."""
+    return get_serializer().dumpb(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    return get_serializer().loads(data)
+
+
+def get_serializer_stats() -> Dict[str, Any]:
+    return {"backend": get_serializer().name, "orjson_installed": orjson is not None}
+
+
+class JSONResponse(StarletteJSONResponse):
+    """Default response class of the app: renders through the configured backend."""
+
+    def render(self, content: Any) -> bytes:
+        return get_serializer().dumpb(content)
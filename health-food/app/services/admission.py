@@ -0,0 +1,351 @@
+"""Контроль допуска для вызовов LLM: лимиты, очередь, повторы и circuit breaker"""
+import asyncio
+import contextlib
+import logging
+import math
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..config import get_ai_admission_settings, get_ai_circuit_breaker_settings
+from ..llm_provider.errors import LLMProviderError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AdmissionError(RuntimeError):
+    """Вызов отклонён без обращения к провайдеру (HTTP status_code + Retry-After)"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class OverloadedError(AdmissionError):
+    """Очередь операции заполнена или ожидание слота истекло"""
+
+    status_code = 429
+
+
+class CircuitOpenError(AdmissionError):
+    """Провайдер деградировал, вызовы временно не выполняются"""
+
+    status_code = 503
+
+
+class TokenBudgetExceededError(AdmissionError):
+    """Пользователь израсходовал лимит токенов LLM на текущее окно"""
+
+    status_code = 429
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker на провайдера
+
+    После failure_threshold подряд повторяемых ошибок (таймауты, 429, 5xx)
+    размыкается на reset_timeout секунд: вызовы сразу получают
+    CircuitOpenError. Затем пропускает один пробный вызов (half-open):
+    успех замыкает цепь, ошибка - снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        # Метрики
+        self._opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._remaining() <= 0:
+            return self.HALF_OPEN
+        return self._state
+
+    def _remaining(self) -> float:
+        return self._opened_at + self.reset_timeout - time.monotonic()
+
+    def check(self) -> None:
+        """Быстрый отказ до постановки в очередь, если цепь разомкнута"""
+        if self._state == self.OPEN and self._remaining() > 0:
+            self._reject()
+
+    def before_call(self) -> None:
+        """Пропустить вызов к провайдеру или бросить CircuitOpenError"""
+        if self._state == self.CLOSED:
+            return
+        if self._remaining() <= 0 and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return
+        self._reject()
+
+    def _reject(self) -> None:
+        self._rejected += 1
+        raise CircuitOpenError(
+            "AI сервис временно недоступен, повторите позже",
+            retry_after=max(self._remaining(), 1.0),
+        )
+
+    def release(self) -> None:
+        """Пробный вызов завершился без ответа провайдера (например, отменён)"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(
+                    f"LLM провайдер деградировал ({self._failures} ошибок подряд), "
+                    f"вызовы приостановлены на {self.reset_timeout} с"
+                )
+                self._opened += 1
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self._opened,
+            "rejected": self._rejected,
+        }
+
+
+class OperationLimiter:
+    """
+    Лимит одновременных вызовов одной операции с ограниченной очередью
+
+    Не больше max_concurrent вызовов выполняются одновременно, ещё
+    max_queue ждут слот не дольше queue_timeout секунд. Остальные сразу
+    получают OverloadedError с оценкой Retry-After по среднему времени
+    выполнения. Повторы с экспоненциальной задержкой (full jitter)
+    выполняются внутри занятого слота, чтобы не увеличивать нагрузку.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        max_concurrent: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_attempts: int = 3,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 8.0,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_attempts = max(1, retry_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._in_flight = 0
+        self._waiting = 0
+        # Скользящее среднее времени выполнения - для Retry-After
+        self._avg_duration = 0.0
+        # Метрики
+        self._admitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._retries = 0
+        self._failures = 0
+        self._max_waiting = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Выполнить func под лимитом, с повторами и circuit breaker"""
+        self.check()
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            return await self._call_with_retries(func)
+        finally:
+            self._release(started)
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Слот для потокового вызова: без повторов (часть ответа уже могла
+        уйти клиенту), ошибки провайдера учитываются circuit breaker
+        """
+        self.check()
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            self.breaker.before_call()
+            try:
+                yield
+            except LLMProviderError as exc:
+                if exc.retryable:
+                    self.breaker.record_failure()
+                    self._failures += 1
+                else:
+                    self.breaker.record_success()
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+        finally:
+            self._release(started)
+
+    def check(self) -> None:
+        """
+        Отказ без ожидания: цепь разомкнута или очередь заполнена. Позволяет
+        ответить 429/503 до начала потокового ответа
+        """
+        self.breaker.check()
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self._rejected += 1
+            raise OverloadedError(
+                "Слишком много запросов к AI сервису, повторите позже",
+                retry_after=self._estimate_retry_after(),
+            )
+
+    async def _acquire(self) -> None:
+        self._waiting += 1
+        self._max_waiting = max(self._max_waiting, self._waiting)
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise OverloadedError(
+                "AI сервис перегружен: превышено время ожидания в очереди",
+                retry_after=self._estimate_retry_after(),
+            ) from None
+        finally:
+            self._waiting -= 1
+            waited = time.monotonic() - queued_at
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        self._in_flight += 1
+        self._admitted += 1
+
+    def _release(self, started: float) -> None:
+        self._in_flight -= 1
+        self._semaphore.release()
+        duration = time.monotonic() - started
+        self._avg_duration = (
+            duration if not self._avg_duration
+            else 0.8 * self._avg_duration + 0.2 * duration
+        )
+
+    async def _call_with_retries(self, func: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            # Breaker мог разомкнуться, пока вызов ждал в очереди или паузе
+            self.breaker.before_call()
+            try:
+                result = await func()
+            except LLMProviderError as exc:
+                if not exc.retryable:
+                    # Провайдер ответил - он доступен, ошибка в самом запросе
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                attempt += 1
+                if attempt >= self.retry_attempts:
+                    self._failures += 1
+                    raise
+                delay = self._backoff(attempt, exc.retry_after)
+                self._retries += 1
+                logger.info(
+                    f"LLM {self.name}: повтор {attempt}/{self.retry_attempts - 1} "
+                    f"через {delay:.2f} с ({exc})"
+                )
+                await asyncio.sleep(delay)
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Full jitter: случайная задержка от 0 до base * 2^(attempt - 1)"""
+        cap = min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(0, cap)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.retry_max_delay))
+        return delay
+
+    def _estimate_retry_after(self) -> float:
+        # Сколько "волн" по max_concurrent вызовов впереди, по среднему времени
+        waves = (self._waiting + self._in_flight) / self.max_concurrent
+        return max(1.0, waves * (self._avg_duration or 1.0))
+
+    def stats(self) -> Dict[str, Any]:
+        waits = self._admitted + self._timeouts
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": self._waiting,
+            "max_queue_depth": self._max_waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "queue_timeouts": self._timeouts,
+            "retries": self._retries,
+            "failures": self._failures,
+            "avg_wait_ms": round(self._wait_total / waits * 1000, 3) if waits else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 3),
+            "avg_duration_ms": round(self._avg_duration * 1000, 3),
+        }
+
+
+class AdmissionController:
+    """Лимитеры операций AIService с общим circuit breaker провайдера"""
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None):
+        self.breaker = breaker or CircuitBreaker(**get_ai_circuit_breaker_settings())
+        self._limiters: Dict[str, OperationLimiter] = {}
+
+    def limiter(self, operation: str) -> OperationLimiter:
+        limiter = self._limiters.get(operation)
+        if limiter is None:
+            limiter = OperationLimiter(
+                operation, self.breaker, **get_ai_admission_settings(operation)
+            )
+            self._limiters[operation] = limiter
+        return limiter
+
+    async def call(self, operation: str, func: Callable[[], Awaitable[T]]) -> T:
+        return await self.limiter(operation).call(func)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit_breaker": self.breaker.stats(),
+            "operations": {
+                name: limiter.stats() for name, limiter in self._limiters.items()
+            },
+        }
@@ -1,25 +1,113 @@
 """Сервис для работы с AI генерацией рецептов и консультациями"""
+import copy
 import json
-from typing import Any, Dict, List, Optional
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
 from ..llm_provider.base import BaseLLMProvider
+from ..llm_provider.cache import (
+    ResponseCache,
+    canonical_recipe_context,
+    canonical_value,
+    context_key,
+    create_response_cache,
+)
+from ..llm_provider.errors import LLMProviderError
+from ..llm_provider.instrumentation import InstrumentedLLMProvider, LLMSpan, llm_call_context
+from .admission import AdmissionController
+from .singleflight import SingleFlight
+from .thread_store import Thread, ThreadStore
+from .token_budget import TokenBudget
+
+logger = logging.getLogger(__name__)
 
 
 class AIService:
-    """Сервис для AI функционала"""
+    """
+    Сервис для AI функционала
+    
+    Все вызовы провайдера идут через контроль допуска: лимит одновременных
+    вызовов на операцию, ограниченная очередь, повторы и circuit breaker.
+    При перегрузке бросается AdmissionError (429/503 с Retry-After).
+    
+    Сгенерированные рецепты кэшируются по нормализованному контексту
+    (анализы - по клиническим диапазонам), распознанные продукты - по
+    перцептивному хэшу фото; попадание в кэш не занимает слот и не тратит
+    токены. Одинаковые одновременные запросы рецептов и
+    консультаций объединяются в один вызов провайдера (single-flight).
+    
+    Каждый вызов провайдера учитывается (задержка, модель, токены, статус
+    кэша) и списывается с лимита токенов пользователя (caller).
+    """
+    
+    # Версия входит в ключ кэша: сменить при изменении промпта или агента
+    RECIPE_CACHE_NAMESPACE = "recipes:v1"
+    PHOTO_CACHE_NAMESPACE = "photo:v1"
     
-    def __init__(self, llm_provider: Optional[BaseLLMProvider] = None):
+    def __init__(
+        self,
+        llm_provider: Optional[BaseLLMProvider] = None,
+        admission: Optional[AdmissionController] = None,
+        recipe_cache: Optional[ResponseCache] = None,
+        photo_cache: Optional[ResponseCache] = None,
+        threads: Optional[ThreadStore] = None,
+        token_budget: Optional[TokenBudget] = None,
+    ):
+        self.token_budget = token_budget or TokenBudget()
+        if llm_provider is not None and not isinstance(llm_provider, InstrumentedLLMProvider):
+            llm_provider = InstrumentedLLMProvider(llm_provider, on_span=self._on_llm_span)
         self.llm_provider = llm_provider
+        self.admission = admission or AdmissionController()
+        if recipe_cache is None:
+            recipe_cache = create_response_cache(self.RECIPE_CACHE_NAMESPACE)
+        self.recipe_cache = recipe_cache
+        if photo_cache is None:
+            photo_cache = create_response_cache(self.PHOTO_CACHE_NAMESPACE)
+        self.photo_cache = photo_cache
+        self.single_flight = SingleFlight()
+        self.threads = threads or ThreadStore()
     
     def is_available(self) -> bool:
         """Проверяет доступность AI сервиса"""
         return self.llm_provider is not None
     
-    async def analyze_fridge_photo(self, image_data: bytes) -> List[str]:
+    async def aclose(self) -> None:
+        """Закрывает соединения провайдера (при остановке приложения)"""
+        if self.llm_provider:
+            await self.llm_provider.aclose()
+    
+    def _on_llm_span(self, span: LLMSpan) -> None:
+        """Списание токенов завершённого вызова с лимита пользователя"""
+        self.token_budget.charge(span.caller, span.total_tokens)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Метрики контроля допуска (очереди, ожидание, circuit breaker), токены и задержки"""
+        return {
+            "available": self.is_available(),
+            "llm": self.llm_provider.metrics.stats() if self.llm_provider else None,
+            "token_budget": self.token_budget.stats(),
+            **self.admission.stats(),
+            "single_flight": self.single_flight.stats(),
+            "threads": self.threads.stats(),
+            "recipe_cache": self.recipe_cache.stats() if self.recipe_cache else None,
+            "photo_cache": self.photo_cache.stats() if self.photo_cache else None,
+        }
+    
+    async def analyze_fridge_photo(
+        self,
+        image_data: bytes,
+        mime_type: str = "image/jpeg",
+        image_hash: Optional[str] = None,
+        caller: Optional[str] = None,
+    ) -> List[str]:
         """
         Анализирует фото холодильника и определяет продукты
         
         Args:
             image_data: Байты изображения
+            mime_type: Реальный формат изображения
+            image_hash: Перцептивный хэш (dHash) - ключ кэша распознаваний
+            caller: Пользователь для учёта токенов ("user:<id>")
             
         Returns:
             Список обнаруженных продуктов
@@ -36,7 +124,26 @@ class AIService:
             "Если продуктов не видно, верни пустой список."
         )
         
-        detected = await self.llm_provider.analyze_image(image_data, prompt)
+        key = f"{self.PHOTO_CACHE_NAMESPACE}:{image_hash}" if image_hash else None
+        detected = None
+        if key and self.photo_cache:
+            detected = await self.photo_cache.aget(key)
+            if detected is not None:
+                self.llm_provider.record_cache_hit("photo")
+        
+        if detected is None:
+            self.token_budget.check(caller)
+            try:
+                with llm_call_context(caller, "miss" if key and self.photo_cache else "bypass"):
+                    detected = await self.admission.call(
+                        "photo",
+                        lambda: self.llm_provider.analyze_image(image_data, prompt, mime_type),
+                    )
+            except LLMProviderError as e:
+                logger.warning(f"Не удалось распознать продукты на фото: {e}")
+                detected = []
+            if detected and key and self.photo_cache:
+                self.photo_cache.set(key, detected)
         
         # Фоллбэк на демо данные если не удалось определить
         if not detected:
@@ -50,12 +157,14 @@ class AIService:
     async def generate_personalized_recipes(
         self,
         user_context: Dict[str, Any],
+        caller: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
         """
         Генерирует персонализированные рецепты на основе контекста пользователя
         
         Args:
             user_context: Контекст с анализами, предпочтениями, доступными продуктами
+            caller: Пользователь для учёта токенов ("user:<id>")
             
         Returns:
             Список сгенерированных рецептов
@@ -63,7 +172,35 @@ class AIService:
         if not self.llm_provider:
             raise ValueError("AI сервис недоступен. Проверьте наличие OpenAI API ключа.")
         
-        recipes = await self.llm_provider.generate_recipes(user_context)
+        key = context_key(
+            self.RECIPE_CACHE_NAMESPACE, canonical_recipe_context(user_context)
+        )
+        if self.recipe_cache:
+            cached = await self.recipe_cache.aget(key)
+            if cached is not None:
+                self.llm_provider.record_cache_hit("recipes")
+                return self._with_fresh_ids(cached)
+        
+        self.token_budget.check(caller)
+        # Результат общий для всех объединённых вызовов - id ставятся на копии;
+        # токены списываются с пользователя, чей вызов дошёл до провайдера
+        with llm_call_context(caller, "miss" if self.recipe_cache else "bypass"):
+            recipes = await self.single_flight.do(
+                key, lambda: self._generate_recipes(key, user_context)
+            )
+        return self._with_fresh_ids(copy.deepcopy(recipes))
+    
+    async def _generate_recipes(
+        self, key: str, user_context: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Вызов провайдера, валидация и запись в кэш"""
+        try:
+            recipes = await self.admission.call(
+                "recipes", lambda: self.llm_provider.generate_recipes(user_context)
+            )
+        except LLMProviderError as e:
+            logger.warning(f"Не удалось сгенерировать рецепты: {e}")
+            recipes = []
         
         # Валидируем и обогащаем рецепты
         validated_recipes = []
@@ -71,6 +208,9 @@ class AIService:
             if self._validate_recipe(recipe):
                 validated_recipes.append(recipe)
         
+        if validated_recipes and self.recipe_cache:
+            self.recipe_cache.set(key, validated_recipes)
+        
         return validated_recipes
     
     async def get_nutrition_consultation(
@@ -78,14 +218,17 @@ class AIService:
         user_message: str,
         user_context: Dict[str, Any],
         thread_id: Optional[str] = None,
+        caller: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Получает консультацию по питанию от AI диетолога
         
         Args:
             user_message: Вопрос пользователя
-            user_context: Контекст (анализы, дефициты и т.д.)
-            thread_id: ID диалога для продолжения беседы
+            user_context: Контекст (анализы, дефициты и т.д.), для
+                продолжения диалога можно не передавать - берётся сохранённый
+            thread_id: ID диалога для продолжения беседы (только своего)
+            caller: Пользователь для учёта токенов и владелец диалога
             
         Returns:
             Ответ с рекомендацией и thread_id
@@ -93,11 +236,107 @@ class AIService:
         if not self.llm_provider:
             raise ValueError("AI сервис недоступен. Проверьте наличие OpenAI API ключа.")
         
-        return await self.llm_provider.get_vitamin_recommendations(
-            user_message=user_message,
-            thread_id=thread_id,
-            user_context=user_context,
+        thread = await self.threads.get(thread_id, caller)
+        key = context_key(
+            "consultation",
+            canonical_value(
+                {
+                    "message": user_message,
+                    "thread_id": thread.id if thread else None,
+                    "context": user_context,
+                }
+            ),
+        )
+        self.token_budget.check(caller)
+        with llm_call_context(caller):
+            result = await self.single_flight.do(
+                key, lambda: self._consult(user_message, user_context, thread)
+            )
+        
+        # Новый диалог у каждого пользователя свой, даже при общем ответе
+        if thread is None:
+            thread = self.threads.create(user_context, caller)
+            await self.threads.append(thread, user_message, result["reply"])
+        return {**result, "thread_id": thread.id}
+    
+    async def _consult(
+        self,
+        user_message: str,
+        user_context: Dict[str, Any],
+        thread: Optional[Thread],
+    ) -> Dict[str, Any]:
+        """Вызов провайдера с историей диалога; реплика добавляется в диалог"""
+        context = user_context or (thread.context if thread else {})
+        result = await self.admission.call(
+            "consultation",
+            lambda: self.llm_provider.get_vitamin_recommendations(
+                user_message=user_message,
+                thread_id=thread.id if thread else None,
+                user_context=context,
+                history=thread.history() if thread else None,
+            ),
         )
+        if thread is not None:
+            await self.threads.append(thread, user_message, result["reply"], user_context)
+        return result
+    
+    async def open_thread(
+        self,
+        thread_id: Optional[str],
+        user_context: Dict[str, Any],
+        caller: Optional[str] = None,
+    ) -> Thread:
+        """Продолжить диалог вызывающего или начать новый"""
+        return await self.threads.open(thread_id, user_context, caller)
+    
+    def check_admission(self, operation: str, caller: Optional[str] = None) -> None:
+        """Бросает AdmissionError, если операция сейчас не будет принята"""
+        self.token_budget.check(caller)
+        self.admission.limiter(operation).check()
+    
+    async def stream_nutrition_consultation(
+        self,
+        user_message: str,
+        thread: Thread,
+        user_context: Optional[Dict[str, Any]] = None,
+        caller: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Консультация по питанию потоком: части текста по мере генерации
+        
+        Слот операции "consultation" занят, пока поток не закрыт. Повторов
+        нет - часть ответа уже могла уйти клиенту. Реплика добавляется в
+        диалог, только если ответ получен полностью.
+        """
+        if not self.llm_provider:
+            raise ValueError("AI сервис недоступен. Проверьте наличие OpenAI API ключа.")
+        
+        parts = []
+        async with self.admission.limiter("consultation").slot():
+            with llm_call_context(caller):
+                stream = self.llm_provider.stream_vitamin_recommendations(
+                    user_message=user_message,
+                    thread_id=thread.id,
+                    user_context=user_context or thread.context,
+                    history=thread.history(),
+                )
+            try:
+                async for chunk in stream:
+                    parts.append(chunk)
+                    yield chunk
+            finally:
+                await stream.aclose()
+        await self.threads.append(thread, user_message, "".join(parts), user_context)
+    
+    def _with_fresh_ids(self, recipes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Новые id для каждого ответа: рецепты сохраняются в БД по id, а один
+        и тот же ответ (из кэша или с повторяющимися id от модели) может
+        достаться нескольким пользователям
+        """
+        for recipe in recipes:
+            recipe["id"] = f"ai_{uuid.uuid4().hex[:12]}"
+        return recipes
     
     def _validate_recipe(self, recipe: Dict[str, Any]) -> bool:
         """
@@ -0,0 +1,240 @@
+"""Конвейеры режимов /api/generate: diy, restaurants, photo, ai_recipe"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import UploadFile
+
+from ..catalogue.recipes import recipe_catalogue
+from ..catalogue.restaurants import restaurant_catalogue
+from ..db import connection, run_db, run_with_conn, save_user_recipe
+from ..images import PreparedImage, preprocess_upload
+from ..pipeline import Pipeline, Stage
+from ..repositories.biomarker_repository import BiomarkerRepository
+from ..repositories.recipe_repository import RecipeRepository
+from ..repositories.restaurant_repository import RestaurantRepository
+from .ai_service import AIService
+from .biomarker_service import BiomarkerService
+from .recipe_service import RecipeService
+from .restaurant_service import RestaurantService
+
+logger = logging.getLogger(__name__)
+
+
+class GenerateContext:
+    """Входные данные запроса генерации"""
+
+    __slots__ = (
+        "mode", "user_id", "labs", "preferences", "lat", "lon",
+        "photo", "difficulty", "ai_service",
+    )
+
+    def __init__(
+        self,
+        mode: str,
+        user_id: int,
+        labs: Dict[str, Any],
+        preferences: Dict[str, Any],
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+        photo: Optional[UploadFile] = None,
+        difficulty: Optional[str] = None,
+        ai_service: Optional[AIService] = None,
+    ):
+        self.mode = mode
+        self.user_id = user_id
+        self.labs = labs
+        self.preferences = preferences
+        self.lat = lat
+        self.lon = lon
+        self.photo = photo
+        self.difficulty = difficulty
+        self.ai_service = ai_service
+
+    @property
+    def caller(self) -> str:
+        return f"user:{self.user_id}"
+
+
+# Общие стадии. Блокирующие стадии выполняются в пуле потоков БД (run_db) и
+# берут собственное соединение из пула: соединение не делится между потоками
+
+
+def analyze_labs(ctx: GenerateContext) -> List[Dict[str, Any]]:
+    logger.info(f"Анализ биомаркеров для пользователя {ctx.user_id}")
+    with connection() as conn:
+        return BiomarkerService(BiomarkerRepository(conn)).analyze_labs(ctx.labs)
+
+
+def vitamin_recommendations(ctx: GenerateContext, labs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Чистые правила без БД - репозиторий не нужен
+    return BiomarkerService(None).generate_vitamin_recommendations(ctx.labs, labs)
+
+
+def load_recipe_catalogue(ctx: GenerateContext) -> None:
+    # Прогрев снимка (сверка версии / перестройка) параллельно с анализом
+    recipe_catalogue.get()
+
+
+def load_restaurant_catalogue(ctx: GenerateContext) -> None:
+    restaurant_catalogue.get()
+
+
+def _recipe_plan(
+    deficits: List[Dict[str, Any]],
+    preferences: Dict[str, Any],
+    available: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    with connection() as conn:
+        recipe_service = RecipeService(RecipeRepository(conn))
+        chosen = recipe_service.select_recipes_for_plan(
+            deficits, preferences, available_ingredients=available
+        )
+        return {
+            "plan": chosen,
+            "shopping_list": recipe_service.build_shopping_list(chosen, available),
+        }
+
+
+def _base_stages() -> List[Stage]:
+    return [
+        Stage("labs", analyze_labs, blocking=True),
+        Stage("vitamins", vitamin_recommendations, deps=("labs",)),
+    ]
+
+
+# diy: анализ и прогрев каталога рецептов параллельно, затем подбор
+
+
+def diy_plan(ctx: GenerateContext, labs: List[Dict[str, Any]], catalogue: Any) -> Dict[str, Any]:
+    logger.info("Режим DIY: подбор рецептов")
+    return _recipe_plan(labs, ctx.preferences)
+
+
+DIY_PIPELINE = Pipeline(
+    "diy",
+    _base_stages()
+    + [
+        Stage("catalogue", load_recipe_catalogue, blocking=True),
+        Stage("plan", diy_plan, deps=("labs", "catalogue"), blocking=True),
+    ],
+    run_blocking=run_db,
+)
+
+
+# restaurants: анализ и прогрев каталога ресторанов параллельно, затем поиск
+
+
+def nearby_dishes(ctx: GenerateContext, labs: List[Dict[str, Any]], catalogue: Any) -> Dict[str, Any]:
+    logger.info(f"Режим Restaurants: поиск вблизи ({ctx.lat}, {ctx.lon})")
+    with connection() as conn:
+        restaurant_service = RestaurantService(RestaurantRepository(conn))
+        scored = restaurant_service.find_best_dishes(
+            labs, {"lat": ctx.lat, "lon": ctx.lon}, limit=20
+        )
+    return {"restaurants": scored}
+
+
+RESTAURANTS_PIPELINE = Pipeline(
+    "restaurants",
+    _base_stages()
+    + [
+        Stage("catalogue", load_restaurant_catalogue, blocking=True),
+        Stage("dishes", nearby_dishes, deps=("labs", "catalogue"), blocking=True),
+    ],
+    run_blocking=run_db,
+)
+
+
+# photo: подготовка фото и вызов vision-модели идут параллельно с анализом
+# и прогревом каталога; подбор ждёт всех
+
+
+async def prepare_photo(ctx: GenerateContext) -> PreparedImage:
+    logger.info("Режим Photo: анализ холодильника")
+    image = await preprocess_upload(ctx.photo)
+    logger.info(f"Фото подготовлено: {image.stats()}")
+    return image
+
+
+async def detect_products(ctx: GenerateContext, image: PreparedImage) -> List[str]:
+    detected = await ctx.ai_service.analyze_fridge_photo(
+        image.data,
+        mime_type=image.mime_type,
+        image_hash=image.dhash,
+        caller=ctx.caller,
+    )
+    logger.info(f"Обнаружено продуктов: {len(detected)}")
+    return detected
+
+
+def photo_plan(
+    ctx: GenerateContext,
+    labs: List[Dict[str, Any]],
+    vision: List[str],
+    catalogue: Any,
+) -> Dict[str, Any]:
+    preferences = {**ctx.preferences, "available": vision}
+    return {"detected": vision, **_recipe_plan(labs, preferences, vision)}
+
+
+PHOTO_PIPELINE = Pipeline(
+    "photo",
+    _base_stages()
+    + [
+        Stage("image", prepare_photo),
+        Stage("vision", detect_products, deps=("image",)),
+        Stage("catalogue", load_recipe_catalogue, blocking=True),
+        Stage("plan", photo_plan, deps=("labs", "vision", "catalogue"), blocking=True),
+    ],
+    run_blocking=run_db,
+)
+
+
+# ai_recipe: генерация не зависит от анализа (модель получает сами
+# анализы), поэтому идёт параллельно с ним; затем сохранение
+
+
+async def generate_recipes(ctx: GenerateContext) -> List[Dict[str, Any]]:
+    logger.info("Режим AI Recipe: генерация персонализированных рецептов")
+    user_context = {
+        "labs": ctx.labs,
+        "preferences": ctx.preferences,
+        "difficulty": ctx.difficulty or "легкий",
+    }
+    return await ctx.ai_service.generate_personalized_recipes(user_context, caller=ctx.caller)
+
+
+async def save_recipes(ctx: GenerateContext, generate: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Все рецепты уходят писателю сразу и фиксируются одним групповым
+    # коммитом; поток пула на ожидание коммита не занимается
+    saved = await asyncio.gather(
+        *(save_user_recipe(ctx.user_id, recipe) for recipe in generate)
+    )
+    recipe_ids = [recipe["id"] for recipe in saved]
+    
+    def load(conn) -> List[Dict[str, Any]]:
+        recipe_repo = RecipeRepository(conn)
+        return [recipe_repo.get_by_id(recipe_id) for recipe_id in recipe_ids]
+    
+    return {"recipes": await run_with_conn(load)}
+
+
+AI_RECIPE_PIPELINE = Pipeline(
+    "ai_recipe",
+    _base_stages()
+    + [
+        Stage("generate", generate_recipes),
+        Stage("save", save_recipes, deps=("generate",)),
+    ],
+    run_blocking=run_db,
+)
+
+
+# Режим -> (конвейер, стадия с полями ответа режима)
+GENERATE_PIPELINES = {
+    "diy": (DIY_PIPELINE, "plan"),
+    "restaurants": (RESTAURANTS_PIPELINE, "dishes"),
+    "photo": (PHOTO_PIPELINE, "plan"),
+    "ai_recipe": (AI_RECIPE_PIPELINE, "save"),
+}
@@ -1,6 +1,18 @@
 """Сервис для работы с рецептами и планированием питания"""
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..catalogue.index import RankedSearch
+from ..catalogue.matrix import RecipeMatrix, iter_ranked, tolerance_for
+from ..catalogue.recipes import (
+    CatalogueEntry,
+    CatalogueSnapshot,
+    RecipeCatalogue,
+    recipe_catalogue,
+)
+from ..config import get_scoring_engine
 from ..repositories.recipe_repository import RecipeRepository
 
 
@@ -8,13 +20,26 @@ class RecipeService:
     """Сервис для работы с рецептами"""
     
     # Базовые продукты, которые обычно есть на кухне
-    COMMON_PANTRY = {
+    COMMON_PANTRY = frozenset({
         "оливковое масло", "растительное масло", "соль", "перец",
         "вода", "чеснок", "лук репчатый", "лук", "специи", "корица"
-    }
+    })
     
-    def __init__(self, repository: RecipeRepository):
+    # Разрешённое число недостающих ингредиентов в режиме "из того, что есть"
+    MAX_MISSING_INGREDIENTS = 2
+    
+    def __init__(
+        self,
+        repository: RecipeRepository,
+        catalogue: Optional[RecipeCatalogue] = None,
+        engine: Optional[str] = None,
+    ):
         self.repository = repository
+        self.catalogue = catalogue or recipe_catalogue
+        # "python" - инвертированные индексы, "numpy" - матрица признаков;
+        # по умолчанию ("auto") индексы: на большом каталоге они быстрее
+        engine = engine or get_scoring_engine()
+        self.engine = "python" if engine == "auto" else engine
     
     def select_recipes_for_plan(
         self,
@@ -36,28 +61,26 @@ class RecipeService:
             Список отобранных рецептов
         """
         preferences = preferences or {}
-        available_set = set((available_ingredients or []))
+        available_lower = {ing.lower() for ing in (available_ingredients or [])}
         
-        # Получаем все публичные рецепты
-        all_recipes = self.repository.get_all_public()
+        # Снимок каталога из памяти: без запросов к БД и разбора JSON
+        snapshot = self.catalogue.get()
         
-        # Фильтруем по доступным ингредиентам, если указаны
-        if available_ingredients:
-            filtered_recipes = self._filter_by_available_ingredients(
-                all_recipes, available_set
+        filter_available = bool(available_ingredients)
+        exclude_tag = None
+        if self.engine == "numpy":
+            scored = self._rank_with_matrix(
+                snapshot, deficits, available_lower, filter_available, days
             )
         else:
-            filtered_recipes = all_recipes
-        
-        # Скорируем рецепты
-        scored = [
-            (recipe, self._score_recipe(recipe, deficits, available_set))
-            for recipe in filtered_recipes
-        ]
-        scored.sort(key=lambda x: x[1], reverse=True)
+            search = self._rank_with_index(
+                snapshot, deficits, available_lower, filter_available
+            )
+            scored = ((snapshot.entries[pos], score) for pos, score in search)
+            exclude_tag = search.exclude_tag
         
         # Выбираем топ рецепты с разнообразием
-        selected = self._select_diverse_recipes(scored, days)
+        selected = self._select_diverse_recipes(scored, days, exclude_tag)
         
         # Обогащаем информацией о соответствии дефицитам
         for recipe in selected:
@@ -65,91 +88,199 @@ class RecipeService:
         
         return selected
     
-    def _filter_by_available_ingredients(
-        self, recipes: List[Dict[str, Any]], available: Set[str]
-    ) -> List[Dict[str, Any]]:
-        """Фильтрует рецепты по доступным ингредиентам"""
-        available_lower = {ing.lower() for ing in available}
-        filtered = []
-        
-        for recipe in recipes:
-            required = {
-                ing["name"].lower() 
-                for ing in recipe.get("ingredients", [])
-            }
-            missing = required - available_lower - self.COMMON_PANTRY
-            
-            # Разрешаем до 2 недостающих ингредиентов
-            if len(missing) <= 2:
-                filtered.append(recipe)
-        
-        return filtered
-    
-    def _score_recipe(
-        self, 
-        recipe: Dict[str, Any], 
-        deficits: List[Dict[str, Any]], 
-        available: Set[str]
-    ) -> float:
+    def _rank_with_index(
+        self,
+        snapshot: CatalogueSnapshot,
+        deficits: List[Dict[str, Any]],
+        available_lower: Set[str],
+        filter_available: bool,
+    ) -> RankedSearch:
         """
-        Вычисляет скор рецепта на основе соответствия дефицитам
+        Эталонный путь: рецепты по убыванию скора через инвертированные индексы
+        
+        Возвращает позиции рецептов в снимке со скорами. Перебирается только
+        окрестность топа, см. RankedSearch.
         """
-        score = 0.0
-        tags = set(recipe.get("tags", []))
+        index = snapshot.index
         
-        # Основной скор: совпадение с дефицитами
+        # Слагаемые скора в порядке сложения
+        terms = []
         for deficit in deficits:
-            marker = deficit["marker"]
             severity = deficit.get("severity", 0.5)
             
             # Прямое совпадение тега
-            if marker in tags:
-                score += 3.0 * (1 + severity)
+            terms.append((("tag", deficit["marker"]), 3.0 * (1 + severity)))
             
             # Совпадение по нутриентам
-            nutrients = recipe.get("nutrients", {})
             for target in deficit.get("targets", {}).keys():
-                if target in nutrients:
-                    score += 1.0 * (1 + severity * 0.5)
-        
-        # Бонус за доступные ингредиенты
-        if available:
-            available_lower = {ing.lower() for ing in available}
-            required = {ing["name"].lower() for ing in recipe.get("ingredients", [])}
-            overlap = len(required & available_lower)
-            score += overlap * 0.3
-        
-        # Бонус за простоту (меньше времени приготовления)
-        time = recipe.get("time_min", 30)
-        if time <= 15:
-            score += 0.5
-        elif time <= 30:
-            score += 0.2
+                terms.append((("nutrient", target), 1.0 * (1 + severity * 0.5)))
         
-        # Бонус за низкую сложность
-        difficulty = recipe.get("difficulty", 2)
-        score += (3 - difficulty) * 0.2
+        # Бонусы за время и сложность принимают несколько значений:
+        # рецепты с одинаковыми бонусами образуют класс
+        classes = index.classes("recipe_service", self._base_parts)
         
-        return score
+        def combine(value: float, parts: Tuple[float, float]) -> float:
+            time_bonus, difficulty_bonus = parts
+            return value + time_bonus + difficulty_bonus
+        
+        # Бонус за доступные ингредиенты - 0.3 за каждый; фильтруем по ним,
+        # если указаны
+        return index.search(
+            terms, classes, combine, available_lower, overlap_weight=0.3,
+            pantry=self.COMMON_PANTRY if filter_available else None,
+            max_missing=self.MAX_MISSING_INGREDIENTS,
+        )
+    
+    def _rank_with_matrix(
+        self,
+        snapshot: CatalogueSnapshot,
+        deficits: List[Dict[str, Any]],
+        available_lower: Set[str],
+        filter_available: bool,
+        days: int,
+    ) -> Iterator[Tuple[CatalogueEntry, float]]:
+        """
+        Векторизованный путь: один matmul по всему каталогу и argpartition
+        
+        Порядок и скоры совпадают с эталонным путём: кандидаты у порога
+        топ-k пересчитываются точной формулой (_exact_scores).
+        """
+        entries = snapshot.entries
+        matrix = snapshot.matrix
+        
+        weights = matrix.features.weights()
+        for deficit in deficits:
+            severity = deficit.get("severity", 0.5)
+            matrix.add_tag_weight(weights, deficit["marker"], 3.0 * (1 + severity))
+            for target in deficit.get("targets", {}).keys():
+                matrix.add_nutrient_weight(weights, target, 1.0 * (1 + severity * 0.5))
+        
+        static = matrix.static_scores("recipe_service", self._base_score)
+        approx = matrix.features.scores(weights) + static
+        available_counts = None
+        if available_lower:
+            available_counts = matrix.ingredient_counts(available_lower)
+            approx += available_counts * 0.3
+        
+        allowed = None
+        if filter_available:
+            allowed = matrix.missing_mask(
+                available_lower, self.COMMON_PANTRY, self.MAX_MISSING_INGREDIENTS
+            )
+        
+        tolerance = tolerance_for(
+            float(np.abs(weights).sum()),
+            len(available_lower) * 0.3,
+            float(np.abs(static).max(initial=0.0)),
+        )
+        def exact(positions: np.ndarray) -> np.ndarray:
+            return self._exact_scores(
+                matrix, positions, deficits, available_lower, available_counts
+            )
+        
+        ranked = iter_ranked(
+            approx,
+            exact,
+            allowed,
+            # С запасом: часть рецептов отсеивается ради разнообразия тегов
+            k=max(days, 1) * 2,
+            tolerance=tolerance,
+        )
+        for pos, score in ranked:
+            yield entries[pos], score
+    
+    def _exact_scores(
+        self,
+        matrix: RecipeMatrix,
+        positions: np.ndarray,
+        deficits: List[Dict[str, Any]],
+        available_lower: Set[str],
+        available_counts: Optional[np.ndarray],
+    ) -> np.ndarray:
+        """
+        Скоры рецептов по той же формуле и в том же порядке сложения, что и
+        эталонный путь, поэтому совпадают с ним побитово
+        """
+        scores = np.zeros(len(positions), dtype=np.float64)
+        for deficit in deficits:
+            severity = deficit.get("severity", 0.5)
+            column = matrix.tag_column(deficit["marker"], positions)
+            if column is not None:
+                scores += column * (3.0 * (1 + severity))
+            for target in deficit.get("targets", {}).keys():
+                column = matrix.nutrient_column(target, positions)
+                if column is not None:
+                    scores += column * (1.0 * (1 + severity * 0.5))
+        
+        if available_lower:
+            scores += available_counts[positions] * 0.3
+        
+        time_bonus = matrix.static_scores("recipe_service.time", self._entry_time_bonus)
+        difficulty_bonus = matrix.static_scores(
+            "recipe_service.difficulty", self._entry_difficulty_bonus
+        )
+        return scores + time_bonus[positions] + difficulty_bonus[positions]
+    
+    @classmethod
+    def _entry_time_bonus(cls, entry: CatalogueEntry) -> float:
+        return cls._time_bonus(entry.recipe)
+    
+    @classmethod
+    def _entry_difficulty_bonus(cls, entry: CatalogueEntry) -> float:
+        return cls._difficulty_bonus(entry.recipe)
+    
+    @classmethod
+    def _base_score(cls, entry: CatalogueEntry) -> float:
+        """Скор рецепта без совпадений с запросом"""
+        return cls._time_bonus(entry.recipe) + cls._difficulty_bonus(entry.recipe)
+    
+    @classmethod
+    def _base_parts(cls, entry: CatalogueEntry) -> Tuple[float, float]:
+        return cls._time_bonus(entry.recipe), cls._difficulty_bonus(entry.recipe)
+    
+    @staticmethod
+    def _time_bonus(recipe: Dict[str, Any]) -> float:
+        """Бонус за простоту (меньше времени приготовления)"""
+        time = recipe.get("time_min")
+        if time is None:
+            time = 30
+        if time <= 15:
+            return 0.5
+        if time <= 30:
+            return 0.2
+        return 0.0
+    
+    @staticmethod
+    def _difficulty_bonus(recipe: Dict[str, Any]) -> float:
+        """Бонус за низкую сложность"""
+        difficulty = recipe.get("difficulty")
+        if difficulty is None:
+            difficulty = 2
+        return (3 - difficulty) * 0.2
     
     def _select_diverse_recipes(
         self, 
-        scored_recipes: List[tuple], 
-        count: int
+        scored_recipes: Iterable[Tuple[CatalogueEntry, float]], 
+        count: int,
+        exclude_tag: Optional[Callable[[str], None]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Выбирает разнообразные рецепты (избегает повторений)
+        
+        exclude_tag(тег) сообщает ранжированию об исчерпанном теге: такие
+        рецепты всё равно пропускаются, и их можно не отдавать вовсе.
         """
         selected = []
         used_ids = set()
         used_tags = defaultdict(int)
         
-        for recipe, score in scored_recipes:
+        for entry, score in scored_recipes:
+            recipe = entry.recipe
             if recipe["id"] in used_ids:
                 continue
             
             # Проверяем разнообразие по тегам
-            recipe_tags = set(recipe.get("tags", []))
+            recipe_tags = entry.tags
             
             # Не берем больше 2 рецептов с одинаковым основным тегом
             skip = False
@@ -161,11 +292,14 @@ class RecipeService:
             if skip:
                 continue
             
-            selected.append(recipe)
+            # Копия: рецепт в снимке каталога общий для всех запросов
+            selected.append(dict(recipe))
             used_ids.add(recipe["id"])
             
             for tag in recipe_tags:
                 used_tags[tag] += 1
+                if used_tags[tag] == 2 and exclude_tag is not None:
+                    exclude_tag(tag)
             
             if len(selected) >= count:
                 break
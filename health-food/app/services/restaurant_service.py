@@ -1,14 +1,42 @@
 """Сервис для работы с ресторанами и рекомендациями блюд"""
-import math
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..catalogue.matrix import select_top, tolerance_for
+from ..catalogue.restaurants import (
+    RestaurantCatalogue,
+    RestaurantSnapshot,
+    restaurant_catalogue,
+)
+from ..config import get_scoring_engine
 from ..repositories.restaurant_repository import RestaurantRepository
 
 
 class RestaurantService:
     """Сервис для работы с ресторанами"""
     
-    def __init__(self, repository: RestaurantRepository):
+    # Общие полезные нутриенты
+    VALUABLE_NUTRIENTS = frozenset({
+        "fiber", "protein", "omega3", "vitamin_d",
+        "iron", "b12", "vitamin_c"
+    })
+    
+    # Скор отдаётся округлённым до 0.01 - сортировка идёт по нему
+    SCORE_QUANTUM = 0.01
+    
+    def __init__(
+        self,
+        repository: RestaurantRepository,
+        engine: Optional[str] = None,
+        catalogue: Optional[RestaurantCatalogue] = None,
+    ):
         self.repository = repository
+        self.catalogue = catalogue or restaurant_catalogue
+        # "numpy" - векторизованный скоринг, "python" - эталон для сверки;
+        # по умолчанию ("auto") numpy
+        engine = engine or get_scoring_engine()
+        self.engine = "numpy" if engine == "auto" else engine
     
     def find_best_dishes(
         self,
@@ -32,21 +60,20 @@ class RestaurantService:
         user_lat = user_location["lat"]
         user_lon = user_location["lon"]
         
-        restaurants = self.repository.get_all_with_dishes()
+        if self.engine == "numpy":
+            return self._find_best_dishes_numpy(
+                self.catalogue.get(), deficits, user_lat, user_lon, max_distance_km, limit
+            )
+        
+        # Только рестораны в радиусе - через геоиндекс
+        restaurants = self.repository.get_nearby(user_lat, user_lon, max_distance_km)
         markers = {d["marker"] for d in deficits}
         
         # Скорируем все блюда
         scored_dishes = []
         
         for restaurant in restaurants:
-            distance = self._calculate_distance(
-                user_lat, user_lon,
-                restaurant["lat"], restaurant["lon"]
-            )
-            
-            # Пропускаем слишком далекие рестораны
-            if distance > max_distance_km:
-                continue
+            distance = restaurant["distance_km"]
             
             for dish in restaurant.get("dishes", []):
                 score = self._score_dish(
@@ -56,47 +83,101 @@ class RestaurantService:
                     distance
                 )
                 
-                scored_dishes.append({
-                    "restaurant": restaurant["name"],
-                    "restaurant_lat": restaurant["lat"],
-                    "restaurant_lon": restaurant["lon"],
-                    "dish": dish["name"],
-                    "nutrients": dish.get("nutrients", {}),
-                    "distance_km": round(distance, 2),
-                    "score": round(score, 2),
-                    "match_reason": self._explain_dish_match(dish, deficits),
-                })
+                scored_dishes.append(
+                    self._dish_result(restaurant, dish, distance, score, deficits)
+                )
         
         # Сортируем по скору
         scored_dishes.sort(key=lambda x: x["score"], reverse=True)
         
         return scored_dishes[:limit]
     
-    def _calculate_distance(
-        self, 
-        lat1: float, lon1: float, 
-        lat2: float, lon2: float
-    ) -> float:
+    def _find_best_dishes_numpy(
+        self,
+        snapshot: RestaurantSnapshot,
+        deficits: List[Dict[str, Any]],
+        user_lat: float,
+        user_lon: float,
+        max_distance_km: float,
+        limit: int,
+    ) -> List[Dict[str, Any]]:
         """
-        Вычисляет расстояние между двумя точками по формуле Haversine
+        Векторизованный скоринг: матрица нутриентов блюд на вектор весов
         
-        Returns:
-            Расстояние в километрах
+        Результат совпадает с эталонным путём: кандидаты у порога топ-k
+        (с запасом на округление скора) пересчитываются через _score_dish.
         """
-        R = 6371  # Радиус Земли в км
-        
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
+        # Расстояния до всех ресторанов в радиусе - одним векторным вызовом
+        restaurant_positions, distances = snapshot.nearby(
+            user_lat, user_lon, max_distance_km
+        )
+        dish_positions, owners = snapshot.dish_positions(restaurant_positions)
+        if not dish_positions.size:
+            return []
         
-        a = (
-            math.sin(dphi / 2) ** 2 +
-            math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+        matrix = snapshot.dish_matrix
+        weights = matrix.weights()
+        for deficit in deficits:
+            severity = deficit.get("severity", 0.5)
+            matrix.add_weight(weights, deficit["marker"], 2.0 * (1 + severity))
+            for target in deficit.get("targets", {}).keys():
+                matrix.add_weight(weights, target, 1.0 * (1 + severity * 0.5))
+        for nutrient in self.VALUABLE_NUTRIENTS:
+            matrix.add_weight(weights, nutrient, 0.3)
+        
+        dish_distances = distances[owners]
+        approx = np.maximum(
+            5.0
+            + matrix.scores(weights, dish_positions)
+            - np.minimum(dish_distances, 10) * 0.1,
+            0,
         )
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
         
-        return R * c
+        markers = {d["marker"] for d in deficits}
+        
+        def item(i: int) -> Tuple[Dict[str, Any], Dict[str, Any], float]:
+            restaurant_pos, dish = snapshot.dishes[dish_positions[i]]
+            return snapshot.restaurants[restaurant_pos], dish, float(dish_distances[i])
+        
+        def exact(indices: np.ndarray) -> List[float]:
+            scores = []
+            for i in indices.tolist():
+                _, dish, distance = item(i)
+                scores.append(round(self._score_dish(dish, deficits, markers, distance), 2))
+            return scores
+        
+        top = select_top(
+            approx,
+            exact,
+            limit,
+            margin=self.SCORE_QUANTUM,
+            tolerance=tolerance_for(5.0, float(np.abs(weights).sum()), 1.0),
+        )
+        results = []
+        for i in top:
+            restaurant, dish, distance = item(i)
+            score = self._score_dish(dish, deficits, markers, distance)
+            results.append(self._dish_result(restaurant, dish, distance, score, deficits))
+        return results
+    
+    def _dish_result(
+        self,
+        restaurant: Dict[str, Any],
+        dish: Dict[str, Any],
+        distance: float,
+        score: float,
+        deficits: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        return {
+            "restaurant": restaurant["name"],
+            "restaurant_lat": restaurant["lat"],
+            "restaurant_lon": restaurant["lon"],
+            "dish": dish["name"],
+            "nutrients": dish.get("nutrients", {}),
+            "distance_km": round(distance, 2),
+            "score": round(score, 2),
+            "match_reason": self._explain_dish_match(dish, deficits),
+        }
     
     def _score_dish(
         self,
@@ -127,12 +208,8 @@ class RestaurantService:
                     score += 1.0 * (1 + severity * 0.5)
         
         # Общие полезные нутриенты
-        valuable_nutrients = {
-            "fiber", "protein", "omega3", "vitamin_d", 
-            "iron", "b12", "vitamin_c"
-        }
         for nutrient in nutrients.keys():
-            if nutrient in valuable_nutrients:
+            if nutrient in self.VALUABLE_NUTRIENTS:
                 score += 0.3
         
         # Штраф за расстояние (чем дальше, тем меньше скор)
@@ -0,0 +1,65 @@
+"""Single-flight: объединение одинаковых одновременных запросов в один вызов"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Future[T]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Одновременные вызовы с одинаковым ключом ждут одну общую задачу
+
+    Первый вызов (лидер) запускает func в отдельной задаче, остальные
+    ждут её результат или ошибку. Отмена одного ожидающего не отменяет
+    задачу для остальных; задача отменяется, только когда её больше никто
+    не ждёт. Результат общий для всех - вызывающий код не должен его
+    изменять без копирования.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        # Метрики
+        self._leaders = 0
+        self._deduplicated = 0
+        self._cancelled = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self._leaders += 1
+        else:
+            self._deduplicated += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                # Все ожидающие отменены: новые вызовы начнут заново
+                self._forget(key, call)
+                call.task.cancel()
+                self._cancelled += 1
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self._leaders,
+            "deduplicated": self._deduplicated,
+            "cancelled": self._cancelled,
+        }
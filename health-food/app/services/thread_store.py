@@ -0,0 +1,292 @@
+"""Хранилище диалогов AI диетолога: LRU в памяти поверх SQLite"""
+import asyncio
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ..config import get_thread_settings
+from ..db import log_failed_write
+from ..llm_provider.base import ConversationHistory
+from ..repositories.async_repository import AsyncRepository
+from ..repositories.thread_repository import ThreadRepository
+
+logger = logging.getLogger(__name__)
+
+# Первое предложение ответа для краткого содержания
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+# Давно неактивные диалоги удаляются из БД раз в столько новых диалогов
+_PURGE_EVERY = 100
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Оценка числа токенов без токенизатора: ~4 байта UTF-8 на токен, то есть
+    ~4 символа латиницы или ~2 символа кириллицы
+    """
+    return max(1, (len(text.encode("utf-8")) + 3) // 4)
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def _first_sentence(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return _shorten(_SENTENCE_END.split(text, maxsplit=1)[0], limit)
+
+
+class Thread:
+    """Диалог: контекст, краткое содержание и реплики в пределах бюджета"""
+
+    __slots__ = (
+        "id", "context", "summary", "summarized_seq", "turns", "last_seq", "owner", "updated_at",
+    )
+
+    def __init__(
+        self,
+        thread_id: str,
+        context: Dict[str, Any],
+        summary: str = "",
+        summarized_seq: int = 0,
+        turns: Optional[List[Dict[str, Any]]] = None,
+        last_seq: int = 0,
+        owner: Optional[str] = None,
+        updated_at: float = 0.0,
+    ):
+        self.id = thread_id
+        self.context = context
+        self.summary = summary
+        self.summarized_seq = summarized_seq
+        # {"seq", "role", "content", "tokens"} после summarized_seq
+        self.turns: List[Dict[str, Any]] = turns or []
+        self.last_seq = last_seq
+        # Вызывающий, начавший диалог: чужой диалог не продолжается
+        self.owner = owner
+        self.updated_at = updated_at
+
+    def history(self) -> ConversationHistory:
+        return ConversationHistory(
+            self.summary,
+            [{"role": turn["role"], "content": turn["content"]} for turn in self.turns],
+        )
+
+    def tokens(self) -> int:
+        return sum(turn["tokens"] for turn in self.turns)
+
+
+class ThreadStore:
+    """
+    Диалоги с LRU-кэшем в памяти и хранением в SQLite
+
+    В промпт идут только последние реплики в пределах history_token_budget
+    и краткое содержание более ранних (не длиннее summary_token_budget).
+    Краткое содержание - извлекающее (вопрос и первое предложение ответа),
+    без дополнительного вызова модели.
+
+    Диалог продолжает только его владелец - вызывающий, который его начал;
+    чужой или неизвестный id начинает новый диалог. Диалоги без реплик
+    дольше ttl секунд не выдаются и удаляются из БД.
+    """
+
+    def __init__(
+        self,
+        history_token_budget: Optional[int] = None,
+        summary_token_budget: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        settings = get_thread_settings()
+        self.history_token_budget = history_token_budget or settings["history_token_budget"]
+        self.summary_token_budget = summary_token_budget or settings["summary_token_budget"]
+        self.cache_size = cache_size or settings["cache_size"]
+        self.ttl = settings["ttl"] if ttl is None else ttl
+        self._threads: "OrderedDict[str, Thread]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Метрики
+        self._hits = 0
+        self._loads = 0
+        self._created = 0
+        self._compactions = 0
+        self._conflicts = 0
+        self._write_errors = 0
+        self._foreign = 0
+        self._expired = 0
+
+    async def get(self, thread_id: Optional[str], owner: Optional[str]) -> Optional[Thread]:
+        """Диалог по id (из памяти или БД), None - такого нет или он чужой
+
+        Загрузка из БД идёт в пуле потоков БД и не блокирует цикл событий
+        """
+        thread = await self._load(thread_id) if thread_id else None
+        if thread is None:
+            return None
+        if thread.owner is None or thread.owner != owner:
+            logger.warning(f"Диалог {thread_id} принадлежит другому вызывающему")
+            with self._lock:
+                self._foreign += 1
+            return None
+        return thread
+
+    async def _load(self, thread_id: str) -> Optional[Thread]:
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            if thread is not None:
+                if not self._is_idle(thread):
+                    self._threads.move_to_end(thread_id)
+                    self._hits += 1
+                    return thread
+                del self._threads[thread_id]
+
+        row = await AsyncRepository(ThreadRepository).get(thread_id)
+        if row is None:
+            return None
+        thread = Thread(
+            row["id"],
+            row["context"],
+            row["summary"],
+            row["summarized_seq"],
+            row["messages"],
+            row["last_seq"],
+            row["owner"],
+            row["updated_at"],
+        )
+        with self._lock:
+            if self._is_idle(thread):
+                # Ещё не удалён из БД, но уже не продолжается
+                self._expired += 1
+                return None
+            self._loads += 1
+            # Параллельная загрузка: оставить уже закэшированный экземпляр
+            thread = self._threads.setdefault(thread_id, thread)
+            self._remember(thread)
+        return thread
+
+    def create(self, context: Dict[str, Any], owner: Optional[str]) -> Thread:
+        thread = Thread(
+            f"thr_{uuid.uuid4().hex}", dict(context or {}), owner=owner, updated_at=time.time()
+        )
+        repository = ThreadRepository()
+        log_failed_write(
+            repository.create(thread.id, thread.context, owner), f"create thread {thread.id}"
+        )
+        with self._lock:
+            self._created += 1
+            self._threads[thread.id] = thread
+            self._remember(thread)
+            purge = self.ttl > 0 and self._created % _PURGE_EVERY == 0
+        if purge:
+            log_failed_write(
+                repository.delete_idle(time.time() - self.ttl), "delete idle threads"
+            )
+        return thread
+
+    async def open(
+        self, thread_id: Optional[str], context: Dict[str, Any], owner: Optional[str]
+    ) -> Thread:
+        """Продолжить диалог или начать новый (неизвестный или чужой id - новый диалог)"""
+        return await self.get(thread_id, owner) or self.create(context, owner)
+
+    async def append(
+        self,
+        thread: Thread,
+        user_message: str,
+        reply: str,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Добавить вопрос и ответ, свернуть старые реплики сверх бюджета
+
+        Ждёт коммита записи. Ошибка записи логируется, но не пробрасывается:
+        ответ модели уже получен. Если диалог тем временем продолжил другой
+        воркер, диалог выгружается из кэша и при следующем обращении
+        перечитывается из БД целиком.
+        """
+        messages = []
+        for role, content in (("user", user_message), ("assistant", reply or "")):
+            thread.last_seq += 1
+            messages.append(
+                {
+                    "seq": thread.last_seq,
+                    "role": role,
+                    "content": content,
+                    "tokens": estimate_tokens(content),
+                }
+            )
+        thread.turns.extend(messages)
+        thread.updated_at = time.time()
+
+        new_context = None
+        if context and context != thread.context:
+            thread.context = dict(context)
+            new_context = thread.context
+
+        self._compact(thread)
+        future = ThreadRepository().save_turn(
+            thread.id, messages, thread.summary, thread.summarized_seq, new_context
+        )
+        try:
+            offset = await asyncio.wrap_future(future)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить реплику диалога {thread.id}: {e!r}")
+            with self._lock:
+                self._write_errors += 1
+            return
+        if offset:
+            logger.info(f"Диалог {thread.id} продолжен параллельно, перечитывается из БД")
+            with self._lock:
+                self._conflicts += 1
+                if self._threads.get(thread.id) is thread:
+                    del self._threads[thread.id]
+
+    def _compact(self, thread: Thread) -> None:
+        """Свернуть самые старые пары реплик в краткое содержание"""
+        folded = []
+        # Последняя пара остаётся целиком, даже если не влезает в бюджет
+        while thread.tokens() > self.history_token_budget and len(thread.turns) > 2:
+            turn = thread.turns.pop(0)
+            thread.summarized_seq = turn["seq"]
+            folded.append(turn)
+        if not folded:
+            return
+
+        lines = [line for line in thread.summary.split("\n") if line]
+        for turn in folded:
+            if turn["role"] == "user":
+                lines.append(f"- Вопрос: {_shorten(turn['content'], 160)}")
+            else:
+                lines.append(f"  Ответ: {_first_sentence(turn['content'], 240)}")
+        # Бюджет краткого содержания: отбрасываются самые старые строки
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_token_budget:
+            lines.pop(0)
+        thread.summary = "\n".join(lines)
+        self._compactions += 1
+
+    def _is_idle(self, thread: Thread) -> bool:
+        return self.ttl > 0 and time.time() - thread.updated_at > self.ttl
+
+    def _remember(self, thread: Thread) -> None:
+        self._threads.move_to_end(thread.id)
+        while len(self._threads) > self.cache_size:
+            self._threads.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cached": len(self._threads),
+                "cache_size": self.cache_size,
+                "hits": self._hits,
+                "loads": self._loads,
+                "created": self._created,
+                "compactions": self._compactions,
+                "conflicts": self._conflicts,
+                "write_errors": self._write_errors,
+                "foreign": self._foreign,
+                "expired": self._expired,
+                "history_token_budget": self.history_token_budget,
+            }
@@ -0,0 +1,95 @@
+"""Лимит токенов LLM на пользователя"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ..config import get_llm_token_budget_settings
+from .admission import TokenBudgetExceededError
+
+
+class TokenBudget:
+    """
+    Лимит токенов (prompt + completion) на пользователя за окно
+
+    Окно фиксированное и начинается с первого вызова пользователя. Расход
+    учитывается после вызова по фактическому usage, поэтому последний
+    допущенный вызов может выйти за лимит - следующий будет отклонён до
+    конца окна. Счётчики хранятся в памяти процесса (на воркер).
+    limit = 0 - без ограничения, только учёт.
+    """
+
+    # Как часто чистить истёкшие окна
+    PURGE_EVERY = 256
+
+    def __init__(self, limit: Optional[int] = None, window: Optional[float] = None):
+        settings = get_llm_token_budget_settings()
+        self.limit = settings["limit"] if limit is None else limit
+        self.window = window or settings["window"]
+        # caller -> [начало окна, израсходовано]
+        self._usage: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._charges = 0
+        # Метрики
+        self._rejected = 0
+        self._tokens = 0
+
+    def _current(self, caller: str, now: float) -> Optional[list]:
+        entry = self._usage.get(caller)
+        if entry is not None and now - entry[0] >= self.window:
+            del self._usage[caller]
+            return None
+        return entry
+
+    def check(self, caller: Optional[str]) -> None:
+        """Бросает TokenBudgetExceededError, если лимит на окно исчерпан"""
+        if not caller or self.limit <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            entry = self._current(caller, now)
+            if entry is None or entry[1] < self.limit:
+                return
+            self._rejected += 1
+            retry_after = entry[0] + self.window - now
+        raise TokenBudgetExceededError(
+            "Лимит AI запросов исчерпан, попробуйте позже", retry_after=retry_after
+        )
+
+    def charge(self, caller: Optional[str], tokens: int) -> None:
+        """Списать фактически израсходованные токены"""
+        if not caller or tokens <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._tokens += tokens
+            entry = self._current(caller, now)
+            if entry is None:
+                entry = self._usage[caller] = [now, 0]
+            entry[1] += tokens
+            self._charges += 1
+            if self._charges % self.PURGE_EVERY == 0:
+                for key in [k for k, (started, _) in self._usage.items() if now - started >= self.window]:
+                    del self._usage[key]
+
+    def usage(self, caller: str) -> Dict[str, Any]:
+        """Расход пользователя в текущем окне"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._current(caller, now)
+        used = entry[1] if entry else 0
+        return {
+            "used": used,
+            "limit": self.limit,
+            "remaining": max(0, self.limit - used) if self.limit > 0 else None,
+            "resets_in": round(entry[0] + self.window - now, 1) if entry else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "window": self.window,
+                "callers": len(self._usage),
+                "tokens": self._tokens,
+                "rejected": self._rejected,
+            }
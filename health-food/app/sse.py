@@ -0,0 +1,76 @@
+"""Server-Sent Events helpers: event framing, heartbeats, disconnect handling."""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from . import serialization
+from .config import get_sse_heartbeat_interval
+
+logger = logging.getLogger(__name__)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Disables response buffering in nginx, otherwise events arrive in bulk
+    "X-Accel-Buffering": "no",
+}
+
+HEARTBEAT = ": ping\n\n"
+
+
+def format_event(event: str, data: Any) -> str:
+    """One SSE frame with a JSON payload."""
+    payload = serialization.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def text_event_stream(
+    chunks: AsyncIterator[str],
+    request: Request,
+    start: Dict[str, Any],
+    on_error: Callable[[BaseException], Dict[str, Any]],
+    heartbeat: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """Frames a stream of text chunks as SSE.
+
+    Emits ``start`` first, then one ``delta`` event per chunk, and finally
+    ``done`` with the full text, or ``error`` with ``on_error(exc)``. While
+    no chunk arrives, a comment frame is sent every ``heartbeat`` seconds.
+    The upstream iterator is closed as soon as the client disconnects.
+    """
+    heartbeat = heartbeat or get_sse_heartbeat_interval()
+    parts = []
+    pending: Optional[asyncio.Future] = None
+    try:
+        yield format_event("start", start)
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(chunks))
+            done, _ = await asyncio.wait({pending}, timeout=heartbeat)
+            if not done:
+                if await request.is_disconnected():
+                    logger.info("SSE client disconnected, cancelling generation")
+                    return
+                yield HEARTBEAT
+                continue
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            parts.append(chunk)
+            yield format_event("delta", {"text": chunk})
+        yield format_event("done", {**start, "reply": "".join(parts)})
+    except Exception as e:
+        yield format_event("error", on_error(e))
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await chunks.aclose()
+
+
+def sse_response(stream: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(stream, media_type="text/event-stream", headers=SSE_HEADERS)
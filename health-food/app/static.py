@@ -0,0 +1,181 @@
+"""Static assets: precompressed .br/.gz variants, immutable caching of hashed files.
+
+Variants are built once, at maximum compression, by :func:`precompress_directory`
+(on startup with STATIC_PRECOMPRESS, or as a build step)::
+
+    python -m app.static frontend/dist
+"""
+import argparse
+import logging
+import mimetypes
+import os
+import re
+import stat
+import sys
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Scope
+
+from .compression import ENCODINGS, brotli, is_compressible, negotiate
+from .config import get_static_settings
+
+logger = logging.getLogger(__name__)
+
+# Encoding -> file suffix of the precompressed variant
+VARIANT_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Build tools put a content hash into file names (Vite: index-BdQq_4o2.js):
+# such a URL never changes content and can be cached forever
+HASHED_NAME = re.compile(r"[-.][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+
+
+def is_hashed_asset(path: str) -> bool:
+    return HASHED_NAME.search(os.path.basename(path)) is not None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves ``<file>.br`` / ``<file>.gz`` when the client
+    accepts that encoding and the variant is not older than the file.
+
+    Every response carries an ETag (per variant, as the bytes differ) and
+    Cache-Control: immutable for content-hashed names, ``no-cache`` (always
+    revalidate, answered with 304 on a matching If-None-Match) otherwise.
+    """
+
+    def __init__(self, *args: Any, immutable_max_age: Optional[int] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        if immutable_max_age is None:
+            immutable_max_age = get_static_settings()["immutable_max_age"]
+        self.immutable_cache_control = f"public, max-age={immutable_max_age}, immutable"
+        # Full path -> {encoding: (variant path, stat)}, refreshed on every lookup
+        self._variants: Dict[str, Dict[str, Tuple[str, os.stat_result]]] = {}
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        # Runs in a worker thread, so the variant stats do not block the loop
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+            variants = {}
+            for encoding, suffix in VARIANT_SUFFIXES.items():
+                try:
+                    variant_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                # A stale variant (file rebuilt since) is ignored
+                if variant_stat.st_mtime >= stat_result.st_mtime:
+                    variants[encoding] = (full_path + suffix, variant_stat)
+            if variants:
+                self._variants[full_path] = variants
+            else:
+                self._variants.pop(full_path, None)
+        return full_path, stat_result
+
+    def cache_control(self, full_path: str) -> str:
+        return self.immutable_cache_control if is_hashed_asset(full_path) else "no-cache"
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        headers = {"Cache-Control": self.cache_control(full_path)}
+        variants = self._variants.get(full_path, {})
+        encoding = None
+        if variants:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = negotiate(
+                request_headers.get("accept-encoding", ""), [e for e in ENCODINGS if e in variants]
+            )
+
+        if encoding is not None:
+            variant_path, variant_stat = variants[encoding]
+            headers["Content-Encoding"] = encoding
+            response = FileResponse(
+                variant_path,
+                status_code=status_code,
+                headers=headers,
+                media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+                stat_result=variant_stat,
+            )
+        else:
+            response = FileResponse(
+                full_path, status_code=status_code, headers=headers, stat_result=stat_result
+            )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def _write_atomic(path: str, data: bytes, mtime: float) -> None:
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    # Same mtime as the source: the variant is fresh until the file changes
+    os.utime(tmp_path, (mtime, mtime))
+    os.replace(tmp_path, path)
+
+
+def precompress_directory(directory: str, min_size: int = 1024) -> Dict[str, int]:
+    """
+    Writes ``.br`` (quality 11) and ``.gz`` (level 9) next to every
+    compressible file of at least ``min_size`` bytes under ``directory``.
+
+    Up-to-date variants are kept; a variant that would not be smaller than
+    the file is not written.
+    """
+    stats = {"files": 0, "written": 0, "fresh": 0, "bytes_in": 0, "bytes_out": 0}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(tuple(VARIANT_SUFFIXES.values())):
+                continue
+            path = os.path.join(root, name)
+            media_type = mimetypes.guess_type(name)[0] or ""
+            source_stat = os.stat(path)
+            if source_stat.st_size < min_size or not is_compressible(media_type):
+                continue
+            stats["files"] += 1
+            data = None
+            for encoding in ENCODINGS:
+                variant_path = path + VARIANT_SUFFIXES[encoding]
+                try:
+                    if os.stat(variant_path).st_mtime >= source_stat.st_mtime:
+                        stats["fresh"] += 1
+                        continue
+                except OSError:
+                    pass
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                if encoding == "br":
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+                    compressed = compressor.compress(data) + compressor.flush()
+                if len(compressed) >= len(data):
+                    continue
+                _write_atomic(variant_path, compressed, source_stat.st_mtime)
+                stats["written"] += 1
+                stats["bytes_in"] += len(data)
+                stats["bytes_out"] += len(compressed)
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Precompress static assets (.br/.gz)")
+    parser.add_argument("directory", nargs="?", default="frontend/dist")
+    parser.add_argument("--min-size", type=int, default=1024)
+    args = parser.parse_args()
+    print(precompress_directory(args.directory, args.min_size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Offline load test of the AI pipeline on the stub LLM provider.
+
+Fires a burst of concurrent AIService calls through the real caching,
+single-flight, admission control, retry and circuit breaker layers, with
+a configurable fake model behind them::
+
+    python -m benchmarks.ai_pipeline --operation recipes --requests 500 --profiles 20
+    python -m benchmarks.ai_pipeline --operation consultation --failure-rate 0.2
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+from app.db import close_write_queue, init_db
+from app.llm_provider.stub_provider import StubLLMProvider
+from app.services.admission import AdmissionError
+from app.services.ai_service import AIService
+
+_LABS = ["ferritin", "b12", "vitamin_d", "ldl", "hba1c"]
+
+
+def profile(i: int) -> Dict[str, Any]:
+    """Distinct user contexts (different lab bands and preferences)."""
+    return {
+        "labs": {marker: 10 + (i * 7 + k * 13) % 200 for k, marker in enumerate(_LABS[: 1 + i % 5])},
+        "preferences": {"available": ["яйца", "шпинат", "гречка", "лосось", "нут"][: 2 + i % 4]},
+        "difficulty": ["легкий", "средний", "сложный"][i % 3],
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    provider = StubLLMProvider(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=0.05,
+    )
+    service = AIService(provider)
+    outcomes: Dict[str, int] = collections.Counter()
+    latencies: List[float] = []
+
+    async def one(i: int) -> None:
+        context = profile(i % args.profiles)
+        started = time.perf_counter()
+        try:
+            if args.operation == "recipes":
+                await service.generate_personalized_recipes(context)
+            elif args.operation == "photo":
+                await service.analyze_fridge_photo(
+                    f"photo-{i % args.profiles}".encode(), image_hash=f"{i % args.profiles:016x}"
+                )
+            else:
+                await service.get_nutrition_consultation("Какие витамины мне нужны?", context)
+            outcomes["ok"] += 1
+        except AdmissionError as e:
+            outcomes[str(e.status_code)] += 1
+        except Exception as e:
+            outcomes[type(e).__name__] += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for wave in range(0, args.requests, args.burst):
+        await asyncio.gather(*(one(i) for i in range(wave, min(wave + args.burst, args.requests))))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 1),
+            "p95": round(percentile(latencies, 0.95), 1),
+            "p99": round(percentile(latencies, 0.99), 1),
+        },
+        "outcomes": dict(outcomes),
+        "upstream_calls": provider.calls,
+        "service": service.stats(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operation", choices=["recipes", "consultation", "photo"], default="recipes")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--burst", type=int, default=100, help="concurrent requests per wave")
+    parser.add_argument("--profiles", type=int, default=10, help="distinct request contexts")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ.setdefault("AI_RETRY_BASE_DELAY", "0.05")
+    # Consultations keep their threads in SQLite
+    init_db()
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        close_write_queue()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
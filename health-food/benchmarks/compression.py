@@ -0,0 +1,57 @@
+"""Wire size and CPU cost of on-the-fly response compression.
+
+Encodes the /api/generate payloads of ``benchmarks.serialization`` and
+compresses them with the CompressionMiddleware encoders at the configured
+levels (COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY)::
+
+    python -m benchmarks.compression --days 14 --limit 200
+"""
+import argparse
+import sys
+
+from app.compression import ENCODINGS, _Compressor
+from app.config import get_compression_settings
+from app.serialization import get_serializer
+
+from .serialization import build_payloads, cpu_us
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--dishes", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=14, help="meal plan length")
+    parser.add_argument("--limit", type=int, default=200, help="dishes in the restaurants payload")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    settings = get_compression_settings()
+    payloads = build_payloads(args)
+    payloads.pop("recipe_columns")
+    serializer = get_serializer()
+
+    print(
+        f"{serializer.name} bodies, gzip level {settings['gzip_level']}, "
+        f"brotli quality {settings['brotli_quality']}, median CPU of {args.repeat}"
+    )
+    for name, payload in payloads.items():
+        body = serializer.dumpb(payload)
+        line = f"{name:<12} identity {len(body):8d} B"
+        for encoding in ENCODINGS:
+            def compress() -> bytes:
+                return _Compressor(
+                    encoding, settings["gzip_level"], settings["brotli_quality"]
+                ).finish(body)
+
+            size = len(compress())
+            line += (
+                f"  {encoding} {size:7d} B ({size / len(body):5.1%})"
+                f" {cpu_us(compress, args.repeat):7.1f} us"
+            )
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
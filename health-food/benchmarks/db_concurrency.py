@@ -0,0 +1,152 @@
+"""Latency of unrelated requests while SQLite writes are stalled.
+
+Starts the app with uvicorn in a background thread, measures /health and
+/api/reminders/upcoming latency at rest, then again while an external
+connection holds the database write lock for ``--stall`` seconds and
+``--writers`` clients post /api/labs/save (each waits for its commit).
+With the DB thread pool the probes are unaffected by the stalled writes;
+``--inline`` runs the DB calls of the async handlers on the event loop and
+blocks it until each write commits (the previous behaviour) for comparison::
+
+    python -m benchmarks.db_concurrency --stall 1.0 --writers 16
+    python -m benchmarks.db_concurrency --stall 1.0 --writers 16 --inline
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+import httpx
+import uvicorn
+
+from .login import free_port, percentiles
+
+PROBES = ("/health", "/api/reminders/upcoming?days=30")
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> Dict[str, List[float]]:
+    """GET the probe endpoints in a loop; latencies in milliseconds."""
+    latencies: Dict[str, List[float]] = {path: [] for path in PROBES}
+    while not stop.is_set():
+        for path in PROBES:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies[path].append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def hold_write_lock(db_path: str, seconds: float, locked: threading.Event) -> None:
+    """Keeps a write transaction open, as a long migration or bulk import would."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        locked.set()
+        time.sleep(seconds)
+        conn.execute("ROLLBACK")
+    finally:
+        conn.close()
+
+
+def summarize(latencies: Dict[str, List[float]]) -> Dict[str, Any]:
+    return {path: percentiles(samples) for path, samples in latencies.items()}
+
+
+async def run(base_url: str, db_path: str, args: argparse.Namespace) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.writers + 4)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, args.probe_interval))
+        await asyncio.sleep(args.baseline)
+        stop.set()
+        baseline = await probe_task
+
+        locked = threading.Event()
+        holder = threading.Thread(target=hold_write_lock, args=(db_path, args.stall, locked))
+        holder.start()
+        await asyncio.to_thread(locked.wait)
+
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, args.probe_interval))
+        labs = json.dumps({"vitamin_d": 18, "ferritin": 25})
+        write_latencies: List[float] = []
+        statuses: Dict[int, int] = {}
+
+        async def writer() -> None:
+            started = time.perf_counter()
+            response = await client.post("/api/labs/save", data={"labs_json": labs, "weeks": 10})
+            write_latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        await asyncio.gather(*(writer() for _ in range(args.writers)))
+        stop.set()
+        during_stall = await probe_task
+        await asyncio.to_thread(holder.join)
+
+        health = (await client.get("/health")).json()
+
+    return {
+        "mode": "inline" if args.inline else "db_executor",
+        "stall_s": args.stall,
+        "writers": args.writers,
+        "write_statuses": statuses,
+        "write_ms": percentiles(write_latencies),
+        "probe_ms_baseline": summarize(baseline),
+        "probe_ms_during_stall": summarize(during_stall),
+        "db_executor": health.get("db_executor"),
+        "db_writer": health.get("db_writer"),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stall", type=float, default=1.0, help="seconds the write lock is held")
+    parser.add_argument("--writers", type=int, default=16, help="concurrent /api/labs/save requests")
+    parser.add_argument("--baseline", type=float, default=1.0, help="seconds of probing at rest")
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--inline", action="store_true", help="run DB calls on the event loop")
+    args = parser.parse_args()
+
+    # Stalled writes must outlast the lock instead of failing with "database is locked"
+    os.environ["DB_BUSY_TIMEOUT_MS"] = str(int(args.stall * 1000) + 5000)
+
+    import app.db
+    import app.main
+
+    if args.inline:
+        async def run_inline(fn, *fn_args, **fn_kwargs):
+            return fn(*fn_args, **fn_kwargs)
+
+        async def write_inline(fn):
+            return app.db.run_write(fn)
+
+        app.main.run_db = run_inline
+        app.db.write = write_inline
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app.main.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            return 1
+        time.sleep(0.05)
+    try:
+        report = asyncio.run(run(f"http://127.0.0.1:{port}", str(app.db.DB_PATH), args))
+    finally:
+        server.should_exit = True
+        thread.join()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Microbenchmark of the distance kernels in app.geo.
+
+Compares the scalar haversine loop with the batched haversine and the
+equirectangular fast path, and reports the measured error of the latter::
+
+    python -m benchmarks.distance --points 100000 --radius 10
+"""
+import argparse
+import math
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from app.geo import (
+    EARTH_RADIUS_KM,
+    EQUIRECTANGULAR_MAX_LAT,
+    EQUIRECTANGULAR_REL_ERROR,
+    equirectangular_many,
+    haversine_km,
+    haversine_many,
+)
+
+
+def points_around(
+    rng: np.random.Generator, lat: float, lon: float, radius_km: float, count: int
+):
+    """Uniform random bearings and distances up to radius_km around a point."""
+    bearing = rng.uniform(0, 2 * np.pi, count)
+    angular = rng.uniform(0, radius_km, count) / EARTH_RADIUS_KM
+    phi = math.radians(lat)
+    lats = np.arcsin(
+        math.sin(phi) * np.cos(angular) + math.cos(phi) * np.sin(angular) * np.cos(bearing)
+    )
+    lons = math.radians(lon) + np.arctan2(
+        np.sin(bearing) * np.sin(angular) * math.cos(phi),
+        np.cos(angular) - math.sin(phi) * np.sin(lats),
+    )
+    return np.degrees(lats), (np.degrees(lons) + 180.0) % 360.0 - 180.0
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--radius", type=float, default=10.0)
+    parser.add_argument("--lat", type=float, default=55.75)
+    parser.add_argument("--lon", type=float, default=37.62)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    lats, lons = points_around(rng, args.lat, args.lon, args.radius, args.points)
+    lat_list, lon_list = lats.tolist(), lons.tolist()
+
+    def scalar():
+        return [
+            haversine_km(args.lat, args.lon, lat, lon) for lat, lon in zip(lat_list, lon_list)
+        ]
+
+    timings = {
+        "scalar haversine": best_of(scalar, args.repeat),
+        "batched haversine": best_of(
+            lambda: haversine_many(args.lat, args.lon, lats, lons), args.repeat
+        ),
+        "equirectangular": best_of(
+            lambda: equirectangular_many(args.lat, args.lon, lats, lons), args.repeat
+        ),
+    }
+    exact = np.array(scalar())
+    batched = haversine_many(args.lat, args.lon, lats, lons)
+    approx = equirectangular_many(args.lat, args.lon, lats, lons)
+    nonzero = exact > 0
+
+    print(f"{args.points} points within {args.radius} km of ({args.lat}, {args.lon})")
+    for name, ms in timings.items():
+        per_point = ms * 1e6 / args.points
+        print(f"{name:<18} {ms:9.3f} ms   {per_point:7.1f} ns/point")
+    print(f"batched vs scalar  max |diff| {np.max(np.abs(batched - exact)):.3e} km")
+    rel = np.abs(approx - exact)[nonzero] / exact[nonzero]
+    print(
+        f"equirectangular    max rel error {rel.max():.3e} "
+        f"(median {statistics.median(rel.tolist()):.3e}), "
+        f"max abs {np.max(np.abs(approx - exact)) * 1000:.3f} m; "
+        f"documented bound {EQUIRECTANGULAR_REL_ERROR:.0e} up to |lat| {EQUIRECTANGULAR_MAX_LAT}°"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
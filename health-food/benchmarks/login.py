@@ -0,0 +1,148 @@
+"""Latency of unrelated endpoints during a login storm.
+
+Starts the app with uvicorn in a background thread, measures /health
+latency at rest, then again while ``--concurrency`` clients log in as fast
+as they can. With bcrypt on the password hasher's pool the /health
+percentiles should barely move; with bcrypt on the event loop every probe
+waits behind the running logins::
+
+    python -m benchmarks.login --logins 200 --concurrency 32 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+import httpx
+import uvicorn
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+    return {
+        "count": len(ordered),
+        "p50": round(statistics.median(ordered), 2),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> List[float]:
+    """GET /health in a loop; latencies in milliseconds."""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/health")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run(base_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        username = f"bench_{uuid.uuid4().hex[:8]}"
+        credentials = {"username": username, "password": "benchmark-password"}
+        response = await client.post(
+            "/auth/register", json={**credentials, "email": f"{username}@example.com"}
+        )
+        response.raise_for_status()
+
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, args.probe_interval))
+        await asyncio.sleep(args.baseline)
+        stop.set()
+        baseline = await probe_task
+
+        login_latencies: List[float] = []
+        statuses: Dict[int, int] = {}
+        remaining = iter(range(args.logins))
+
+        async def login_worker() -> None:
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.post("/auth/token", data=credentials)
+                login_latencies.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, args.probe_interval))
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        during_storm = await probe_task
+
+        health = (await client.get("/health")).json()
+
+    return {
+        "rounds": args.rounds,
+        "logins": args.logins,
+        "login_throughput_per_s": round(args.logins / elapsed, 1),
+        "login_statuses": statuses,
+        "login_ms": percentiles(login_latencies),
+        "health_ms_baseline": percentiles(baseline),
+        "health_ms_during_storm": percentiles(during_storm),
+        "password_hasher": health.get("password_hasher"),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument("--workers", type=int, default=None, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--baseline", type=float, default=2.0, help="seconds of probing at rest")
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(max(64, args.concurrency))
+    if args.workers:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+
+    from app.main import app
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            return 1
+        time.sleep(0.05)
+    try:
+        report = asyncio.run(run(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.should_exit = True
+        thread.join()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Benchmark of the restaurant geo index against a full table scan.
+
+Scatters venues around many cities, checks that the grid returns exactly
+the venues a full haversine scan finds and prints per-query timings::
+
+    python -m benchmarks.nearby --venues 300000 --cities 60 --radius 10
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from app.catalogue.geo_index import GeoGrid
+from app.config import get_geo_grid_cell_deg
+from app.geo import haversine_km
+
+
+def make_venues(rng: random.Random, venues: int, cities: int) -> List[Tuple[float, float]]:
+    centers = [(rng.uniform(-60, 65), rng.uniform(-180, 180)) for _ in range(cities)]
+    points = []
+    for _ in range(venues):
+        lat, lon = rng.choice(centers)
+        points.append((lat + rng.gauss(0, 0.15), (lon + rng.gauss(0, 0.25) + 180) % 360 - 180))
+    return points
+
+
+def full_scan(points, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+    found = []
+    for pos, (point_lat, point_lon) in enumerate(points):
+        distance = haversine_km(lat, lon, point_lat, point_lon)
+        if distance <= radius_km:
+            found.append((pos, distance))
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=200_000)
+    parser.add_argument("--cities", type=int, default=50)
+    parser.add_argument("--radius", type=float, default=10.0)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--cell", type=float, default=get_geo_grid_cell_deg())
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    points = make_venues(rng, args.venues, args.cities)
+    started = time.perf_counter()
+    grid = GeoGrid(
+        np.array([lat for lat, _ in points]), np.array([lon for _, lon in points]), args.cell
+    )
+    build_ms = (time.perf_counter() - started) * 1000
+
+    scan_ms, grid_ms, found = [], [], []
+    for _ in range(args.queries):
+        lat, lon = points[rng.randrange(len(points))]
+        started = time.perf_counter()
+        expected = full_scan(points, lat, lon, args.radius)
+        scan_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        positions, distances = grid.query(lat, lon, args.radius)
+        grid_ms.append((time.perf_counter() - started) * 1000)
+        # vectorized sin/cos may differ from math in the last bit
+        if positions.tolist() != [pos for pos, _ in expected] or not np.allclose(
+            distances, [distance for _, distance in expected], rtol=1e-12, atol=0
+        ):
+            print(f"MISMATCH at ({lat}, {lon}): grid {len(positions)}, scan {len(expected)}")
+            return 1
+        found.append(len(positions))
+
+    print(
+        f"{args.venues} venues, {args.cities} cities, radius {args.radius} km, "
+        f"cell {args.cell}°, build {build_ms:.1f} ms, "
+        f"~{statistics.mean(found):.0f} venues in range"
+    )
+    print(f"full scan  p50 {statistics.median(scan_ms):9.3f} ms")
+    print(f"grid       p50 {statistics.median(grid_ms):9.3f} ms")
+    print("results: identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
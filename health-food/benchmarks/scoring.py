@@ -0,0 +1,206 @@
+"""Parity check and benchmark of the recipe/dish scoring engines.
+
+Builds a synthetic catalogue, runs every query through the reference
+("python") and vectorized ("numpy") engines, fails if any result differs
+and prints per-query timings::
+
+    python -m benchmarks.scoring --recipes 20000 --dishes 20000 --queries 200
+
+``--max-index-ms`` also fails the run when the mean recipe query of the
+index ("python") engine exceeds the budget. The target is 1 ms at 100k
+recipes; reference run, 100 queries, warm snapshot::
+
+    python -m benchmarks.scoring --recipes 100000 --dishes 1000 --queries 100 --max-index-ms 1
+
+    recipes      python  mean    0.870 ms   p50    0.676 ms   p95    2.410 ms
+    recipes      numpy   mean   38.814 ms   p50   33.018 ms   p95   74.695 ms
+
+The mean and the median meet the target, the tail does not: the slowest 5%
+of queries take 2.5-6 ms. Those have available ingredients -
+counting them over the whole catalogue costs about 0.5 ms - and many days,
+so the tag diversity rule excludes tags mid-search and the search has to
+go a few hundred groups deep. Plain posting-list intersection with per-recipe
+counting was measured as the alternative: 4.7 ms mean, so the ranked search
+stays.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from app.catalogue.recipes import CatalogueSnapshot
+from app.catalogue.restaurants import RestaurantSnapshot
+from app.services.recipe_service import RecipeService
+from app.services.restaurant_service import RestaurantService
+
+TAGS = [
+    "iron", "b12", "folate", "vitamin_d", "glycemic_control", "ldl",
+    "triglycerides", "inflammation", "omega3", "vegan", "breakfast", "quick",
+]
+NUTRIENTS = [
+    "iron", "b12", "folate", "vitamin_d", "vitamin_c", "fiber", "protein",
+    "omega3", "soluble_fiber", "anti_inflammatory", "calcium", "magnesium",
+]
+INGREDIENTS = [f"ingredient {i}" for i in range(300)] + sorted(RecipeService.COMMON_PANTRY)
+
+
+class StaticCatalogue:
+    def __init__(self, snapshot: CatalogueSnapshot):
+        self.snapshot = snapshot
+
+    def get(self) -> CatalogueSnapshot:
+        return self.snapshot
+
+
+class StaticRestaurants:
+    def __init__(self, snapshot: RestaurantSnapshot):
+        self.snapshot = snapshot
+
+    def get(self) -> RestaurantSnapshot:
+        return self.snapshot
+
+    def get_nearby(self, lat: float, lon: float, radius_km: float) -> List[Dict[str, Any]]:
+        return self.snapshot.get_nearby(lat, lon, radius_km)
+
+
+def make_recipes(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": f"r{i}",
+            "name": f"Recipe {i:06d}",
+            "time_min": rng.choice([None, 5, 10, 15, 20, 30, 45, 60]),
+            "difficulty": rng.choice([None, 1, 2, 3]),
+            "ingredients": [
+                {"name": name, "amount": "1"}
+                for name in rng.sample(INGREDIENTS, rng.randint(2, 8))
+            ],
+            "tags": rng.sample(TAGS, rng.randint(0, 3)),
+            "nutrients": {n: rng.randint(1, 20) for n in rng.sample(NUTRIENTS, rng.randint(0, 5))},
+        }
+        for i in range(count)
+    ]
+
+
+def make_restaurants(rng: random.Random, dishes: int) -> List[Dict[str, Any]]:
+    restaurants = []
+    for i in range(max(dishes // 10, 1)):
+        restaurants.append({
+            "id": f"p{i}",
+            "name": f"Place {i}",
+            "lat": 55.75 + rng.uniform(-0.1, 0.1),
+            "lon": 37.62 + rng.uniform(-0.15, 0.15),
+            "dishes": [
+                {
+                    "name": f"Dish {i}.{j}",
+                    "nutrients": {n: 1 for n in rng.sample(NUTRIENTS, rng.randint(0, 5))},
+                }
+                for j in range(10)
+            ],
+        })
+    return restaurants
+
+
+def make_deficits(rng: random.Random) -> List[Dict[str, Any]]:
+    return [
+        {
+            "marker": marker,
+            "severity": rng.random(),
+            "targets": {n: "" for n in rng.sample(NUTRIENTS, rng.randint(1, 3))},
+        }
+        for marker in rng.sample(TAGS[:8], rng.randint(1, 4))
+    ]
+
+
+def timed(fn: Callable[[], Any]) -> tuple:
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def report(name: str, timings: Dict[str, List[float]]) -> None:
+    for engine, values in timings.items():
+        values = sorted(values)
+        p95 = values[int(len(values) * 0.95) - 1] if len(values) > 1 else values[0]
+        print(
+            f"{name:<12} {engine:<7} mean {statistics.mean(values):8.3f} ms"
+            f"   p50 {statistics.median(values):8.3f} ms   p95 {p95:8.3f} ms"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--dishes", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--max-index-ms", type=float, default=None,
+        help="fail if the mean recipe query of the index engine is slower",
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalogue = StaticCatalogue(CatalogueSnapshot(1, make_recipes(rng, args.recipes)))
+    restaurants = StaticRestaurants(RestaurantSnapshot(1, make_restaurants(rng, args.dishes)))
+    recipe_services = {e: RecipeService(None, catalogue, engine=e) for e in ("python", "numpy")}
+    dish_services = {
+        e: RestaurantService(restaurants, engine=e, catalogue=restaurants)
+        for e in ("python", "numpy")
+    }
+
+    # Snapshot bitsets and matrices are built by the first query, not timed
+    for service in recipe_services.values():
+        service.select_recipes_for_plan(make_deficits(random.Random(0)), None, INGREDIENTS[:3], 7)
+        service.select_recipes_for_plan(make_deficits(random.Random(0)), None, None, 7)
+
+    queries = []
+    for _ in range(args.queries):
+        deficits = make_deficits(rng)
+        available = rng.sample(INGREDIENTS, rng.randint(3, 40)) if rng.random() < 0.5 else None
+        days = rng.randint(1, 14)
+        location = {"lat": 55.75 + rng.uniform(-0.05, 0.05), "lon": 37.62}
+        limit = rng.choice([5, 20, 50])
+        queries.append((deficits, available, days, location, limit))
+
+    # One engine at a time: interleaved, each evicts the other's working set
+    # from the CPU caches and both look slower than in the service
+    recipe_timings: Dict[str, List[float]] = {e: [] for e in recipe_services}
+    dish_timings: Dict[str, List[float]] = {e: [] for e in dish_services}
+    recipe_results: Dict[str, List[Any]] = {e: [] for e in recipe_services}
+    dish_results: Dict[str, List[Any]] = {e: [] for e in dish_services}
+    for engine, service in recipe_services.items():
+        for deficits, available, days, _, _ in queries:
+            result, ms = timed(
+                lambda: service.select_recipes_for_plan(deficits, None, available, days)
+            )
+            recipe_results[engine].append(result)
+            recipe_timings[engine].append(ms)
+    for engine, service in dish_services.items():
+        for deficits, _, _, location, limit in queries:
+            result, ms = timed(lambda: service.find_best_dishes(deficits, location, 10.0, limit))
+            dish_results[engine].append(result)
+            dish_timings[engine].append(ms)
+    mismatches = sum(
+        a != b for a, b in zip(recipe_results["python"], recipe_results["numpy"])
+    ) + sum(a != b for a, b in zip(dish_results["python"], dish_results["numpy"]))
+
+    print(f"{args.recipes} recipes, ~{args.dishes} dishes, {args.queries} queries")
+    report("recipes", recipe_timings)
+    report("dishes", dish_timings)
+    if mismatches:
+        print(f"PARITY FAILED: {mismatches} differing results")
+        return 1
+    print("parity: ok")
+    if args.max_index_ms is not None:
+        index_mean = statistics.mean(recipe_timings["python"])
+        if index_mean > args.max_index_ms:
+            print(f"BUDGET EXCEEDED: index engine mean {index_mean:.3f} ms > {args.max_index_ms} ms")
+            return 1
+        print(f"budget: ok ({index_mean:.3f} ms <= {args.max_index_ms} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
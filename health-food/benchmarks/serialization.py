@@ -0,0 +1,132 @@
+"""CPU cost of JSON encoding/decoding per request, stdlib json vs orjson.
+
+Builds /api/generate-sized payloads with the real scoring services over a
+synthetic catalogue (a ``--days`` meal plan with its shopping list, and the
+``--limit`` best nearby dishes), then times the response render of each
+JSON backend and the decoding of the recipe JSON columns a repository
+reads for that plan. Fails if the backends disagree on any payload::
+
+    python -m benchmarks.serialization --days 14 --limit 200 --repeat 300
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from app.catalogue.recipes import CatalogueSnapshot
+from app.catalogue.restaurants import RestaurantSnapshot
+from app.serialization import SERIALIZERS, orjson
+from app.services.recipe_service import RecipeService
+from app.services.restaurant_service import RestaurantService
+
+from .scoring import (
+    StaticCatalogue,
+    StaticRestaurants,
+    make_deficits,
+    make_recipes,
+    make_restaurants,
+)
+
+
+def cpu_us(fn: Callable[[], Any], repeat: int) -> float:
+    """Median CPU time of ``fn`` in microseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.process_time_ns()
+        fn()
+        samples.append((time.process_time_ns() - started) / 1000)
+    return statistics.median(samples)
+
+
+def build_payloads(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    recipes = make_recipes(rng, args.recipes)
+    for recipe in recipes:
+        recipe["instructions"] = [f"Step {n}: {recipe['name']}" for n in range(rng.randint(3, 8))]
+    catalogue = StaticCatalogue(CatalogueSnapshot(1, recipes))
+    restaurants = StaticRestaurants(RestaurantSnapshot(1, make_restaurants(rng, args.dishes)))
+    recipe_service = RecipeService(None, catalogue)
+    dish_service = RestaurantService(restaurants, catalogue=restaurants)
+
+    deficits = make_deficits(rng)
+    plan = recipe_service.select_recipes_for_plan(deficits, None, None, args.days)
+    location = {"lat": 55.75, "lon": 37.62}
+    return {
+        "plan": {
+            "mode": "diy",
+            "deficits": deficits,
+            "plan": plan,
+            "shopping_list": recipe_service.build_shopping_list(plan),
+        },
+        "restaurants": {
+            "mode": "restaurants",
+            "deficits": deficits,
+            "restaurants": dish_service.find_best_dishes(deficits, location, 10.0, args.limit),
+        },
+        # What RecipeRepository decodes per row of the plan
+        "recipe_columns": [
+            {field: recipe.get(field, []) for field in ("ingredients", "instructions", "tags")}
+            for recipe in plan
+        ],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--dishes", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=14, help="meal plan length")
+    parser.add_argument("--limit", type=int, default=200, help="dishes in the restaurants payload")
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    backends = {name: cls() for name, cls in SERIALIZERS.items() if name != "orjson" or orjson}
+    if len(backends) < 2:
+        print("orjson is not installed: only the stdlib backend is available")
+
+    payloads = build_payloads(args)
+    columns = [
+        {field: backends["json"].dumps(value) for field, value in row.items()}
+        for row in payloads.pop("recipe_columns")
+    ]
+
+    mismatches = 0
+    results: Dict[str, Dict[str, float]] = {}
+    for name, payload in payloads.items():
+        reference = backends["json"].loads(backends["json"].dumpb(payload))
+        for backend_name, backend in backends.items():
+            body = backend.dumpb(payload)
+            mismatches += backend.loads(body) != reference
+            results.setdefault(f"render {name} ({len(body) // 1024} KiB)", {})[backend_name] = cpu_us(
+                lambda: backend.dumpb(payload), args.repeat
+            )
+
+    def decode_all(backend: Any) -> List[Dict[str, Any]]:
+        return [{field: backend.loads(value) for field, value in row.items()} for row in columns]
+
+    reference_rows = decode_all(backends["json"])
+    for backend_name, backend in backends.items():
+        mismatches += decode_all(backend) != reference_rows
+        results.setdefault(f"decode {len(columns)} recipe rows", {})[backend_name] = cpu_us(
+            lambda: decode_all(backend), args.repeat
+        )
+
+    print(f"{args.days}-day plan, {args.limit} dishes, median CPU per request of {args.repeat}")
+    for label, timings in results.items():
+        line = "  ".join(f"{name} {us:9.1f} us" for name, us in timings.items())
+        if "orjson" in timings:
+            saved = timings["json"] - timings["orjson"]
+            line += f"  saved {saved:9.1f} us ({timings['json'] / timings['orjson']:.1f}x)"
+        print(f"{label:<28} {line}")
+    if mismatches:
+        print(f"PARITY FAILED: {mismatches} payloads decode differently")
+        return 1
+    print("parity: ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import threading
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from app import db
+from app.db import WriteQueue, _connect, _current_conn
+from app.migrations import migrate
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    """A fresh database at the latest schema version."""
+    path = str(tmp_path / "test.db")
+    conn = _connect(path)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(db_path) -> Iterator:
+    conn = _connect(db_path)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def current_conn(conn) -> Iterator:
+    """Makes app.db.connection() yield the test connection instead of the pool's."""
+    token = _current_conn.set(conn)
+    yield conn
+    _current_conn.reset(token)
+
+
+def _close_shared_db() -> None:
+    db.close_write_queue()
+    db.close_db_executor()
+    db.close_pool()
+
+
+@pytest.fixture
+def app_db(db_path, monkeypatch) -> Iterator[str]:
+    """Points the process-wide pool, write queue and DB executor at the test database."""
+    _close_shared_db()
+    monkeypatch.setattr(db, "DB_PATH", Path(db_path))
+    yield db_path
+    _close_shared_db()
+
+
+@pytest.fixture
+def write_queue(db_path) -> Iterator[WriteQueue]:
+    queue = WriteQueue(db_path)
+    yield queue
+    queue.close()
+
+
+class WriterGate:
+    """Holds the writer thread inside a write, so later submits queue up as one batch."""
+
+    def __init__(self, queue: WriteQueue):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.future = queue.submit(self._hold)
+        assert self.entered.wait(5)
+
+    def _hold(self, conn) -> None:
+        self.entered.set()
+        assert self.release.wait(5)
+
+    def open(self) -> None:
+        self.release.set()
+        self.future.result(5)
+
+
+@pytest.fixture
+def writer_gate(write_queue) -> WriterGate:
+    return WriterGate(write_queue)
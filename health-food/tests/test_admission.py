@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from app.llm_provider.errors import LLMProviderError
+from app.services import admission
+from app.services.admission import (
+    CircuitBreaker,
+    CircuitOpenError,
+    OperationLimiter,
+    OverloadedError,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    breaker.record_failure()
+    breaker.record_success()
+    open_breaker(breaker)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.status_code == 503
+    assert error.value.retry_after_header == "30"
+
+    clock.now += 20.5
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    # Rounded up, never below one second
+    assert error.value.retry_after_header == "10"
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    open_breaker(breaker)
+    clock.now += 10
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after_header == "1"
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    open_breaker(breaker)
+    clock.now += 10
+
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["opened"] == 2
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.retry_after_header == "10"
+
+
+def test_limiter_retries_then_opens_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    limiter = OperationLimiter(
+        "chat", breaker, max_concurrent=1, max_queue=0, queue_timeout=1,
+        retry_attempts=3, retry_base_delay=0,
+    )
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        raise LLMProviderError("timeout", retryable=True)
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(limiter.call(failing))
+    # The second failure opened the breaker before the third attempt
+    assert calls == 2
+    assert limiter.stats()["retries"] == 2
+
+
+def test_non_retryable_error_is_not_retried():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    limiter = OperationLimiter("chat", breaker, max_concurrent=1, max_queue=0, queue_timeout=1)
+
+    async def rejected():
+        raise LLMProviderError("bad request")
+
+    with pytest.raises(LLMProviderError):
+        asyncio.run(limiter.call(rejected))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert limiter.stats()["retries"] == 0
+
+
+def test_full_queue_rejects_with_retry_after():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    limiter = OperationLimiter("chat", breaker, max_concurrent=1, max_queue=1, queue_timeout=5)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "done"
+
+        running = asyncio.create_task(limiter.call(slow))
+        queued = asyncio.create_task(limiter.call(slow))
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError) as error:
+            await limiter.call(slow)
+        release.set()
+        return error.value, await running, await queued
+
+    error, *results = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.retry_after_header) >= 1
+    assert results == ["done", "done"]
+    assert limiter.stats()["rejected"] == 1
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+from app import db
+from app.db import DBExecutor, _current_conn, run_with_conn
+from app.repositories.async_repository import AsyncRepository
+from app.repositories.thread_repository import ThreadRepository
+
+
+def test_slow_query_does_not_stall_the_event_loop():
+    executor = DBExecutor(2)
+
+    async def scenario():
+        ticks = 0
+        query = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+        while not query.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+
+    try:
+        assert asyncio.run(scenario()) >= 10
+        assert executor.stats()["completed"] == 1
+    finally:
+        executor.close()
+
+
+def test_executor_threads_do_not_inherit_the_callers_connection(current_conn):
+    executor = DBExecutor(1)
+
+    async def scenario():
+        return await executor.run(lambda: (_current_conn.get(), threading.current_thread().name))
+
+    try:
+        conn, thread_name = asyncio.run(scenario())
+    finally:
+        executor.close()
+
+    assert conn is None
+    assert thread_name.startswith("db")
+
+
+def test_async_repository_runs_on_a_pooled_connection(app_db):
+    ThreadRepository().create("t1", {"goal": "iron"}, "user:1").result(5)
+    threads = AsyncRepository(ThreadRepository)
+
+    async def scenario():
+        return await threads.get("t1"), await threads.run(lambda repo: repo.get("missing"))
+
+    thread, missing = asyncio.run(scenario())
+
+    assert thread["context"] == {"goal": "iron"}
+    assert thread["owner"] == "user:1"
+    assert missing is None
+    assert db.get_db_executor_stats()["completed"] == 2
+
+
+def test_run_with_conn_returns_the_connection_to_the_pool(app_db):
+    async def scenario():
+        return await asyncio.gather(*[
+            run_with_conn(lambda conn: conn.execute("SELECT 1").fetchone()[0]) for _ in range(20)
+        ])
+
+    assert asyncio.run(scenario()) == [1] * 20
+    assert db.get_pool_stats()["in_use"] == 0
@@ -0,0 +1,134 @@
+import sqlite3
+
+import pytest
+
+from app.catalogue.recipes import RecipeCatalogue
+from app.migrations import MIGRATIONS, get_schema_version
+from app.repositories.recipe_repository import RecipeRepository
+
+RECIPE = {
+    "name": "Lentil soup",
+    "time_min": 30,
+    "ingredients": [{"name": "lentils", "amount": "200 g"}, {"name": "onion", "amount": "1"}],
+    "tags": ["iron"],
+    "difficulty": "easy",
+    "nutrients": {"iron": 6.5, "fiber": 8.0},
+}
+
+
+def version(conn: sqlite3.Connection, name: str = "recipes") -> int:
+    return conn.execute(
+        "SELECT version FROM catalogue_version WHERE name = ?", (name,)
+    ).fetchone()[0]
+
+
+@pytest.fixture
+def private_recipe(conn):
+    RecipeRepository.insert(conn, "ai_private", RECIPE, user_id=1)
+    conn.commit()
+    return "ai_private"
+
+
+def test_schema_is_at_latest_migration(conn):
+    assert get_schema_version(conn) == MIGRATIONS[-1][0]
+
+
+def test_public_recipe_insert_bumps_version(conn):
+    before = version(conn)
+
+    RecipeRepository.insert(conn, "public", RECIPE)
+
+    # One bump for the row and one per nutrient
+    assert version(conn) == before + 1 + len(RECIPE["nutrients"])
+
+
+def test_public_recipe_changes_bump_version(conn):
+    RecipeRepository.insert(conn, "public", RECIPE)
+
+    before = version(conn)
+    conn.execute("UPDATE recipe_nutrients SET amount = 7 WHERE recipe_id = 'public' AND nutrient = 'iron'")
+    assert version(conn) == before + 1
+
+    before = version(conn)
+    conn.execute("UPDATE recipes SET name = 'Red lentil soup' WHERE id = 'public'")
+    assert version(conn) == before + 1
+
+    before = version(conn)
+    conn.execute("DELETE FROM recipes WHERE id = 'public'")
+    assert version(conn) > before
+
+
+def test_private_recipe_insert_keeps_version(conn):
+    before = version(conn)
+
+    RecipeRepository.insert(conn, "ai_private", RECIPE, user_id=1)
+
+    assert conn.execute(
+        "SELECT COUNT(*) FROM recipe_nutrients WHERE recipe_id = 'ai_private'"
+    ).fetchone()[0] == len(RECIPE["nutrients"])
+    assert version(conn) == before
+
+
+def test_private_recipe_changes_keep_version(conn, private_recipe):
+    before = version(conn)
+
+    conn.execute("UPDATE recipe_nutrients SET amount = 1 WHERE recipe_id = ?", (private_recipe,))
+    conn.execute("UPDATE recipes SET name = 'Renamed' WHERE id = ?", (private_recipe,))
+    conn.execute("DELETE FROM recipe_nutrients WHERE recipe_id = ?", (private_recipe,))
+    conn.execute("DELETE FROM recipes WHERE id = ?", (private_recipe,))
+
+    assert version(conn) == before
+
+
+def test_publishing_private_recipe_bumps_version(conn, private_recipe):
+    before = version(conn)
+
+    conn.execute("UPDATE recipes SET user_id = NULL WHERE id = ?", (private_recipe,))
+
+    assert version(conn) == before + 1
+
+
+def test_recipe_writes_keep_restaurant_version(conn):
+    before = version(conn, "restaurants")
+
+    RecipeRepository.insert(conn, "public", RECIPE)
+
+    assert version(conn, "restaurants") == before
+
+
+def test_invalidate_rebuilds_changed_catalogue(current_conn):
+    catalogue = RecipeCatalogue(check_interval=3600)
+    empty = catalogue.get()
+
+    RecipeRepository.insert(current_conn, "public", RECIPE)
+    assert catalogue.get() is empty
+    catalogue.invalidate()
+    fresh = catalogue.get()
+
+    assert fresh.version == version(current_conn)
+    assert len(fresh) == len(empty) + 1
+    # Unchanged version: the snapshot is kept
+    catalogue.invalidate()
+    assert catalogue.get() is fresh
+
+
+def test_invalidate_during_version_read_is_not_lost(current_conn, monkeypatch):
+    catalogue = RecipeCatalogue(check_interval=3600)
+    catalogue.get()
+    read_version = catalogue._read_version
+
+    def read_then_write(conn):
+        found = read_version(conn)
+        # A write commits and invalidates right after the version was read
+        RecipeRepository.insert(conn, "public", RECIPE)
+        catalogue.invalidate()
+        return found
+
+    monkeypatch.setattr(catalogue, "_read_version", read_then_write)
+    catalogue.invalidate()
+    stale = catalogue.get()
+    monkeypatch.undo()
+
+    fresh = catalogue.get()
+    assert fresh.version > stale.version
+    assert len(fresh) == len(stale) + 1
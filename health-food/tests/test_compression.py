@@ -0,0 +1,154 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+
+from app.compression import CompressionMiddleware, brotli, negotiate
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate", "gzip"),
+        ("GZIP;q=0.5, deflate", "gzip"),
+        ("gzip;q=0", None),
+        ("gzip;q=abc", None),
+        ("*;q=0.5, gzip;q=0", None),
+    ],
+)
+def test_negotiate_gzip(header, expected):
+    assert negotiate(header, ("gzip",)) == expected
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("gzip;q=0.8, br;q=0.8", "br"),
+        ("*", "br"),
+        ("*;q=0.5, br;q=0", "gzip"),
+    ],
+)
+def test_negotiate_prefers_brotli_on_ties(header, expected):
+    assert negotiate(header, ("br", "gzip")) == expected
+
+
+def endpoint(content_type: str, chunks, headers=()):
+    """ASGI app sending ``chunks`` as the body: one message each, more_body on all but the last."""
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", content_type.encode())] + list(headers),
+        })
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    return app
+
+
+def call(app, accept_encoding: str = "gzip", path: str = "/api/data"):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, *bodies = messages
+    return {k.decode(): v.decode() for k, v in start["headers"]}, [m["body"] for m in bodies]
+
+
+def middleware(app, **kwargs):
+    return CompressionMiddleware(app, min_size=100, gzip_level=6, brotli_quality=4, **kwargs)
+
+
+JSON_BODY = json.dumps([{"name": "Овсянка с ягодами", "score": i} for i in range(200)]).encode()
+
+
+def test_large_json_is_compressed():
+    headers, bodies = call(middleware(endpoint("application/json", [JSON_BODY])))
+
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(bodies[0]) < len(JSON_BODY)
+    assert gzip.decompress(bodies[0]) == JSON_BODY
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_brotli_when_accepted():
+    headers, bodies = call(middleware(endpoint("application/json", [JSON_BODY])), "gzip, br")
+
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(bodies[0]) == JSON_BODY
+
+
+@pytest.mark.parametrize(
+    "content_type, body, accept",
+    [
+        ("application/json", b'{"ok":true}', "gzip"),
+        ("image/png", JSON_BODY, "gzip"),
+        ("application/json", JSON_BODY, "identity"),
+    ],
+)
+def test_small_binary_or_unaccepted_bodies_pass_through(content_type, body, accept):
+    headers, bodies = call(middleware(endpoint(content_type, [body])), accept)
+
+    assert "content-encoding" not in headers
+    assert bodies == [body]
+
+
+def test_event_stream_passes_through_event_by_event():
+    events = [b"event: delta\ndata: {}\n\n" * 20, b": ping\n\n", b"event: done\ndata: {}\n\n"]
+
+    headers, bodies = call(middleware(endpoint("text/event-stream", events)))
+
+    assert "content-encoding" not in headers
+    assert bodies == events
+
+
+def test_pre_encoded_body_is_not_compressed_again():
+    encoded = gzip.compress(JSON_BODY)
+    app = endpoint("application/json", [encoded], [(b"content-encoding", b"gzip")])
+
+    headers, bodies = call(middleware(app), "br, gzip")
+
+    assert headers["content-encoding"] == "gzip"
+    assert bodies == [encoded]
+
+
+def test_excluded_paths_are_not_inspected():
+    headers, bodies = call(
+        middleware(endpoint("application/json", [JSON_BODY]), exclude_paths=("/assets/",)),
+        path="/assets/app.json",
+    )
+
+    assert "content-encoding" not in headers
+    assert bodies == [JSON_BODY]
+
+
+def test_streamed_body_is_decodable_chunk_by_chunk():
+    chunks = [f"line {i}\n".encode() * 20 for i in range(5)]
+
+    headers, bodies = call(middleware(endpoint("text/plain", chunks)))
+
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    decoder = zlib.decompressobj(31)
+    # Every chunk is flushed, so the client can decode it before the next arrives
+    assert [decoder.decompress(body) for body in bodies] == chunks
+    assert decoder.eof
@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.db import ConnectionPool, PoolTimeoutError, connection, get_pool
+
+
+@pytest.fixture
+def pool(db_path):
+    pool = ConnectionPool(db_path, max_size=2, timeout=0.05)
+    yield pool
+    pool.close()
+
+
+def test_released_connection_is_reused(pool):
+    first = pool.acquire()
+    pool.release(first)
+
+    assert pool.acquire() is first
+    assert pool.stats()["created"] == 1
+
+
+def test_release_rolls_back_open_transaction(pool):
+    conn = pool.acquire()
+    conn.execute("BEGIN")
+    conn.execute(
+        "INSERT INTO users (username, email, hashed_password) VALUES ('ghost', 'g@example.com', 'x')"
+    )
+    pool.release(conn)
+
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'ghost'").fetchone()[0] == 0
+
+
+def test_checkout_times_out_when_exhausted(pool):
+    pool.acquire()
+    pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiter_gets_released_connection(db_path):
+    pool = ConnectionPool(db_path, max_size=1, timeout=5)
+    held = pool.acquire()
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+
+    waiter.start()
+    pool.release(held)
+    waiter.join(5)
+
+    assert acquired == [held]
+    stats = pool.stats()
+    assert stats["in_use"] == 1
+    assert stats["created"] == 1
+    pool.close()
+
+
+def test_close_rejects_checkouts_and_closes_returned_connections(pool):
+    conn = pool.acquire()
+    idle = pool.acquire()
+    pool.release(idle)
+
+    pool.close()
+
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    with pytest.raises(sqlite3.ProgrammingError):
+        idle.execute("SELECT 1")
+    pool.release(conn)
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+def test_nested_connection_blocks_share_one_checkout(app_db):
+    with connection() as outer:
+        with connection() as inner:
+            assert inner is outer
+        assert get_pool().stats()["in_use"] == 1
+    assert get_pool().stats()["in_use"] == 0
+
+
+def test_broken_connection_is_discarded(app_db):
+    with pytest.raises(sqlite3.DatabaseError):
+        with connection() as conn:
+            conn.close()
+            conn.execute("SELECT 1")
+
+    stats = get_pool().stats()
+    assert stats["idle"] == 0
+    assert stats["in_use"] == 0
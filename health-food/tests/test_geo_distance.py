@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.catalogue.geo_index import GeoGrid
+from app.geo import (
+    EQUIRECTANGULAR_MAX_KM,
+    EQUIRECTANGULAR_REL_ERROR,
+    bounding_box,
+    distances_km,
+    equirectangular_applies,
+    equirectangular_many,
+    haversine_km,
+    haversine_many,
+    lon_offset,
+)
+
+
+def points_around(lat: float, lon: float, max_km: float, count: int = 2000, seed: int = 0):
+    """Points at random bearings and distances up to max_km"""
+    rng = np.random.default_rng(seed)
+    bearing = rng.uniform(0, 2 * math.pi, count)
+    angular = rng.uniform(0, max_km, count) / 6371.0
+    phi, lam = math.radians(lat), math.radians(lon)
+    phi2 = np.arcsin(
+        math.sin(phi) * np.cos(angular) + math.cos(phi) * np.sin(angular) * np.cos(bearing)
+    )
+    lam2 = lam + np.arctan2(
+        np.sin(bearing) * np.sin(angular) * math.cos(phi),
+        np.cos(angular) - math.sin(phi) * np.sin(phi2),
+    )
+    return np.degrees(phi2), lon_offset(np.degrees(lam2), 0.0)
+
+
+def test_batched_haversine_matches_scalar():
+    lats, lons = points_around(55.75, 37.62, 5000.0)
+
+    batched = haversine_many(55.75, 37.62, lats, lons)
+    scalar = [haversine_km(55.75, 37.62, a, b) for a, b in zip(lats.tolist(), lons.tolist())]
+
+    np.testing.assert_allclose(batched, scalar, rtol=1e-12, atol=1e-9)
+
+
+@pytest.mark.parametrize("lat, lon", [(55.75, 37.62), (0.0, 179.99), (-60.0, -179.99), (69.0, 10.0)])
+def test_equirectangular_stays_within_documented_error(lat, lon):
+    reach = EQUIRECTANGULAR_MAX_KM if equirectangular_applies(lat, EQUIRECTANGULAR_MAX_KM) else 10.0
+    lats, lons = points_around(lat, lon, reach)
+
+    exact = haversine_many(lat, lon, lats, lons)
+    approx = equirectangular_many(lat, lon, lats, lons)
+
+    assert np.max(np.abs(approx - exact) / exact) < EQUIRECTANGULAR_REL_ERROR
+
+
+def test_fast_kernel_only_inside_envelope():
+    lats, lons = points_around(75.0, 0.0, 40.0)
+
+    # 75° is outside the envelope: haversine is used even when fast is asked for
+    assert not equirectangular_applies(75.0, 40.0)
+    np.testing.assert_array_equal(
+        distances_km(75.0, 0.0, lats, lons, 40.0, fast=True), haversine_many(75.0, 0.0, lats, lons)
+    )
+    assert not equirectangular_applies(55.75, EQUIRECTANGULAR_MAX_KM + 1)
+
+
+def test_fast_grid_query_differs_only_at_the_radius():
+    lats, lons = points_around(55.75, 37.62, 30.0, count=5000)
+    grid = GeoGrid(lats, lons, 0.05)
+
+    exact, _ = grid.query(55.75, 37.62, 20.0)
+    fast, distances = grid.query(55.75, 37.62, 20.0, fast=True)
+
+    differing = np.setxor1d(exact, fast)
+    boundary = haversine_many(55.75, 37.62, lats[differing], lons[differing])
+    assert np.all(np.abs(boundary - 20.0) <= 20.0 * EQUIRECTANGULAR_REL_ERROR)
+    assert np.all(distances <= 20.0)
+
+
+def test_bounding_box_contains_circle():
+    for lat, lon, radius in [(55.75, 37.62, 50.0), (-33.9, 151.2, 500.0), (10.0, 179.9, 300.0)]:
+        min_lat, max_lat, lon_delta = bounding_box(lat, lon, radius)
+        lats, lons = points_around(lat, lon, radius)
+        inside = haversine_many(lat, lon, lats, lons) <= radius
+
+        assert np.all((lats[inside] >= min_lat) & (lats[inside] <= max_lat))
+        assert np.all(np.abs(lon_offset(lons[inside], lon)) <= lon_delta)
+
+    # A circle around a pole spans every longitude
+    assert bounding_box(89.0, 0.0, 200.0)[2] is None
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from app.catalogue.geo_index import GeoGrid
+from app.catalogue.restaurants import RestaurantSnapshot
+from app.geo import haversine_many
+
+
+def random_points(seed: int, count: int = 3000):
+    rng = np.random.default_rng(seed)
+    # Half the points spread over the globe, half in a city, where cells are dense
+    lats = np.concatenate([
+        np.degrees(np.arcsin(rng.uniform(-1, 1, count // 2))),
+        55.75 + rng.uniform(-0.2, 0.2, count - count // 2),
+    ])
+    lons = np.concatenate([
+        rng.uniform(-180, 180, count // 2),
+        37.62 + rng.uniform(-0.3, 0.3, count - count // 2),
+    ])
+    return lats, lons
+
+
+def full_scan(lats, lons, lat, lon, radius_km):
+    distances = haversine_many(lat, lon, lats, lons)
+    positions = np.flatnonzero(distances <= radius_km)
+    return positions, distances[positions]
+
+
+QUERIES = [
+    (55.75, 37.62, 1.0),
+    (55.75, 37.62, 10.0),
+    (55.8, 37.5, 50.0),
+    (0.0, 0.0, 2000.0),
+    # Across the antimeridian and around the poles
+    (10.0, 179.9, 1500.0),
+    (-20.0, -179.95, 800.0),
+    (89.5, 0.0, 300.0),
+    (-89.9, 120.0, 1000.0),
+    (45.0, 90.0, 25000.0),
+    (55.75, 37.62, 0.0),
+]
+
+
+@pytest.mark.parametrize("cell_deg", [0.05, 0.5, 7.0])
+@pytest.mark.parametrize("lat, lon, radius_km", QUERIES)
+def test_grid_matches_full_haversine_scan(cell_deg, lat, lon, radius_km):
+    lats, lons = random_points(int(cell_deg * 100))
+    grid = GeoGrid(lats, lons, cell_deg)
+
+    positions, distances = grid.query(lat, lon, radius_km)
+    expected_positions, expected_distances = full_scan(lats, lons, lat, lon, radius_km)
+
+    np.testing.assert_array_equal(positions, expected_positions)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-12)
+
+
+def test_point_exactly_on_radius_is_included():
+    lats = np.array([55.75, 55.75])
+    lons = np.array([37.62, 37.72])
+    radius_km = float(haversine_many(55.75, 37.62, lats[1:], lons[1:])[0])
+
+    positions, _ = GeoGrid(lats, lons, 0.01).query(55.75, 37.62, radius_km)
+
+    assert positions.tolist() == [0, 1]
+
+
+def test_empty_grid_and_invalid_cell_size():
+    positions, distances = GeoGrid(np.empty(0), np.empty(0), 0.1).query(0.0, 0.0, 100.0)
+    assert positions.size == distances.size == 0
+
+    with pytest.raises(ValueError):
+        GeoGrid(np.empty(0), np.empty(0), 0.0)
+
+
+def test_snapshot_get_nearby_returns_copies_with_distance():
+    restaurants = [
+        {"id": "near", "name": "Near", "lat": 55.751, "lon": 37.62, "dishes": []},
+        {"id": "far", "name": "Far", "lat": 59.93, "lon": 30.33, "dishes": []},
+    ]
+    snapshot = RestaurantSnapshot(1, restaurants, cell_deg=0.1)
+
+    nearby = snapshot.get_nearby(55.75, 37.62, 10.0)
+
+    assert [r["id"] for r in nearby] == ["near"]
+    assert nearby[0]["distance_km"] == pytest.approx(0.111, abs=1e-3)
+    assert "distance_km" not in restaurants[0]
@@ -0,0 +1,118 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+
+from app.images import (
+    ImageTooLargeError,
+    UnsupportedImageError,
+    prepare_image,
+    read_upload,
+    sniff_image_format,
+)
+
+SETTINGS = {
+    "max_upload_bytes": 1024 * 1024,
+    "max_side": 2048,
+    "short_side": 768,
+    "format": "jpeg",
+    "quality": 85,
+}
+
+
+def encode(image: Image.Image, image_format: str, **params) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format=image_format, **params)
+    return output.getvalue()
+
+
+def gradient(width: int, height: int) -> Image.Image:
+    image = Image.new("RGB", (width, height))
+    image.putdata([
+        (x * 255 // width, y * 255 // height, (x + y) % 256)
+        for y in range(height) for x in range(width)
+    ])
+    return image
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG", "WEBP", "GIF"])
+def test_sniff_recognises_supported_formats(image_format):
+    assert sniff_image_format(encode(gradient(16, 16), image_format)) == image_format
+
+
+@pytest.mark.parametrize("data", [b"", b"RIFF\0\0\0\0WAVE", b"<svg xmlns=", b"%PDF-1.7", b"BM6\0"])
+def test_sniff_rejects_other_content(data):
+    assert sniff_image_format(data) is None
+
+
+def upload(data: bytes, size=None) -> UploadFile:
+    return UploadFile(io.BytesIO(data), size=size)
+
+
+def test_read_upload_returns_bytes_within_the_cap():
+    data = bytes(range(256)) * 1024
+    assert asyncio.run(read_upload(upload(data), len(data))) == data
+
+
+def test_read_upload_stops_past_the_cap():
+    # No declared size: the cap is enforced while reading, not after
+    file = upload(b"x" * (1024 * 1024))
+    with pytest.raises(ImageTooLargeError):
+        asyncio.run(read_upload(file, 100 * 1024))
+    assert file.file.tell() < 1024 * 1024
+
+
+def test_read_upload_trusts_declared_size():
+    file = upload(b"x", size=10_000)
+    with pytest.raises(ImageTooLargeError):
+        asyncio.run(read_upload(file, 1000))
+    assert file.file.tell() == 0
+
+
+def test_large_photo_is_downscaled_to_the_short_side():
+    data = encode(gradient(1600, 1200), "PNG")
+
+    prepared = prepare_image(data, SETTINGS)
+
+    assert (prepared.width, prepared.height) == (1024, 768)
+    assert prepared.mime_type == "image/jpeg"
+    assert sniff_image_format(prepared.data) == "JPEG"
+    assert prepared.original_bytes == len(data)
+
+
+def test_small_compact_image_is_kept_as_is():
+    data = encode(gradient(320, 240), "JPEG", quality=60, optimize=True)
+
+    prepared = prepare_image(data, SETTINGS)
+
+    assert prepared.data == data
+    assert (prepared.width, prepared.height) == (320, 240)
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90° clockwise
+    data = encode(gradient(64, 32), "JPEG", quality=40, exif=exif.tobytes())
+
+    prepared = prepare_image(data, SETTINGS)
+
+    assert (prepared.width, prepared.height) == (32, 64)
+    assert prepared.data != data
+
+
+def test_fingerprint_survives_rescaling():
+    image = gradient(400, 300)
+
+    original = prepare_image(encode(image, "PNG"), SETTINGS)
+    rescaled = prepare_image(encode(image.resize((200, 150)), "JPEG", quality=90), SETTINGS)
+
+    assert original.dhash == rescaled.dhash
+
+
+def test_corrupt_or_unknown_data_is_rejected():
+    with pytest.raises(UnsupportedImageError):
+        prepare_image(b"not an image", SETTINGS)
+    with pytest.raises(UnsupportedImageError):
+        prepare_image(encode(gradient(32, 32), "PNG")[:40], SETTINGS)
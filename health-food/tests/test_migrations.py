@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+from app import migrations
+from app.db import _connect
+from app.migrations import MIGRATIONS, find_unindexed_queries, get_schema_version, migrate
+
+
+@pytest.fixture
+def fresh_conn(tmp_path):
+    conn = _connect(str(tmp_path / "fresh.db"))
+    yield conn
+    conn.close()
+
+
+def applied(conn: sqlite3.Connection):
+    return [
+        (row[0], row[1])
+        for row in conn.execute("SELECT version, description FROM schema_version ORDER BY rowid")
+    ]
+
+
+def test_versions_are_contiguous():
+    assert [version for version, _, _ in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_fresh_database_applies_every_migration_in_order(fresh_conn):
+    assert migrate(fresh_conn) == MIGRATIONS[-1][0]
+
+    assert applied(fresh_conn) == [(version, description) for version, description, _ in MIGRATIONS]
+
+
+def test_migrate_is_idempotent(conn):
+    before = applied(conn)
+
+    assert migrate(conn) == MIGRATIONS[-1][0]
+    assert applied(conn) == before
+
+
+def test_pending_migrations_are_applied_after_current(fresh_conn, monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS[:4])
+    assert migrate(fresh_conn) == 4
+    monkeypatch.undo()
+
+    assert migrate(fresh_conn) == MIGRATIONS[-1][0]
+    assert [version for version, _ in applied(fresh_conn)] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_failed_migration_rolls_back_the_whole_run(conn, monkeypatch):
+    current = get_schema_version(conn)
+    broken = (current + 1, "broken", ["CREATE TABLE half_done (id INTEGER)", "SELECT * FROM missing"])
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS + [broken])
+
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn)
+
+    assert get_schema_version(conn) == current
+    assert conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'half_done'"
+    ).fetchone()[0] == 0
+
+
+def test_hot_queries_use_indexes(conn):
+    assert find_unindexed_queries(conn) == {}
+
+
+def test_full_scan_is_reported(conn, monkeypatch):
+    monkeypatch.setitem(
+        migrations.HOT_QUERIES, "users.by_goals", ("SELECT * FROM users WHERE goals = ?", ("x",))
+    )
+
+    unindexed = find_unindexed_queries(conn)
+
+    assert list(unindexed) == ["users.by_goals"]
+    assert unindexed["users.by_goals"][0].startswith("SCAN users")
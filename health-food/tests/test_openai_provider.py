@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from agents.models._openai_shared import get_default_openai_client
+
+from app.llm_provider import openai_provider
+from app.llm_provider.errors import LLMProviderError, LLMRateLimitError
+from app.llm_provider.openai_provider import OpenAIProvider
+
+
+def completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+@pytest.fixture
+def make_provider(monkeypatch):
+    """OpenAIProvider whose pooled transport answers with ``handler`` instead of the network"""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_CONNECT_TIMEOUT", "2.5")
+    requests = []
+
+    def build(handler):
+        def record(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return handler(request)
+
+        class MockedClient(httpx.AsyncClient):
+            def __init__(self, **kwargs):
+                super().__init__(transport=httpx.MockTransport(record), **kwargs)
+
+        monkeypatch.setattr(openai_provider.httpx, "AsyncClient", MockedClient)
+        return OpenAIProvider(), requests
+
+    return build
+
+
+def test_one_pooled_client_is_shared_with_agents(make_provider):
+    provider, _ = make_provider(lambda request: httpx.Response(500))
+
+    assert get_default_openai_client() is provider.client
+    assert provider.client.max_retries == 0
+    assert provider._http_client.timeout.connect == 2.5
+    asyncio.run(provider.aclose())
+    assert provider._http_client.is_closed
+
+
+def test_analyze_image_goes_through_async_client(make_provider):
+    items = ["овсянка", "яйца"]
+    provider, requests = make_provider(
+        lambda request: httpx.Response(
+            200, json=completion("```json" + json.dumps({"items": items}) + "```")
+        )
+    )
+
+    async def scenario():
+        try:
+            return await provider.analyze_image(b"\x89PNG", "What is in the fridge?", "image/png")
+        finally:
+            await provider.aclose()
+
+    assert asyncio.run(scenario()) == items
+    assert len(requests) == 1
+    body = json.loads(requests[0].content)
+    assert body["model"] == OpenAIProvider.VISION_MODEL
+    assert body["messages"][0]["content"][1]["image_url"]["url"].startswith("data:image/png;base64,")
+
+
+@pytest.mark.parametrize(
+    "status, headers, error_type, retryable, retry_after",
+    [
+        (429, {"retry-after": "3"}, LLMRateLimitError, True, 3.0),
+        (503, {}, LLMProviderError, True, None),
+        (400, {}, LLMProviderError, False, None),
+    ],
+)
+def test_http_errors_map_to_provider_errors(
+    make_provider, status, headers, error_type, retryable, retry_after
+):
+    provider, requests = make_provider(
+        lambda request: httpx.Response(status, headers=headers, json={"error": {"message": "no"}})
+    )
+
+    async def scenario():
+        try:
+            await provider.analyze_image(b"data", "prompt")
+        finally:
+            await provider.aclose()
+
+    with pytest.raises(error_type) as error:
+        asyncio.run(scenario())
+    assert error.value.retryable is retryable
+    assert error.value.retry_after == retry_after
+    # Retries belong to admission control, not to the SDK
+    assert len(requests) == 1
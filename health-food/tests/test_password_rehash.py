@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import crud, security
+from app.auth.router import router
+from app.auth.schemas import UserCreate
+from app.auth.security import PasswordHasher, PasswordHasherBusyError
+from app.db import _connect, get_write_queue
+
+# bcrypt's minimum cost keeps the tests fast
+ROUNDS = 4
+
+
+def stored_hash(db_path: str, user_id: int) -> str:
+    conn = _connect(db_path)
+    try:
+        return conn.execute("SELECT hashed_password FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def wait_for_writes() -> None:
+    get_write_queue().execute(lambda conn: None)
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=ROUNDS, workers=2, max_pending=4)
+    yield hasher
+    hasher.close()
+
+
+def test_hash_with_another_cost_is_upgraded(hasher):
+    old = PasswordHasher(rounds=ROUNDS + 1, workers=1, max_pending=0)
+    try:
+        old_hash = asyncio.run(old.hash("secret"))
+    finally:
+        old.close()
+
+    verified, new_hash = asyncio.run(hasher.verify_and_update("secret", old_hash))
+
+    assert verified
+    assert new_hash.startswith(f"$2b$0{ROUNDS}$")
+    assert asyncio.run(hasher.verify_and_update("secret", new_hash)) == (True, None)
+    assert asyncio.run(hasher.verify_and_update("wrong", old_hash)) == (False, None)
+    assert hasher.stats()["rehashed"] == 1
+
+
+def test_full_queue_fails_fast():
+    hasher = PasswordHasher(rounds=ROUNDS, workers=1, max_pending=0)
+
+    async def burst():
+        return await asyncio.gather(
+            hasher.hash("a"), hasher.hash("b"), return_exceptions=True
+        )
+
+    try:
+        first, second = asyncio.run(burst())
+    finally:
+        hasher.close()
+
+    assert first.startswith("$2b$")
+    assert isinstance(second, PasswordHasherBusyError)
+    assert hasher.stats()["rejected"] == 1
+
+
+def create_user(hashed_password: str) -> int:
+    user = UserCreate(username="alice", email="alice@example.com", password="secret")
+    return crud.user_crud.create_user(None, user, hashed_password=hashed_password).id
+
+
+def test_rehash_write_invalidates_cached_principal(app_db, monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(crud, "invalidate_principal", invalidated.append)
+    user_id = create_user("old-hash")
+
+    crud.user_crud.update_password_hash(user_id, "new-hash").result(5)
+
+    assert stored_hash(app_db, user_id) == "new-hash"
+    assert invalidated == [user_id]
+
+
+def test_failed_rehash_keeps_old_hash_and_principal(app_db, monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(crud, "invalidate_principal", invalidated.append)
+    user_id = create_user("old-hash")
+    get_write_queue().execute(lambda conn: conn.execute(
+        "CREATE TRIGGER no_updates BEFORE UPDATE ON users BEGIN SELECT RAISE(ABORT, 'read only'); END"
+    ))
+
+    future = crud.user_crud.update_password_hash(user_id, "new-hash")
+
+    with pytest.raises(Exception, match="read only"):
+        future.result(5)
+    assert stored_hash(app_db, user_id) == "old-hash"
+    assert invalidated == []
+
+
+def test_login_upgrades_stored_hash(app_db, monkeypatch, hasher):
+    old = PasswordHasher(rounds=ROUNDS + 1, workers=1, max_pending=0)
+    try:
+        user_id = create_user(asyncio.run(old.hash("secret")))
+    finally:
+        old.close()
+    monkeypatch.setattr(security, "_hasher", hasher)
+    app = FastAPI()
+    app.include_router(router)
+
+    with TestClient(app) as client:
+        rejected = client.post("/auth/token", data={"username": "alice", "password": "wrong"})
+        assert rejected.status_code == 401
+        wait_for_writes()
+        assert stored_hash(app_db, user_id).startswith(f"$2b$0{ROUNDS + 1}$")
+
+        response = client.post("/auth/token", data={"username": "alice", "password": "secret"})
+        assert response.status_code == 200
+        wait_for_writes()
+        upgraded = stored_hash(app_db, user_id)
+        assert upgraded.startswith(f"$2b$0{ROUNDS}$")
+
+        # The upgraded hash is not rewritten on the next login
+        assert client.post("/auth/token", data={"username": "alice", "password": "secret"}).status_code == 200
+        wait_for_writes()
+        assert stored_hash(app_db, user_id) == upgraded
+    assert hasher.stats()["rehashed"] == 1
@@ -0,0 +1,127 @@
+import asyncio
+import re
+import time
+
+import pytest
+
+from app.pipeline import Pipeline, Stage
+from app.services.generate_pipelines import GENERATE_PIPELINES
+
+
+def test_stages_receive_dependency_results():
+    events = []
+
+    async def fetch(ctx, tag):
+        events.append(f"{tag}:start")
+        await asyncio.sleep(0.02)
+        events.append(f"{tag}:end")
+        return tag
+
+    async def first(ctx):
+        return await fetch(ctx, "a")
+
+    async def second(ctx):
+        return await fetch(ctx, "b")
+
+    def combine(ctx, a, b):
+        events.append("combine")
+        return f"{ctx}:{a}{b}"
+
+    pipeline = Pipeline("test", [
+        Stage("a", first),
+        Stage("b", second),
+        Stage("combine", combine, deps=("a", "b")),
+    ])
+
+    run = asyncio.run(pipeline.run("ctx"))
+
+    assert run["combine"] == "ctx:ab"
+    # Independent stages overlap; the dependent one starts after both
+    assert events[:2] == ["a:start", "b:start"]
+    assert events[-1] == "combine"
+
+
+def test_blocking_stages_run_in_parallel_through_the_runner():
+    calls = []
+
+    async def runner(func, *args, **kwargs):
+        calls.append(func.__name__)
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    def slow_a(ctx):
+        time.sleep(0.1)
+        return 1
+
+    def slow_b(ctx):
+        time.sleep(0.1)
+        return 2
+
+    pipeline = Pipeline("test", run_blocking=runner)
+    pipeline.add(Stage("a", slow_a, blocking=True))
+    pipeline.add(Stage("b", slow_b, blocking=True))
+
+    started = time.perf_counter()
+    run = asyncio.run(pipeline.run(None))
+
+    assert time.perf_counter() - started < 0.18
+    assert sorted(calls) == ["slow_a", "slow_b"]
+    assert (run["a"], run["b"]) == (1, 2)
+
+
+def test_failure_cancels_running_stages():
+    cancelled = asyncio.Event()
+
+    async def slow(ctx):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def broken(ctx):
+        raise LookupError("no labs")
+
+    pipeline = Pipeline("test", [
+        Stage("slow", slow),
+        Stage("broken", broken),
+        Stage("after", lambda ctx, broken: broken, deps=("broken",)),
+    ])
+
+    async def scenario():
+        with pytest.raises(LookupError):
+            await pipeline.run(None)
+        return cancelled.is_set()
+
+    assert asyncio.run(scenario())
+
+
+def test_stage_declaration_is_validated():
+    pipeline = Pipeline("test", [Stage("a", lambda ctx: 1)])
+
+    with pytest.raises(ValueError, match="duplicate"):
+        pipeline.add(Stage("a", lambda ctx: 2))
+    with pytest.raises(ValueError, match="unknown"):
+        pipeline.add(Stage("b", lambda ctx, c: c, deps=("c",)))
+
+
+def test_server_timing_lists_stages_in_declaration_order():
+    async def slow(ctx):
+        await asyncio.sleep(0.02)
+
+    pipeline = Pipeline("test")
+    pipeline.stage("slow")(slow)
+    pipeline.stage("fast")(lambda ctx: None)
+
+    run = asyncio.run(pipeline.run(None))
+
+    header = run.server_timing()
+    assert re.fullmatch(r"slow;dur=\d+\.\d, fast;dur=\d+\.\d, total;dur=\d+\.\d", header)
+    assert run.timings["slow"] >= 20
+    assert run.total_ms >= run.timings["slow"]
+
+
+def test_generate_pipelines_expose_their_output_stage():
+    for mode, (pipeline, output_stage) in GENERATE_PIPELINES.items():
+        names = [stage.name for stage in pipeline.stages]
+        assert output_stage in names, mode
+        assert len(names) == len(set(names)), mode
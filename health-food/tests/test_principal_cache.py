@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from jose import jwt
+
+from app.auth import dependencies, security
+from app.auth.principal_cache import PrincipalCache
+from app.auth.schemas import UserInDB
+
+
+def user(user_id: int = 1, goals: str = "") -> UserInDB:
+    return UserInDB(
+        id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com",
+        goals=goals, hashed_password="hash",
+    )
+
+
+def test_put_after_invalidation_of_read_row_is_skipped():
+    cache = PrincipalCache(ttl=60, max_entries=10)
+
+    generation = cache.generation()
+    # The row is written and invalidated while the miss is reading it
+    cache.invalidate_user(1)
+    cache.put("token", user(), generation=generation)
+
+    assert cache.get("token") is None
+    assert cache.stats()["stale_puts"] == 1
+
+    cache.put("token", user(), generation=cache.generation())
+    assert cache.get("token") is not None
+
+
+def test_invalidate_drops_every_token_of_the_user():
+    cache = PrincipalCache(ttl=60, max_entries=10)
+    cache.put("first", user(1))
+    cache.put("second", user(1))
+    cache.put("other", user(2))
+
+    cache.invalidate_user(1)
+
+    assert cache.get("first") is None
+    assert cache.get("second") is None
+    assert cache.get("other") is not None
+
+
+def test_invalidation_history_is_bounded():
+    cache = PrincipalCache(ttl=60, max_entries=2)
+    generation = cache.generation()
+
+    for user_id in range(1, 101):
+        cache.invalidate_user(user_id)
+
+    assert len(cache._invalidated_at) == 2
+    # User 1's invalidation was pruned: an older read still counts as stale
+    cache.put("token", user(1), generation=generation)
+    assert cache.get("token") is None
+    cache.put("token", user(1), generation=cache.generation())
+    assert cache.get("token") is not None
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    cache = PrincipalCache(ttl=60, max_entries=10)
+    cache.put("token", user(), token_expires_at=time.time() + 5)
+
+    now = time.time()
+    monkeypatch.setattr("app.auth.principal_cache.time.time", lambda: now + 10)
+
+    assert cache.get("token") is None
+
+
+def test_concurrent_profile_write_keeps_old_row_uncached(monkeypatch):
+    cache = PrincipalCache(ttl=60, max_entries=10)
+    monkeypatch.setattr(dependencies, "get_principal_cache", lambda: cache)
+    token = jwt.encode(
+        {"sub": "user1", "exp": int(time.time()) + 60},
+        security.SECRET_KEY, algorithm=security.ALGORITHM,
+    )
+
+    async def read_during_write(fn, **kwargs):
+        # The profile endpoint commits and invalidates before the read returns
+        cache.invalidate_user(1)
+        return user(goals="old")
+
+    async def read_after_write(fn, **kwargs):
+        return user(goals="new")
+
+    monkeypatch.setattr(dependencies, "run_with_conn", read_during_write)
+    assert asyncio.run(dependencies.get_current_user(token)).goals == "old"
+    assert cache.get(token) is None
+
+    monkeypatch.setattr(dependencies, "run_with_conn", read_after_write)
+    assert asyncio.run(dependencies.get_current_user(token)).goals == "new"
+    assert cache.get(token).goals == "new"
@@ -0,0 +1,162 @@
+import random
+from itertools import islice
+from typing import FrozenSet, NamedTuple
+
+import pytest
+
+from app.catalogue.index import RecipeIndex
+
+TAGS = ["iron", "b12", "folate", "omega3", "vegan", "quick"]
+NUTRIENTS = ["iron", "fiber", "protein", "calcium", "omega3"]
+INGREDIENTS = [f"ingredient {i}" for i in range(12)]
+PANTRY = frozenset(INGREDIENTS[:2])
+
+
+class Entry(NamedTuple):
+    ingredients: FrozenSet[str]
+    tags: FrozenSet[str]
+    nutrients: FrozenSet[str]
+
+
+def make_entries(seed: int, count: int = 300):
+    rng = random.Random(seed)
+    return [
+        Entry(
+            frozenset(rng.sample(INGREDIENTS, rng.randint(1, 5))),
+            frozenset(rng.sample(TAGS, rng.randint(0, 3))),
+            frozenset(rng.sample(NUTRIENTS, rng.randint(0, 3))),
+        )
+        for _ in range(count)
+    ]
+
+
+def make_terms(seed: int):
+    rng = random.Random(seed)
+    terms = [(("tag", tag), rng.choice([1.5, 2.0, 3.0])) for tag in rng.sample(TAGS, 3)]
+    terms += [(("nutrient", n), rng.choice([0.5, 1.0])) for n in rng.sample(NUTRIENTS, 2)]
+    # A repeated term adds its weight twice, like a nutrient shared by two deficits
+    terms.append(terms[-1])
+    return terms
+
+
+def base_class(entry: Entry) -> int:
+    return len(entry.ingredients) % 3
+
+
+def combine(value: float, key: int) -> float:
+    return value + 0.5 * key
+
+
+def brute_force(entries, terms, available=frozenset(), overlap_weight=0.0,
+                pantry=None, max_missing=0):
+    """Every recipe scored with the same additions in the same order, stably sorted"""
+    scored = []
+    for pos, entry in enumerate(entries):
+        if pantry is not None and len(entry.ingredients - available - pantry) > max_missing:
+            continue
+        value = 0.0
+        for (kind, name), weight in terms:
+            if name in (entry.tags if kind == "tag" else entry.nutrients):
+                value += weight
+        overlap = len(entry.ingredients & available)
+        if overlap:
+            value += overlap * overlap_weight
+        scored.append((pos, combine(value, base_class(entry))))
+    scored.sort(key=lambda item: -item[1])
+    return scored
+
+
+def search(index, terms, **kwargs):
+    classes = index.classes("test", base_class)
+    return index.search(terms, classes, combine, **kwargs)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_full_order_matches_brute_force(seed):
+    entries = make_entries(seed)
+    terms = make_terms(seed)
+
+    assert list(search(RecipeIndex(entries), terms)) == brute_force(entries, terms)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_available_ingredients_and_missing_filter(seed):
+    entries = make_entries(seed)
+    terms = make_terms(seed)
+    available = frozenset(random.Random(seed).sample(INGREDIENTS, 5))
+    index = RecipeIndex(entries)
+
+    assert list(search(index, terms, available=set(available), overlap_weight=0.3)) == (
+        brute_force(entries, terms, available, 0.3)
+    )
+    assert list(search(
+        index, terms, available=set(available), overlap_weight=0.3,
+        pantry=PANTRY, max_missing=1,
+    )) == brute_force(entries, terms, available, 0.3, PANTRY, 1)
+
+
+@pytest.mark.parametrize("k", [0, 1, 5, 17, 299, 300, 1000])
+def test_top_k_is_prefix_of_full_order(k):
+    entries = make_entries(7)
+    terms = make_terms(7)
+
+    top = list(islice(search(RecipeIndex(entries), terms), k))
+
+    assert top == brute_force(entries, terms)[:k]
+
+
+def test_ties_are_broken_by_position():
+    same = Entry(frozenset(["a"]), frozenset(["iron"]), frozenset())
+    other = Entry(frozenset(["b"]), frozenset(), frozenset())
+    entries = [other, same, other, same, same, other]
+
+    result = list(search(RecipeIndex(entries), [(("tag", "iron"), 1.0)]))
+
+    assert [pos for pos, _ in result] == [1, 3, 4, 0, 2, 5]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_exclude_tag_drops_only_later_results(seed):
+    entries = make_entries(seed)
+    terms = make_terms(seed)
+    ranked = search(RecipeIndex(entries), terms)
+    expected = brute_force(entries, terms)
+
+    results = iter(ranked)
+    head = list(islice(results, 3))
+    ranked.exclude_tag("iron")
+    ranked.exclude_tag("vegan")
+    tail = list(results)
+
+    assert head == expected[:3]
+    assert tail == [
+        (pos, score) for pos, score in expected[3:]
+        if not entries[pos].tags & {"iron", "vegan"}
+    ]
+
+
+def test_exclude_every_recipe_ends_search():
+    entries = make_entries(3)
+    ranked = search(RecipeIndex(entries), make_terms(3))
+
+    results = iter(ranked)
+    next(results)
+    for tag in TAGS:
+        ranked.exclude_tag(tag)
+
+    assert all(not entries[pos].tags for pos, _ in results)
+
+
+def test_empty_postings():
+    entries = make_entries(1)
+    index = RecipeIndex(entries)
+    unknown = [(("tag", "unknown"), 5.0), (("nutrient", "unknown"), 1.0)]
+
+    # Unknown terms add nothing: the order is by base class, then position
+    assert list(search(index, unknown)) == brute_force(entries, unknown)
+    assert list(search(index, [])) == brute_force(entries, [])
+    assert list(search(RecipeIndex([]), unknown)) == []
+    # No recipe has every ingredient within reach: nothing is allowed
+    assert list(search(
+        index, unknown, available={"unknown"}, pantry=frozenset(), max_missing=0,
+    )) == []
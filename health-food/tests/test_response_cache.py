@@ -0,0 +1,124 @@
+import pytest
+
+from app.db import get_write_queue
+from app.llm_provider import cache as cache_module
+from app.llm_provider.cache import (
+    ResponseCache,
+    canonical_recipe_context,
+    canonical_value,
+    context_key,
+    lab_band,
+)
+
+
+@pytest.mark.parametrize(
+    "marker, value, band",
+    [
+        ("ferritin", 80, 0),
+        ("ferritin", "29.9", -1),
+        ("ferritin", 14, -2),
+        ("ferritin", 30, 0),
+        ("hba1c", 5.7, 1),
+        ("hba1c", 7.0, 2),
+        ("crp", 0.5, 0),
+    ],
+)
+def test_lab_band_of_known_markers(marker, value, band):
+    assert lab_band(marker, value) == band
+
+
+def test_lab_band_of_other_values():
+    # Two significant digits for markers without rules
+    assert lab_band("tsh", 2.345) == lab_band("tsh", 2.34) == 2.3
+    assert lab_band("glucose", 101) == 100
+    assert lab_band("tsh", 0) == 0.0
+    assert lab_band("tsh", float("nan")) is None
+    assert lab_band("tsh", " High ") == "high"
+
+
+def test_canonical_value_ignores_order_case_and_duplicates():
+    first = {"Diet": "Vegan ", "allergies": ["Nuts", "ёжевика", "nuts"], "budget": 500.0}
+    second = {"diet": "vegan", "Allergies": ["ежевика", "NUTS"], "budget": 500}
+
+    assert canonical_value(first) == canonical_value(second)
+    assert canonical_value(first) == {
+        "diet": "vegan", "allergies": ["nuts", "ежевика"], "budget": 500,
+    }
+
+
+def test_equivalent_recipe_contexts_share_a_key():
+    first = {"labs": {"Ferritin": 22, "b12": 450}, "preferences": ["Fish", "quick"]}
+    second = {"labs": {"ferritin": "25.5", "B12": 900}, "preferences": ["QUICK", "fish"]}
+    different = {"labs": {"ferritin": 12, "b12": 450}, "preferences": ["fish", "quick"]}
+
+    key = context_key("recipes", canonical_recipe_context(first))
+
+    assert key == context_key("recipes", canonical_recipe_context(second))
+    assert key != context_key("recipes", canonical_recipe_context(different))
+    assert key != context_key("consultation", canonical_recipe_context(first))
+    # Fixed across processes and releases: a persistent entry must stay reachable
+    assert key == context_key("recipes", {"labs": {"b12": 0, "ferritin": -1}, "preferences": ["fish", "quick"]})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache("test", ttl=60, max_entries=10)
+    cache.set("key", {"recipes": [1]})
+
+    clock.now += 59
+    assert cache.get("key") == {"recipes": [1]}
+    clock.now += 2
+    assert cache.get("key") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResponseCache("test", ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_hits_are_private_copies(clock):
+    cache = ResponseCache("test", ttl=60, max_entries=2)
+    cache.set("key", {"items": ["oats"]})
+
+    cache.get("key")["items"].append("eggs")
+
+    assert cache.get("key") == {"items": ["oats"]}
+
+
+def test_persistent_tier_survives_a_new_instance(app_db, clock):
+    ResponseCache("test", ttl=60, max_entries=2, persistent=True).set("key", {"v": 1})
+    # The persistent write goes through the queue: wait until it is applied
+    get_write_queue().execute(lambda writer: None)
+
+    restarted = ResponseCache("test", ttl=60, max_entries=2, persistent=True)
+    assert restarted.get("key") == {"v": 1}
+    assert restarted.stats()["persistent_hits"] == 1
+
+    clock.now += 61
+    assert ResponseCache("test", ttl=60, max_entries=2, persistent=True).get("key") is None
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from app.catalogue.recipes import CatalogueSnapshot
+from app.catalogue.restaurants import RestaurantSnapshot
+from app.services.recipe_service import RecipeService
+from app.services.restaurant_service import RestaurantService
+from benchmarks.scoring import (
+    INGREDIENTS,
+    StaticCatalogue,
+    StaticRestaurants,
+    make_deficits,
+    make_recipes,
+    make_restaurants,
+)
+
+
+@pytest.fixture(scope="module")
+def catalogues():
+    rng = random.Random(7)
+    recipes = StaticCatalogue(CatalogueSnapshot(1, make_recipes(rng, 3000)))
+    restaurants = StaticRestaurants(RestaurantSnapshot(1, make_restaurants(rng, 3000)))
+    return recipes, restaurants
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_engines_return_identical_results(catalogues, seed):
+    recipes, restaurants = catalogues
+    rng = random.Random(seed)
+    deficits = make_deficits(rng)
+    available = rng.sample(INGREDIENTS, rng.randint(3, 40)) if seed % 2 else None
+    days = rng.randint(1, 14)
+    location = {"lat": 55.75 + rng.uniform(-0.05, 0.05), "lon": 37.62}
+
+    plans = [
+        RecipeService(None, recipes, engine=engine)
+        .select_recipes_for_plan(deficits, None, available, days)
+        for engine in ("python", "numpy")
+    ]
+    dishes = [
+        RestaurantService(restaurants, engine=engine, catalogue=restaurants)
+        .find_best_dishes(deficits, location, 10.0, 20)
+        for engine in ("python", "numpy")
+    ]
+
+    assert plans[0] and plans[0] == plans[1]
+    assert dishes[0] and dishes[0] == dishes[1]
+
+
+def test_auto_engine_picks_index_for_recipes_and_numpy_for_dishes(monkeypatch):
+    monkeypatch.delenv("SCORING_ENGINE", raising=False)
+
+    assert RecipeService(None, StaticCatalogue(None)).engine == "python"
+    assert RestaurantService(None).engine == "numpy"
+
+
+def test_unknown_engine_is_rejected(monkeypatch):
+    monkeypatch.setenv("SCORING_ENGINE", "fortran")
+
+    with pytest.raises(ValueError):
+        RecipeService(None, StaticCatalogue(None))
@@ -0,0 +1,57 @@
+import sqlite3
+
+from app import recipe_utils
+from app.db import _seed_data
+
+
+def manifest(conn: sqlite3.Connection):
+    return dict(conn.execute("SELECT source, content_hash FROM seed_manifest").fetchall())
+
+
+def versions(conn: sqlite3.Connection):
+    return dict(conn.execute("SELECT name, version FROM catalogue_version").fetchall())
+
+
+def count(conn: sqlite3.Connection, table: str) -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_first_run_seeds_every_source(conn):
+    _seed_data(conn)
+
+    assert set(manifest(conn)) == {"recipes", "restaurants", "biomarker_rules"}
+    assert count(conn, "recipes") == len(recipe_utils.RECIPE_DB)
+    assert count(conn, "dishes") > 0
+    assert count(conn, "biomarker_rules") > 0
+
+
+def test_unchanged_manifest_is_a_no_op(conn):
+    _seed_data(conn)
+    before = (manifest(conn), versions(conn))
+    changes = conn.total_changes
+
+    _seed_data(conn)
+
+    assert conn.total_changes == changes
+    assert not conn.in_transaction
+    assert (manifest(conn), versions(conn)) == before
+
+
+def test_only_changed_source_is_reseeded(conn, monkeypatch):
+    _seed_data(conn)
+    before_manifest = manifest(conn)
+    before_versions = versions(conn)
+
+    recipes = [dict(recipe) for recipe in recipe_utils.RECIPE_DB]
+    recipes[0]["name"] = "Renamed seed recipe"
+    monkeypatch.setattr(recipe_utils, "RECIPE_DB", recipes)
+    _seed_data(conn)
+
+    after = manifest(conn)
+    assert after["recipes"] != before_manifest["recipes"]
+    assert after["restaurants"] == before_manifest["restaurants"]
+    assert versions(conn)["recipes"] > before_versions["recipes"]
+    assert versions(conn)["restaurants"] == before_versions["restaurants"]
+    assert conn.execute(
+        "SELECT name FROM recipes WHERE id = ?", (recipes[0]["id"],)
+    ).fetchone()[0] == "Renamed seed recipe"
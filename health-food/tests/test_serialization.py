@@ -0,0 +1,85 @@
+import datetime
+import uuid
+
+import numpy as np
+import pytest
+
+from app import serialization
+from app.serialization import JSONResponse, JSONSerializer, OrjsonSerializer
+
+pytestmark = pytest.mark.skipif(serialization.orjson is None, reason="orjson is not installed")
+
+PAYLOADS = [
+    {"name": "Салат с ёжиком", "emoji": "🥗", "quote": 'say "hi"\n\t\\'},
+    {"nested": [{"a": [1, 2.5, None, True, False]}, []], "empty": {}},
+    [0, -1, 2**53, 0.1, -0.0, 1e-7, 1.3e-6, 2.1e13, 1e16, 123456789012345.6],
+    {1: "int key", 1.5: "float key", None: "null key", True: "bool key"},
+    {
+        "datetime": datetime.datetime(2024, 1, 2, 3, 4, 5, 678),
+        "aware": datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc),
+        "date": datetime.date(2024, 1, 2),
+        "time": datetime.time(1, 2, 3),
+        "uuid": uuid.UUID(int=1),
+    },
+    {
+        "score": np.float64(0.1),
+        "float32": np.float32(0.1),
+        "count": np.int64(5),
+        "flag": np.bool_(True),
+        "ids": np.arange(3),
+        "matrix": np.array([[0.5, 1.0], [0.1, 3.4e38]], dtype=np.float32),
+    },
+]
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_backends_decode_to_the_same_values(payload):
+    stdlib, fast = JSONSerializer(), OrjsonSerializer()
+
+    encoded = stdlib.dumpb(payload)
+
+    assert stdlib.loads(encoded) == fast.loads(fast.dumpb(payload))
+    assert fast.loads(encoded) == stdlib.loads(encoded)
+    assert stdlib.dumps(payload) == encoded.decode("utf-8")
+    # Non-ASCII text is written as is, not escaped
+    assert b"\\u" not in encoded
+
+
+def test_float32_uses_the_shortest_repr():
+    values = np.random.default_rng(0).standard_normal(2000).astype(np.float32) * 1e5
+
+    stdlib = JSONSerializer().loads(JSONSerializer().dumps({"scalar": values[0], "array": values}))
+    fast = OrjsonSerializer().loads(OrjsonSerializer().dumps({"scalar": values[0], "array": values}))
+
+    assert stdlib == fast
+    assert JSONSerializer().dumps(np.float32(0.1)) == "0.1"
+
+
+def test_unsupported_types_raise_type_error():
+    for serializer in (JSONSerializer(), OrjsonSerializer()):
+        with pytest.raises(TypeError):
+            serializer.dumps({"value": object()})
+
+
+def test_non_finite_floats():
+    with pytest.raises(ValueError):
+        JSONSerializer().dumps([float("nan")])
+    assert OrjsonSerializer().dumps([float("nan"), float("inf")]) == "[null,null]"
+
+
+@pytest.fixture
+def backend():
+    yield serialization.set_serializer
+    serialization.set_serializer("auto")
+
+
+@pytest.mark.parametrize("name", ["json", "orjson"])
+def test_response_renders_through_the_configured_backend(backend, name):
+    backend(name)
+    payload = {"recipes": [{"name": "Омлет", "score": np.float64(0.75)}]}
+
+    response = JSONResponse(payload)
+
+    assert serialization.get_serializer_stats()["backend"] == name
+    assert serialization.loads(response.body) == {"recipes": [{"name": "Омлет", "score": 0.75}]}
+    assert response.headers["content-type"] == "application/json"
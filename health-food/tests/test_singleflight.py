@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_task():
+    flight = SingleFlight()
+    calls = 0
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"value": 42}
+
+        waiters = [asyncio.create_task(flight.do("key", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(scenario())
+
+    assert calls == 1
+    assert results[0] is results[1] is results[2]
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "deduplicated": 2, "cancelled": 0}
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.do("key", failing), flight.do("key", failing), return_exceptions=True
+        )
+
+    errors = asyncio.run(scenario())
+
+    assert [type(error) for error in errors] == [ValueError, ValueError]
+    assert asyncio.run(flight.do("key", lambda: asyncio.sleep(0, "fresh"))) == "fresh"
+
+
+def test_cancelled_waiter_does_not_cancel_shared_task():
+    flight = SingleFlight()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "value"
+
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "value"
+    assert flight.stats()["cancelled"] == 0
+
+
+def test_task_is_cancelled_when_nobody_waits():
+    flight = SingleFlight()
+    cancelled = False
+
+    async def scenario():
+        nonlocal cancelled
+
+        async def fetch():
+            nonlocal cancelled
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+
+        waiter = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert cancelled
+    assert flight.stats()["in_flight"] == 0
+    assert flight.stats()["cancelled"] == 1
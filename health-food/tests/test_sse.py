@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from app.sse import HEARTBEAT, format_event, text_event_stream
+
+
+class FakeRequest:
+    def __init__(self, disconnected: bool = False):
+        self.disconnected = disconnected
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+class Upstream:
+    """Async chunk iterator that records whether it was closed"""
+
+    def __init__(self, chunks, delay: float = 0.0, error: Exception = None):
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.error = error
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        await asyncio.sleep(self.delay)
+        if self.chunks:
+            return self.chunks.pop(0)
+        if self.error is not None:
+            raise self.error
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        self.closed = True
+
+
+def parse(frame: str):
+    lines = frame.rstrip("\n").split("\n")
+    assert frame.endswith("\n\n")
+    assert lines[0].startswith("event: ") and lines[1].startswith("data: ")
+    return lines[0][len("event: "):], json.loads(lines[1][len("data: "):])
+
+
+def collect(upstream, request=None, heartbeat: float = 5.0):
+    async def run():
+        stream = text_event_stream(
+            upstream,
+            request or FakeRequest(),
+            {"thread_id": "t1"},
+            lambda e: {"error": str(e)},
+            heartbeat=heartbeat,
+        )
+        return [frame async for frame in stream]
+
+    return asyncio.run(run())
+
+
+def test_format_event_escapes_newlines_into_one_data_line():
+    frame = format_event("delta", {"text": "line one\nline two"})
+
+    assert parse(frame) == ("delta", {"text": "line one\nline two"})
+
+
+def test_chunks_are_framed_between_start_and_done():
+    upstream = Upstream(["Hel", "lo"])
+
+    frames = [parse(frame) for frame in collect(upstream)]
+
+    assert frames == [
+        ("start", {"thread_id": "t1"}),
+        ("delta", {"text": "Hel"}),
+        ("delta", {"text": "lo"}),
+        ("done", {"thread_id": "t1", "reply": "Hello"}),
+    ]
+    assert upstream.closed
+
+
+def test_upstream_failure_ends_with_error_event():
+    upstream = Upstream(["partial"], error=RuntimeError("boom"))
+
+    frames = [parse(frame) for frame in collect(upstream)]
+
+    assert [event for event, _ in frames] == ["start", "delta", "error"]
+    assert frames[-1][1] == {"error": "boom"}
+    assert upstream.closed
+
+
+def test_heartbeat_is_sent_while_waiting_for_a_chunk():
+    frames = collect(Upstream(["slow"], delay=0.05), heartbeat=0.01)
+
+    assert HEARTBEAT in frames
+    assert parse(frames[0])[0] == "start"
+    assert [parse(f)[0] for f in frames if f != HEARTBEAT] == ["start", "delta", "done"]
+
+
+def test_disconnect_stops_the_stream_and_closes_upstream():
+    upstream = Upstream(["never"], delay=10.0)
+
+    frames = collect(upstream, FakeRequest(disconnected=True), heartbeat=0.01)
+
+    assert [parse(frame)[0] for frame in frames] == ["start"]
+    assert upstream.closed
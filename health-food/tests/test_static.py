@@ -0,0 +1,100 @@
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from app.compression import brotli
+from app.static import PrecompressedStaticFiles, is_hashed_asset, precompress_directory
+
+SCRIPT = "export const recipes = " + repr([f"recipe {i}" for i in range(500)]) + ";\n"
+PAGE = "<!doctype html><title>Health food</title>" + "<p>Овсянка</p>" * 200
+
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / "app-BdQq_4o2.js").write_text(SCRIPT)
+    (tmp_path / "index.html").write_text(PAGE)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + bytes(4096))
+    (tmp_path / "tiny.css").write_text("a{}")
+    precompress_directory(str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def client(assets):
+    app = Starlette(routes=[
+        Mount("/assets", PrecompressedStaticFiles(directory=str(assets), immutable_max_age=600)),
+    ])
+    return TestClient(app)
+
+
+def test_precompress_writes_only_useful_variants(assets):
+    names = sorted(os.listdir(assets))
+
+    assert "app-BdQq_4o2.js.gz" in names
+    assert "index.html.gz" in names
+    assert not any(name.startswith(("logo.png.", "tiny.css.")) for name in names)
+    # A second run finds every variant up to date
+    stats = precompress_directory(str(assets))
+    assert stats["written"] == 0
+    assert stats["fresh"] == stats["files"] * (2 if brotli is not None else 1)
+
+
+@pytest.mark.parametrize(
+    "accept, encoding",
+    [("gzip", "gzip"), ("identity", None)] + ([("gzip, br", "br")] if brotli is not None else []),
+)
+def test_variant_is_negotiated(client, accept, encoding):
+    response = client.get("/assets/app-BdQq_4o2.js", headers={"Accept-Encoding": accept})
+
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["content-type"].startswith(("text/javascript", "application/javascript"))
+    assert response.text == SCRIPT
+
+
+def test_cache_control_depends_on_hashed_name(client):
+    hashed = client.get("/assets/app-BdQq_4o2.js", headers={"Accept-Encoding": "gzip"})
+    page = client.get("/assets/index.html", headers={"Accept-Encoding": "gzip"})
+
+    assert hashed.headers["cache-control"] == "public, max-age=600, immutable"
+    assert page.headers["cache-control"] == "no-cache"
+    assert is_hashed_asset("index-BdQq_4o2.css")
+    assert not is_hashed_asset("index.html")
+
+
+def test_matching_etag_gets_304_per_variant(client):
+    gzipped = client.get("/assets/index.html", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/assets/index.html", headers={"Accept-Encoding": "identity"})
+    assert gzipped.headers["etag"] != plain.headers["etag"]
+
+    revalidated = client.get(
+        "/assets/index.html",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["etag"]},
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == gzipped.headers["etag"]
+    assert revalidated.headers["cache-control"] == "no-cache"
+
+    # The identity ETag does not validate the gzip variant
+    mismatched = client.get(
+        "/assets/index.html",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]},
+    )
+    assert mismatched.status_code == 200
+
+
+def test_stale_variant_is_ignored(assets, client):
+    path = assets / "index.html"
+    path.write_text(PAGE + "<p>new</p>")
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    response = client.get("/assets/index.html", headers={"Accept-Encoding": "gzip, br"})
+
+    assert "content-encoding" not in response.headers
+    assert response.text == PAGE + "<p>new</p>"
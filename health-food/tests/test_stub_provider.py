@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.llm_provider.base import ConversationHistory
+from app.llm_provider.errors import LLMProviderError, LLMRateLimitError
+from app.llm_provider.stub_provider import StubLLMProvider
+
+SETTINGS = {
+    "latency_ms": 0.0,
+    "jitter_ms": 0.0,
+    "distribution": "fixed",
+    "chunk_ms": 0.0,
+    "failure_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "retry_after": 1.0,
+    "seed": 0,
+}
+
+CONTEXT = {
+    "labs": {"ferritin": 12, "vitamin_d": 18},
+    "preferences": {"available": ["яйца", "шпинат", "гречка", "лосось"]},
+    "difficulty": "средний",
+}
+
+
+def provider(**overrides) -> StubLLMProvider:
+    return StubLLMProvider(SETTINGS, **overrides)
+
+
+def test_outputs_depend_only_on_the_request():
+    first = asyncio.run(provider(seed=1).generate_recipes(CONTEXT))
+    second = asyncio.run(provider(seed=2).generate_recipes(dict(CONTEXT)))
+    other = asyncio.run(provider(seed=1).generate_recipes({**CONTEXT, "difficulty": "легкий"}))
+
+    assert first == second
+    assert first != other
+    assert all(30 <= recipe["time_min"] <= 60 for recipe in first)
+    assert all(
+        ingredient["name"] in CONTEXT["preferences"]["available"]
+        for recipe in first for ingredient in recipe["ingredients"]
+    )
+
+
+def test_same_image_gives_same_products():
+    stub = provider()
+
+    first = asyncio.run(stub.analyze_image(b"photo", "prompt"))
+
+    assert asyncio.run(stub.analyze_image(b"photo", "another prompt")) == first
+    assert asyncio.run(stub.analyze_image(b"other photo", "prompt")) != first
+    assert 5 <= len(first) <= 9
+
+
+def test_stream_matches_the_full_reply():
+    stub = provider()
+    history = ConversationHistory("earlier", [{"role": "user", "content": "hi"}])
+
+    async def stream():
+        return [
+            chunk async for chunk in stub.stream_vitamin_recommendations(
+                "Что есть?", "t1", CONTEXT, history
+            )
+        ]
+
+    chunks = asyncio.run(stream())
+    result = asyncio.run(stub.get_vitamin_recommendations("Что есть?", "t1", CONTEXT, history))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == result["reply"]
+    assert result["thread_id"] == "t1"
+
+
+def test_injected_errors():
+    with pytest.raises(LLMRateLimitError) as error:
+        asyncio.run(provider(rate_limit_rate=1.0, retry_after=2.5).generate_recipes(CONTEXT))
+    assert error.value.retry_after == 2.5
+
+    with pytest.raises(LLMProviderError) as error:
+        asyncio.run(provider(failure_rate=1.0).generate_recipes(CONTEXT))
+    assert error.value.retryable
+
+
+def test_failures_and_latency_are_reproducible_for_a_seed():
+    def outcomes(seed: int):
+        stub = provider(seed=seed, failure_rate=0.5, distribution="lognormal", latency_ms=1.0)
+        results = []
+        for _ in range(30):
+            try:
+                asyncio.run(stub.analyze_image(b"photo", "prompt"))
+                results.append("ok")
+            except LLMProviderError:
+                results.append("error")
+        return results
+
+    first = outcomes(7)
+
+    assert first == outcomes(7)
+    assert {"ok", "error"} <= set(first)
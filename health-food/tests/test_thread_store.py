@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+from app.db import get_write_queue
+from app.repositories.thread_repository import ThreadRepository
+from app.services.thread_store import Thread, ThreadStore, estimate_tokens
+
+
+def turn(seq: int, role: str, content: str):
+    return {"seq": seq, "role": role, "content": content, "tokens": estimate_tokens(content)}
+
+
+def conversation(pairs: int):
+    turns = []
+    for n in range(pairs):
+        turns.append(turn(2 * n + 1, "user", f"Question {n}: " + "how much iron " * 5))
+        turns.append(turn(2 * n + 2, "assistant", f"Answer {n}. " + "Lentils and spinach. " * 5))
+    return Thread("thr_test", {}, turns=turns, last_seq=2 * pairs)
+
+
+def test_compaction_keeps_history_within_budget():
+    store = ThreadStore(history_token_budget=100, summary_token_budget=1000, cache_size=4)
+    thread = conversation(6)
+
+    store._compact(thread)
+
+    assert thread.tokens() <= 100
+    assert thread.turns[-1]["seq"] == 12
+    assert thread.summarized_seq == thread.turns[0]["seq"] - 1
+    assert "- Вопрос: Question 0:" in thread.summary
+    # Only the first sentence of a folded answer is kept
+    assert "  Ответ: Answer 0." in thread.summary.split("\n")
+    assert store.stats()["compactions"] == 1
+
+
+def test_last_pair_is_kept_over_budget():
+    store = ThreadStore(history_token_budget=1, summary_token_budget=1000, cache_size=4)
+    thread = conversation(3)
+
+    store._compact(thread)
+
+    assert [t["seq"] for t in thread.turns] == [5, 6]
+    assert thread.summarized_seq == 4
+
+
+def test_summary_drops_oldest_lines_over_budget():
+    store = ThreadStore(history_token_budget=1, summary_token_budget=40, cache_size=4)
+    thread = conversation(6)
+
+    store._compact(thread)
+
+    assert estimate_tokens(thread.summary) <= 40
+    assert "Question 0" not in thread.summary
+    assert "Question 4" in thread.summary
+
+
+def test_history_within_budget_is_untouched():
+    store = ThreadStore(history_token_budget=10_000, summary_token_budget=1000, cache_size=4)
+    thread = conversation(2)
+
+    store._compact(thread)
+
+    assert len(thread.turns) == 4
+    assert thread.summary == ""
+    assert store.stats()["compactions"] == 0
+
+
+def stored_thread(owner, context=None) -> str:
+    """A thread with one exchange, committed to the database"""
+    store = ThreadStore(cache_size=4)
+    thread = store.create(context or {"deficits": ["iron"]}, owner)
+    asyncio.run(store.append(thread, "How much iron?", "About 18 mg a day."))
+    return thread.id
+
+
+def set_updated_at(conn, thread_id: str, updated_at: float) -> None:
+    conn.execute(
+        "UPDATE conversation_threads SET updated_at = ? WHERE id = ?", (updated_at, thread_id)
+    )
+    conn.commit()
+
+
+def test_owner_continues_thread_from_database(app_db):
+    thread_id = stored_thread("ip:1.2.3.4")
+    store = ThreadStore(cache_size=4)
+
+    thread = asyncio.run(store.get(thread_id, "ip:1.2.3.4"))
+
+    assert thread.owner == "ip:1.2.3.4"
+    assert thread.context == {"deficits": ["iron"]}
+    assert [turn["content"] for turn in thread.turns] == ["How much iron?", "About 18 mg a day."]
+    assert store.stats()["loads"] == 1
+
+
+def test_foreign_thread_is_not_continued(app_db):
+    thread_id = stored_thread("ip:1.2.3.4")
+    store = ThreadStore(cache_size=4)
+
+    assert asyncio.run(store.get(thread_id, "ip:5.6.7.8")) is None
+    opened = asyncio.run(store.open(thread_id, {}, "ip:5.6.7.8"))
+
+    assert opened.id != thread_id
+    assert opened.owner == "ip:5.6.7.8"
+    assert opened.turns == []
+    assert store.stats()["foreign"] == 2
+    # The owner still gets it, from the cache
+    assert asyncio.run(store.get(thread_id, "ip:1.2.3.4")).id == thread_id
+
+
+def test_thread_without_owner_is_not_continued(app_db, conn):
+    thread_id = stored_thread("ip:1.2.3.4")
+    # Threads created before owners were stored
+    conn.execute("UPDATE conversation_threads SET owner = NULL WHERE id = ?", (thread_id,))
+    conn.commit()
+
+    assert asyncio.run(ThreadStore(cache_size=4).get(thread_id, None)) is None
+
+
+def test_idle_thread_is_not_continued(app_db, conn):
+    thread_id = stored_thread("ip:1.2.3.4")
+    set_updated_at(conn, thread_id, time.time() - 120)
+    store = ThreadStore(cache_size=4, ttl=60)
+
+    assert asyncio.run(store.get(thread_id, "ip:1.2.3.4")) is None
+    assert store.stats()["expired"] == 1
+    assert asyncio.run(ThreadStore(cache_size=4, ttl=0).get(thread_id, "ip:1.2.3.4"))
+
+
+def test_delete_idle_removes_threads_and_messages(app_db, conn):
+    idle = stored_thread("ip:1.2.3.4")
+    active = stored_thread("ip:1.2.3.4")
+    set_updated_at(conn, idle, time.time() - 120)
+
+    deleted = ThreadRepository().delete_idle(time.time() - 60).result(5)
+
+    assert deleted == 1
+    remaining = {row[0] for row in conn.execute("SELECT id FROM conversation_threads")}
+    assert remaining == {active}
+    assert conn.execute(
+        "SELECT COUNT(*) FROM conversation_messages WHERE thread_id = ?", (idle,)
+    ).fetchone()[0] == 0
+
+
+def test_idle_threads_are_purged_periodically(app_db, conn, monkeypatch):
+    monkeypatch.setattr("app.services.thread_store._PURGE_EVERY", 3)
+    idle = stored_thread("ip:1.2.3.4")
+    set_updated_at(conn, idle, time.time() - 120)
+    store = ThreadStore(cache_size=4, ttl=60)
+
+    for _ in range(3):
+        store.create({}, "ip:1.2.3.4")
+    get_write_queue().execute(lambda writer: None)
+
+    assert conn.execute(
+        "SELECT COUNT(*) FROM conversation_threads WHERE id = ?", (idle,)
+    ).fetchone()[0] == 0
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from app.llm_provider.errors import LLMRateLimitError
+from app.llm_provider.instrumentation import (
+    InstrumentedLLMProvider,
+    LLMMetrics,
+    llm_call_context,
+    record_usage,
+)
+from app.llm_provider.stub_provider import StubLLMProvider
+from app.metrics import MetricsRegistry
+from app.services import token_budget
+from app.services.admission import TokenBudgetExceededError
+from app.services.token_budget import TokenBudget
+
+STUB_SETTINGS = {
+    "latency_ms": 0.0,
+    "jitter_ms": 0.0,
+    "distribution": "fixed",
+    "chunk_ms": 0.0,
+    "failure_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "retry_after": 1.0,
+    "seed": 0,
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(token_budget.time, "monotonic", clock)
+    return clock
+
+
+def test_budget_rejects_after_the_limit_until_the_window_ends(clock):
+    budget = TokenBudget(limit=100, window=60)
+
+    budget.check("user:1")
+    budget.charge("user:1", 70)
+    budget.check("user:1")
+    # The last admitted call may overshoot; the next one is rejected
+    budget.charge("user:1", 50)
+    clock.now += 20
+    with pytest.raises(TokenBudgetExceededError) as error:
+        budget.check("user:1")
+    assert error.value.retry_after == pytest.approx(40)
+    budget.check("user:2")
+
+    clock.now += 40
+    budget.check("user:1")
+    assert budget.usage("user:1")["used"] == 0
+    assert budget.stats()["rejected"] == 1
+    assert budget.stats()["tokens"] == 120
+
+
+def test_budget_usage_and_unlimited_mode(clock):
+    budget = TokenBudget(limit=100, window=60)
+    budget.charge("user:1", 30)
+    clock.now += 15
+
+    assert budget.usage("user:1") == {"used": 30, "limit": 100, "remaining": 70, "resets_in": 45.0}
+
+    unlimited = TokenBudget(limit=0, window=60)
+    unlimited.charge("user:1", 10**6)
+    unlimited.check("user:1")
+    assert unlimited.usage("user:1")["remaining"] is None
+    # Anonymous calls are neither limited nor counted
+    budget.charge(None, 500)
+    assert budget.stats()["tokens"] == 30
+
+
+def test_expired_windows_are_purged(clock, monkeypatch):
+    monkeypatch.setattr(TokenBudget, "PURGE_EVERY", 2)
+    budget = TokenBudget(limit=100, window=60)
+    budget.charge("user:1", 10)
+    clock.now += 61
+
+    budget.charge("user:2", 10)
+
+    assert budget.stats()["callers"] == 1
+
+
+def instrumented(stub: StubLLMProvider):
+    spans = []
+    provider = InstrumentedLLMProvider(stub, LLMMetrics(MetricsRegistry()), on_span=spans.append)
+    return provider, spans
+
+
+def test_span_carries_caller_and_reported_tokens():
+    provider, spans = instrumented(StubLLMProvider(STUB_SETTINGS))
+
+    async def call():
+        with llm_call_context("user:1", cache="miss"):
+            await provider.analyze_image(b"photo", "p" * 40)
+
+    asyncio.run(call())
+
+    [span] = spans
+    assert (span.operation, span.caller, span.cache, span.status) == ("photo", "user:1", "miss", "ok")
+    assert span.model == "stub"
+    assert span.prompt_tokens == 255 + 10
+    assert span.completion_tokens > 0
+    stats = provider.metrics.stats()["photo"]
+    assert stats["calls"] == 1
+    assert stats["prompt_tokens"] == span.prompt_tokens
+
+
+def test_stream_span_records_first_chunk_and_usage():
+    provider, spans = instrumented(StubLLMProvider(STUB_SETTINGS))
+
+    async def consume():
+        with llm_call_context("user:1"):
+            stream = provider.stream_vitamin_recommendations("Что есть?", "t1", {})
+        # Chunks are consumed after the context is left
+        return [chunk async for chunk in stream]
+
+    asyncio.run(consume())
+
+    [span] = spans
+    assert span.operation == "consultation_stream"
+    assert span.caller == "user:1"
+    assert span.first_chunk is not None
+    assert span.total_tokens > 0
+
+
+def test_each_failed_attempt_is_a_span():
+    provider, spans = instrumented(StubLLMProvider(STUB_SETTINGS, rate_limit_rate=1.0))
+
+    with pytest.raises(LLMRateLimitError):
+        asyncio.run(provider.generate_recipes({}))
+
+    assert [span.status for span in spans] == ["rate_limited"]
+    assert provider.metrics.stats()["recipes"]["errors"] == 1
+
+
+def test_record_usage_outside_a_call_is_ignored():
+    record_usage("stub", 10, 10)
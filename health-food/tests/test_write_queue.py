@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+
+def insert_user(username: str):
+    def write(conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "INSERT INTO users (username, email, hashed_password) VALUES (?, ?, ?)",
+            (username, f"{username}@example.com", "hash"),
+        ).lastrowid
+
+    return write
+
+
+def usernames(conn: sqlite3.Connection):
+    return {row[0] for row in conn.execute("SELECT username FROM users")}
+
+
+def test_queued_writes_share_one_commit(write_queue, writer_gate, conn):
+    futures = [write_queue.submit(insert_user(f"user{n}")) for n in range(5)]
+    writer_gate.open()
+
+    ids = [future.result(5) for future in futures]
+
+    assert len(set(ids)) == 5
+    assert usernames(conn) == {f"user{n}" for n in range(5)}
+    stats = write_queue.stats()
+    # The gate write, then all five queued behind it
+    assert stats["batches"] == 2
+    assert stats["max_batch"] == 5
+    assert stats["writes"] == 6
+
+
+def test_failed_write_rolls_back_only_its_savepoint(write_queue, writer_gate, conn):
+    def insert_then_fail(writer: sqlite3.Connection) -> None:
+        insert_user("partial")(writer)
+        raise ValueError("boom")
+
+    first = write_queue.submit(insert_user("first"))
+    failing = write_queue.submit(insert_then_fail)
+    # Duplicate username: the constraint error stays within its own write
+    duplicate = write_queue.submit(insert_user("first"))
+    last = write_queue.submit(insert_user("last"))
+    writer_gate.open()
+
+    first.result(5)
+    last.result(5)
+    with pytest.raises(ValueError):
+        failing.result(5)
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(5)
+
+    assert usernames(conn) == {"first", "last"}
+    stats = write_queue.stats()
+    assert stats["batches"] == 2
+    assert stats["failed"] == 2
+
+
+def test_execute_waits_for_commit(write_queue, conn):
+    user_id = write_queue.execute(insert_user("alice"))
+
+    row = conn.execute("SELECT username FROM users WHERE id = ?", (user_id,)).fetchone()
+    assert row[0] == "alice"
+
+
+def test_closed_queue_rejects_writes(write_queue):
+    write_queue.execute(insert_user("alice"))
+    write_queue.close()
+
+    with pytest.raises(RuntimeError):
+        write_queue.submit(insert_user("bob"))